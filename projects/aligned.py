@@ -0,0 +1,162 @@
+"""
+Module aligned
+
+Binary files made of a JSON header followed by raw arrays, each starting
+at an offset that is a multiple of `ALIGN` bytes:
+
+     Bytes                  Contents
+     -----                  --------
+     len(magic)             magic string identifying the kind of file
+     8                      size of the header, little-endian
+     size                   JSON header, padded with spaces so that the
+                            data section starts at a multiple of ALIGN
+     ...                    the arrays, each padded with zeros to a
+                            multiple of ALIGN bytes
+
+Because every array is aligned, a reader can read (or map) the data
+section in one call and wrap each array around its bytes without copying
+them (see `array_views`). The header is free-form; `array_layout` gives
+the usual way of recording the dtype, shape and offset of each array.
+
+Used by `project1.compact`, `project1.shared` (for the layout of shared
+memory blocks) and the cache of Project 2.
+
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.cache import atomic_write
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+# Every array starts at a multiple of ALIGN bytes
+ALIGN = 64
+
+
+# ----------------------------------------------------------------------------
+#  Layout
+# ----------------------------------------------------------------------------
+def aligned_size(nbytes: int) -> int:
+    """ Smallest multiple of ALIGN that is not less than `nbytes` """
+    return -(-nbytes // ALIGN) * ALIGN
+
+
+def array_layout(arrays: dict) -> tuple:
+    """
+    Return the location of each array when they are stored one after the
+    other, each starting at a multiple of ALIGN bytes.
+
+    Returns
+    -------
+    tuple[dict, int]
+        A dictionary mapping each key of `arrays` to a dictionary with its
+        `dtype` (as a string), `shape` and `offset`, and the total size in
+        bytes.
+    """
+    layout = {}
+    offset = 0
+    for key, arr in arrays.items():
+        layout[key] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset += aligned_size(arr.nbytes)
+    return layout, offset
+
+
+def array_views(layout: dict, buf) -> dict:
+    """
+    Return arrays that are views of `buf` at the locations of `layout`
+    (see `array_layout`), without copying any data.
+    """
+    arrays = {}
+    for key, loc in layout.items():
+        dtype = np.dtype(loc['dtype'])
+        shape = tuple(loc['shape'])
+        if loc['offset'] + dtype.itemsize * int(np.prod(shape)) > len(buf):
+            raise ValueError(f"Invalid layout: array '{key}' is past the end of the data")
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=loc['offset'])
+    return arrays
+
+
+def _pad_header(magic: bytes, header: dict, reserve: int = 0) -> bytes:
+    """
+    Return the JSON text of `header` followed by at least `reserve`
+    spaces, so that the data section after it starts at a multiple of
+    ALIGN bytes.
+    """
+    text = json.dumps(header).encode() + b' ' * reserve
+    return text + b' ' * (-(len(magic) + 8 + len(text)) % ALIGN)
+
+
+def write_aligned(pth: Path, magic: bytes, header: dict, arrays, reserve: int = 0):
+    """
+    Write a file with the magic string `magic`, the JSON header `header`
+    and the given arrays, each padded to a multiple of ALIGN bytes. The
+    file is written with `cache.atomic_write`.
+
+    Parameters
+    ----------
+    arrays : iterable[ndarray]
+        The arrays, in the order of their offsets (see `array_layout`).
+
+    reserve : int, default 0
+        Number of spare bytes left in the header, so that a slightly
+        longer header can later be stored with `rewrite_aligned_header`.
+    """
+    text = _pad_header(magic, header, reserve)
+    with atomic_write(pth) as fobj:
+        fobj.write(magic)
+        fobj.write(len(text).to_bytes(8, 'little'))
+        fobj.write(text)
+        for arr in arrays:
+            # As bytes, since buffers of some dtypes (e.g. datetime64)
+            # cannot be exported
+            fobj.write(np.ascontiguousarray(arr).reshape(-1).view(np.uint8).data)
+            fobj.write(bytes(-arr.nbytes % ALIGN))
+
+
+def read_aligned_header(fobj, magic: bytes, version: int) -> tuple:
+    """
+    Read the header of a file opened in binary mode and written with
+    `write_aligned`, and return it with the offset of the data section.
+
+    Raises
+    ------
+    ValueError
+        If the file does not start with `magic`, or if the `version` key
+        of the header is not `version`.
+    """
+    prefix = fobj.read(len(magic) + 8)
+    if len(prefix) != len(magic) + 8 or prefix[:len(magic)] != magic:
+        raise ValueError(f"Invalid file '{fobj.name}'")
+    size = int.from_bytes(prefix[len(magic):], 'little')
+    header = json.loads(fobj.read(size))
+    if header.get('version') != version:
+        raise ValueError(f"Invalid file version '{header.get('version')}'")
+    return header, len(prefix) + size
+
+
+def rewrite_aligned_header(pth: Path, magic: bytes, header: dict) -> bool:
+    """
+    Replace (in place) the header of a file written with `write_aligned`,
+    without rewriting its data section.
+
+    Returns
+    -------
+    bool
+        False, and the file is left unchanged, if the new header does not
+        fit in the space of the current one.
+    """
+    with open(pth, 'r+b') as fobj:
+        prefix = fobj.read(len(magic) + 8)
+        if len(prefix) != len(magic) + 8 or prefix[:len(magic)] != magic:
+            raise ValueError(f"Invalid file '{pth}'")
+        size = int.from_bytes(prefix[len(magic):], 'little')
+        text = json.dumps(header).encode()
+        if len(text) > size:
+            return False
+        fobj.write(text + b' ' * (size - len(text)))
+    return True
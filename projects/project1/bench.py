@@ -0,0 +1,575 @@
+"""
+Module bench
+
+Benchmarks comparing the dictionary-based functions in `task_project1`
+with the array-based engines in the `panel` module.
+
+Run them from the `toolkit` folder with:
+
+    python -m projects.project1.bench
+
+The dictionary-based functions are too slow (and too memory hungry) to run
+on a full 5,000 x 5,000 panel, so they are timed on the first `sample`
+tickers and the time is scaled up to the full panel. Both functions work
+ticker by ticker, so their cost is linear in the number of tickers.
+
+"""
+
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.columnar import (
+        columns_to_nested_multi,
+        dates_to_ords,
+        decode_series,
+        lines_to_columns,
+        ords_to_dates,
+        )
+from projects.project1.compact import read_compact, write_compact
+from projects.project1.ingest import parse_dat_file, read_dat_columns
+from projects.project1.panel import (
+        basket_membership,
+        columns_to_panel,
+        SCHEMES,
+        mk_mkt_val_panel,
+        mk_ports_panel,
+        mk_rets_panel,
+        mk_vw_baskets_panel,
+        mk_vw_port_panel,
+        panel_to_nested,
+        select_tickers,
+        series_to_dict,
+        )
+from projects.project1.riskstats import init_stats, rolling_stats, update_stats
+from projects.project1.scan import scan_dat_file
+from projects.project1.shared import attach_panel, publish_dat_files, release
+from projects.project1.synth import write_dat_files
+from projects.project1.task_project1 import (
+        lines_to_records,
+        mk_mkt_val_dict,
+        mk_rets_dict,
+        mk_vw_port,
+        organize_by_ticker_multi,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def mk_random_panel(
+        ntickers: int,
+        ndates: int,
+        missing: float = 0.01,
+        absent: float = 0.01,
+        seed: int = 0,
+        ) -> dict:
+    """
+    Create a panel dictionary with random `adj_close` prices and `shares`.
+
+    Parameters
+    ----------
+    ntickers, ndates : int
+        Shape of the panel.
+
+    missing : float, default 0.01
+        Probability that a present value is missing (NaN).
+
+    absent : float, default 0.01
+        Probability that a (ticker, date) cell is not present at all.
+
+    seed : int, default 0
+        Seed for the random number generator.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (ntickers, ndates)
+    start = dates_to_ords(['2000-01-03'])[0]
+
+    prc = rng.normal(0.0003, 0.02, size=shape)
+    np.log1p(prc, out=prc)
+    np.cumsum(prc, axis=1, out=prc)
+    np.exp(prc, out=prc)
+    prc *= rng.uniform(5, 500, size=(ntickers, 1))
+    shares = np.repeat(
+        rng.integers(10**6, 10**10, size=(ntickers, 1)).astype(np.float64),
+        ndates, axis=1)
+
+    present = rng.random(shape) >= absent
+    prc[rng.random(shape) < missing] = np.nan
+    shares[rng.random(shape) < missing] = np.nan
+    prc[~present] = np.nan
+    shares[~present] = np.nan
+    return {
+        'tickers': np.array([f'T{i:05d}' for i in range(ntickers)], dtype=object),
+        'dates': start + np.arange(ndates, dtype=np.int32),
+        'present': present,
+        'adj_close': prc,
+        'shares': shares,
+    }
+
+
+def mk_random_lines(ntickers: int, ndates: int, seed: int = 0) -> list[str]:
+    """
+    Create `.dat` lines (in `key:value` format) for a random panel, as
+    returned by `mk_random_panel`. Missing values are left blank.
+    """
+    panel = mk_random_panel(ntickers, ndates, seed=seed)
+    dates = ords_to_dates(panel['dates'])
+
+    def _fmt(x):
+        return '' if np.isnan(x) else f'{x:.4f}'
+
+    lines = []
+    for tic, present, prc, shr in zip(
+            panel['tickers'], panel['present'], panel['adj_close'], panel['shares']):
+        for j in np.flatnonzero(present).tolist():
+            p = _fmt(prc[j])
+            s = '' if np.isnan(shr[j]) else str(int(shr[j]))
+            lines.append(
+                f'date:{dates[j]},ticker:{tic},open:{p},close:{p},adj_close:{p},shares:{s}')
+    return lines
+
+
+def deep_size(obj) -> int:
+    """
+    Return the memory used by a nested structure of dictionaries, strings
+    and numbers, in bytes. Objects shared by several containers are
+    counted once.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+    return size
+
+
+def timeit(func, *args, repeat: int = 1, **kargs) -> tuple:
+    """
+    Call `func(*args, **kargs)` `repeat` times and return the best wall
+    time (in seconds) and the result of the last call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func(*args, **kargs)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def print_results(name: str, res: dict):
+    """ Print the results of a benchmark, one per line """
+    dashes = '-' * 40
+    print(dashes, name, dashes, sep='\n')
+    for key, value in res.items():
+        if isinstance(value, float):
+            value = f'{value:,.4f}'
+        print(f'  {key:<14} {value}')
+
+
+# ----------------------------------------------------------------------------
+#  Benchmarks
+# ----------------------------------------------------------------------------
+def bench_rets(
+        ntickers: int = 5000,
+        ndates: int = 5000,
+        sample: int = 100,
+        ) -> dict:
+    """
+    Compare `task_project1.mk_rets_dict` with `panel.mk_rets_panel`.
+
+    Returns
+    -------
+    dict
+        Timings in seconds (`dict_secs` is scaled to the full panel), the
+        speedup, and whether both implementations return the same values
+        for the sampled tickers.
+    """
+    panel = mk_random_panel(ntickers, ndates)
+    sub = select_tickers(panel, slice(0, sample))
+    prices = panel_to_nested(sub, sub['adj_close'])
+
+    dict_secs, dict_rets = timeit(mk_rets_dict, prices)
+    panel_secs, rets = timeit(mk_rets_panel, panel, repeat=3)
+    dict_secs *= ntickers / sample
+
+    match = panel_to_nested(sub, rets[:sample]) == dict_rets
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'dict_secs': dict_secs,
+        'panel_secs': panel_secs,
+        'speedup': dict_secs / panel_secs,
+        'match': match,
+    }
+
+
+def bench_vw(
+        ntickers: int = 5000,
+        ndates: int = 5000,
+        sample: int = 100,
+        ) -> dict:
+    """
+    Compare `mk_mkt_val_dict` + `mk_vw_port` with `panel.mk_mkt_val_panel`
+    + `panel.mk_vw_port_panel`, starting from precomputed returns.
+
+    Returns
+    -------
+    dict
+        Timings in seconds (`dict_secs` is scaled to the full panel), the
+        speedup, and whether both implementations return the same
+        portfolio returns for the sampled tickers.
+    """
+    panel = mk_random_panel(ntickers, ndates)
+    rets = mk_rets_panel(panel)
+    sub = select_tickers(panel, slice(0, sample))
+    prices = panel_to_nested(sub, sub['adj_close'])
+    shares = panel_to_nested(sub, sub['shares'])
+    rets_dict = panel_to_nested(sub, rets[:sample])
+
+    def _dict_vw():
+        mkt_val = mk_mkt_val_dict(prices=prices, shares=shares)
+        return mk_vw_port(rets=rets_dict, mkt_val=mkt_val)
+
+    def _panel_vw(panel, rets):
+        mkt_val = mk_mkt_val_panel(panel)
+        return mk_vw_port_panel(rets, mkt_val)
+
+    dict_secs, dict_vw = timeit(_dict_vw)
+    panel_secs, _ = timeit(_panel_vw, panel, rets, repeat=3)
+    dict_secs *= ntickers / sample
+
+    sub_vw = _panel_vw(sub, rets[:sample])
+    match = series_to_dict(sub, sub_vw) == dict_vw
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'dict_secs': dict_secs,
+        'panel_secs': panel_secs,
+        'speedup': dict_secs / panel_secs,
+        'match': match,
+    }
+
+
+def bench_keys(ntickers: int = 200, ndates: int = 2500) -> dict:
+    """
+    Compare the nested-dictionary pipeline (`mk_rets_dict`,
+    `mk_mkt_val_dict`, `mk_vw_port`) with string keys, as built by
+    `organize_by_ticker_multi`, and with integer keys, as built by
+    `columnar.columns_to_nested_multi(..., encoded=True)`.
+
+    Returns
+    -------
+    dict
+        The memory used by the nested price and shares dictionaries (in
+        MB), the pipeline timings (in seconds), and whether both key types
+        give the same portfolio returns.
+    """
+    lines = mk_random_lines(ntickers, ndates)
+    columns = ['adj_close', 'shares']
+    str_nested = organize_by_ticker_multi(lines_to_records(lines), columns)
+    int_nested = columns_to_nested_multi(
+        lines_to_columns(lines), columns, encoded=True)
+
+    def _pipeline(nested):
+        prices = nested['adj_close']
+        rets = mk_rets_dict(prices)
+        mkt_val = mk_mkt_val_dict(prices=prices, shares=nested['shares'])
+        return mk_vw_port(rets=rets, mkt_val=mkt_val)
+
+    str_secs, str_vw = timeit(_pipeline, str_nested, repeat=3)
+    int_secs, int_vw = timeit(_pipeline, int_nested, repeat=3)
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'str_mb': deep_size(str_nested) / 2**20,
+        'int_mb': deep_size(int_nested) / 2**20,
+        'str_secs': str_secs,
+        'int_secs': int_secs,
+        'speedup': str_secs / int_secs,
+        'match': decode_series(int_vw) == str_vw,
+    }
+
+
+def bench_scan(ntickers: int = 100, ndates: int = 2500) -> dict:
+    """
+    Compare the parse throughput of one large `.dat` file for:
+
+    - `records`: `read_text().splitlines()` + `lines_to_records` +
+      `organize_by_ticker_multi` (the 'records' parser in `main.main`,
+      which only converts the price and shares columns);
+    - `columnar`: `ingest.parse_dat_file` (the 'columnar' parser);
+    - `scan`: `scan.scan_dat_file` (the 'scan' parser).
+
+    Returns
+    -------
+    dict
+        The file size (in MB), the throughput of each path (in MB/s), the
+        speedup of `scan` over `records` and `columnar`, and whether
+        `scan` and `columnar` return the same arrays.
+    """
+    lines = mk_random_lines(ntickers, ndates)
+
+    def _records(pth):
+        records = lines_to_records(pth.read_text().splitlines())
+        return organize_by_ticker_multi(records, ['adj_close', 'shares'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pth = Path(tmp).joinpath('bench.dat')
+        pth.write_text('\n'.join(lines) + '\n')
+        size_mb = pth.stat().st_size / 2**20
+        rec_secs, _ = timeit(_records, pth)
+        col_secs, cols = timeit(parse_dat_file, pth, repeat=3)
+        scan_secs, scanned = timeit(scan_dat_file, pth, repeat=3)
+
+    match = all(
+        np.array_equal(cols[key], scanned[key], equal_nan=key != 'tickers')
+        for key in cols
+    )
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'size_mb': size_mb,
+        'records_mbps': size_mb / rec_secs,
+        'columnar_mbps': size_mb / col_secs,
+        'scan_mbps': size_mb / scan_secs,
+        'vs_records': rec_secs / scan_secs,
+        'vs_columnar': col_secs / scan_secs,
+        'match': match,
+    }
+
+
+def bench_baskets(
+        ntickers: int = 1000,
+        ndates: int = 2500,
+        nbaskets: int = 200,
+        seed: int = 0,
+        ) -> dict:
+    """
+    Compare computing the value-weighted returns of many random baskets
+    one at a time (`mk_vw_port_panel` on the rows of each basket) with
+    `panel.mk_vw_baskets_panel`, starting from precomputed returns and
+    market values.
+
+    Returns
+    -------
+    dict
+        Timings in seconds, the speedup, and the largest absolute
+        difference between the two sets of portfolio returns.
+    """
+    rng = np.random.default_rng(seed)
+    panel = mk_random_panel(ntickers, ndates, seed=seed)
+    rets = mk_rets_panel(panel)
+    mkt_val = mk_mkt_val_panel(panel)
+    rows = [
+        np.sort(rng.choice(ntickers, size=rng.integers(1, ntickers), replace=False))
+        for _ in range(nbaskets)
+    ]
+    membership = basket_membership(
+        panel['tickers'], [panel['tickers'][r].tolist() for r in rows])
+
+    def _loop():
+        return np.array([mk_vw_port_panel(rets[r], mkt_val[r]) for r in rows])
+
+    loop_secs, loop_vw = timeit(_loop)
+    batch_secs, batch_vw = timeit(
+        mk_vw_baskets_panel, rets, mkt_val, membership, repeat=3)
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'nbaskets': nbaskets,
+        'loop_secs': loop_secs,
+        'batch_secs': batch_secs,
+        'speedup': loop_secs / batch_secs,
+        'max_diff': float(np.nanmax(np.abs(loop_vw - batch_vw))),
+    }
+
+
+def bench_schemes(ntickers: int = 2000, ndates: int = 2500) -> dict:
+    """
+    Time `panel.mk_ports_panel` for each weighting scheme on its own and
+    for all the schemes in `SCHEMES` together.
+
+    Returns
+    -------
+    dict
+        The timing of each scheme alone, the sum of those timings, the
+        timing of all the schemes together (in seconds), and whether the
+        'vw' scheme matches `mk_vw_port_panel`.
+    """
+    panel = mk_random_panel(ntickers, ndates)
+    rets = mk_rets_panel(panel)
+    mkt_val = mk_mkt_val_panel(panel)
+    res = {'ntickers': ntickers, 'ndates': ndates}
+    total = 0.0
+    for scheme in SCHEMES:
+        secs, _ = timeit(
+            mk_ports_panel, rets, mkt_val, panel['present'], schemes=(scheme,))
+        res[f'{scheme}_secs'] = secs
+        total += secs
+    all_secs, ports = timeit(mk_ports_panel, rets, mkt_val, panel['present'])
+    res['separate_secs'] = total
+    res['together_secs'] = all_secs
+    res['match'] = np.array_equal(
+        ports['vw'], mk_vw_port_panel(rets, mkt_val), equal_nan=True)
+    return res
+
+
+def bench_compact(ntickers: int = 200, ndates: int = 2520) -> dict:
+    """
+    Compare the size and load time of synthetic `.dat` files (see
+    `synth.write_dat_files`) with those of the same data in a compact file
+    (see `compact`). The `.dat` files are parsed with
+    `scan.scan_dat_file`, the fastest text parser.
+
+    Returns
+    -------
+    dict
+        The sizes (in MB), the load times (in seconds), the speedup of
+        `read_compact` over parsing, and whether both give the same
+        values.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_dat_files(Path(tmp, 'dat'), ntickers, ndates=ndates)
+        dat_mb = sum(pth.stat().st_size for pth in paths) / 2**20
+        dat_secs, cols = timeit(read_dat_columns, paths, workers=1, scan=True)
+        pth = write_compact(cols, Path(tmp, 'prices.p1c'))
+        compact_mb = pth.stat().st_size / 2**20
+        compact_secs, loaded = timeit(read_compact, pth, repeat=3)
+
+    # The compact file is sorted by ticker and date
+    order = np.lexsort((cols['date'], cols['ticker']))
+    match = all(
+        np.array_equal(cols[key][order], loaded[key], equal_nan=True)
+        for key in ('date', 'ticker', 'open', 'close', 'adj_close', 'shares')
+    )
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'dat_mb': dat_mb,
+        'compact_mb': compact_mb,
+        'size_ratio': dat_mb / compact_mb,
+        'dat_secs': dat_secs,
+        'compact_secs': compact_secs,
+        'speedup': dat_secs / compact_secs,
+        'match': match,
+    }
+
+
+def bench_riskstats(ndates: int = 25000, window: int = 252) -> dict:
+    """
+    Time the rolling risk statistics (see `riskstats`) of a random return
+    series, computed with one `update_stats` call per date and as a
+    single `rolling_stats` backfill.
+
+    Returns
+    -------
+    dict
+        The time per online update (in microseconds), the time of the
+        backfill (in seconds), and the largest difference between the
+        two results.
+    """
+    rets = np.random.default_rng(0).normal(0.0003, 0.01, ndates)
+
+    def _online():
+        state = init_stats(window=window)
+        return [update_stats(state, i, r) for i, r in enumerate(rets.tolist())]
+
+    online_secs, recs = timeit(_online)
+    backfill_secs, stats = timeit(rolling_stats, rets, window=window)
+    diff = max(
+        np.nanmax(np.abs(np.array([rec[key] for rec in recs]) - values))
+        for key, values in stats.items()
+    )
+    return {
+        'ndates': ndates,
+        'window': window,
+        'update_us': online_secs / ndates * 1e6,
+        'backfill_secs': backfill_secs,
+        'max_diff': diff,
+    }
+
+
+def _parse_job(paths: list[Path]) -> np.ndarray:
+    """ Worker for `bench_shared`: parse the files and compute VW returns """
+    cols = read_dat_columns(paths, workers=1, scan=True)
+    panel = columns_to_panel(cols, columns=['adj_close', 'shares'])
+    return mk_vw_port_panel(mk_rets_panel(panel), mk_mkt_val_panel(panel))
+
+
+def _attach_job(desc: dict) -> np.ndarray:
+    """ Worker for `bench_shared`: attach to the shared panels instead """
+    panel, shm = attach_panel(desc)
+    vw_rets = mk_vw_port_panel(panel['rets'], panel['mkt_val'])
+    del panel
+    shm.close()
+    return vw_rets
+
+
+def bench_shared(ntickers: int = 200, ndates: int = 2520, nworkers: int = 4) -> dict:
+    """
+    Time `nworkers` worker processes that each need the VW returns of the
+    same synthetic files, when every worker parses the files itself and
+    when the files are parsed once and published in shared memory (see
+    `shared`).
+
+    Returns
+    -------
+    dict
+        The time of each approach (in seconds, including publishing), the
+        size of the shared panels (in MB), and whether the results match.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_dat_files(Path(tmp), ntickers, ndates=ndates)
+        with ProcessPoolExecutor(max_workers=nworkers) as pool:
+            # Start the workers before timing
+            list(pool.map(abs, range(nworkers)))
+
+            start = time.perf_counter()
+            parsed = list(pool.map(_parse_job, [paths] * nworkers))
+            parse_secs = time.perf_counter() - start
+
+            start = time.perf_counter()
+            desc, shm = publish_dat_files(paths)
+            try:
+                attached = list(pool.map(_attach_job, [desc] * nworkers))
+                shared_secs = time.perf_counter() - start
+                shared_mb = shm.size / 2**20
+            finally:
+                release(shm)
+
+    match = all(
+        np.array_equal(a, b, equal_nan=True) for a, b in zip(parsed, attached))
+    return {
+        'ntickers': ntickers,
+        'ndates': ndates,
+        'nworkers': nworkers,
+        'parse_secs': parse_secs,
+        'shared_secs': shared_secs,
+        'speedup': parse_secs / shared_secs,
+        'shared_mb': shared_mb,
+        'match': match,
+    }
+
+
+if __name__ == "__main__":
+    print_results('mk_rets_dict vs mk_rets_panel', bench_rets())
+    print_results('mk_vw_port vs mk_vw_port_panel', bench_vw())
+    print_results('string vs integer keys', bench_keys())
+    print_results('.dat parse throughput', bench_scan())
+    print_results('baskets: loop vs matrix product', bench_baskets())
+    print_results('weighting schemes', bench_schemes())
+    print_results('.dat vs compact files', bench_compact())
+    print_results('rolling risk statistics', bench_riskstats())
+    print_results('parse per worker vs shared memory', bench_shared())
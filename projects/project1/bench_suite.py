@@ -0,0 +1,210 @@
+"""
+Module bench_suite
+
+Stage-by-stage benchmarks of the Project 1 pipeline on synthetic data.
+
+For each universe size in `SCALES`, `run_suite` writes synthetic `.dat`
+files (see `synth`) to a temporary folder and runs `main.main` on them
+with `main.profile_main`, recording the wall and CPU time, allocated
+blocks, peak resident set size and tracemalloc peak and retained memory
+of each stage (see `instrument`).
+
+Each pipeline is a set of arguments of `main.main` (see `PIPELINES`):
+
+- 'dict': the defaults (`parser='records'`, `engine='dict'`), i.e.
+  `read_lines`, `lines_to_records`, `organize_by_ticker_multi`,
+  `mk_rets_dict`, `mk_mkt_val_dict` and `mk_vw_port`;
+- 'panel': `parser='columnar'`, `engine='panel'`, i.e. `read_lines`,
+  `lines_to_columns`, `columns_to_panel`, `mk_rets_panel`,
+  `mk_mkt_val_panel`, `mk_vw_port_panel` and `series_to_dict`.
+
+Each pipeline runs in a fresh worker process, so `max_rss_mb` is the
+peak of that run alone, and a run that exhausts the memory of the machine
+is recorded (with an `error` key) instead of stopping the suite. Timings
+come from a first run without tracemalloc (which slows Python code down
+considerably); memory figures come from a second run with it. The
+results are saved as JSON. Run the default suite from the `toolkit`
+folder with:
+
+    python -m projects.project1.bench_suite
+
+"""
+
+import gc
+import json
+import platform
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.cache import atomic_write
+from projects.project1.main import profile_main
+from projects.project1.synth import write_dat_files
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+SCALES = (10, 100, 1000, 10000)
+
+# Arguments of `main.main` for each pipeline
+PIPELINES = {
+    'dict': {'parser': 'records', 'engine': 'dict'},
+    'panel': {'parser': 'columnar', 'engine': 'panel'},
+}
+RESULTS_DIR = Path(__file__).parent.joinpath('bench_results')
+
+
+# ----------------------------------------------------------------------------
+#  Pipelines
+# ----------------------------------------------------------------------------
+def profile_pipeline(
+        paths: list[Path],
+        pipeline: str = 'dict',
+        prc_col: str = 'adj_close',
+        trace: bool = False,
+        ) -> list[dict]:
+    """
+    Run `main.main` with the arguments of one pipeline on the given `.dat`
+    files (all in the same folder) and return the measurements of each
+    stage (see `instrument.run_stage`), followed by a 'total' record.
+    """
+    if pipeline not in PIPELINES:
+        raise ValueError(f"Invalid pipeline '{pipeline}'")
+    tickers = [Path(pth).stem for pth in paths]
+    data_dir = Path(paths[0]).parent if paths else None
+    gc.collect()
+    _, report = profile_main(
+        tickers, trace=trace, prc_col=prc_col, data_dir=data_dir, **PIPELINES[pipeline])
+    return [*report['stages'], {'stage': 'total', **report['total']}]
+
+
+def _run_isolated(paths: list[Path], pipeline: str, trace: bool) -> list[dict]:
+    """
+    Run `profile_pipeline` in a new worker process. If the worker dies (e.g.
+    killed for using too much memory), return a single 'total' record
+    with an `error` key.
+    """
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return pool.submit(profile_pipeline, paths, pipeline, trace=trace).result()
+    except BrokenProcessPool as err:
+        return [{'stage': 'total', 'error': f'worker died: {err}'}]
+
+
+# ----------------------------------------------------------------------------
+#  Suite
+# ----------------------------------------------------------------------------
+def run_suite(
+        scales: tuple = SCALES,
+        ndates: int = 250,
+        missing: float = 0.01,
+        shuffle: bool = True,
+        pipelines: tuple = tuple(PIPELINES),
+        trace: bool = True,
+        out: Path | None = RESULTS_DIR.joinpath('bench_suite.json'),
+        seed: int = 0,
+        ) -> dict:
+    """
+    Profile every stage of each pipeline on synthetic universes of
+    increasing size.
+
+    Parameters
+    ----------
+    scales : tuple[int], default SCALES
+        Numbers of tickers.
+
+    ndates, missing, shuffle, seed
+        Passed to `synth.write_dat_files`.
+
+    pipelines : tuple[str], default all the keys of PIPELINES
+        Pipelines to profile (see `profile_pipeline`).
+
+    trace : bool, default True
+        If True, run each pipeline a second time under tracemalloc to
+        measure the memory used by each stage.
+
+    out : Path or None, default RESULTS_DIR / 'bench_suite.json'
+        Where to save the results as JSON. If None, they are not saved.
+
+    Returns
+    -------
+    dict
+        A dictionary with the keys 'meta' (platform and versions),
+        'params' (the arguments) and 'results' (one record per scale,
+        pipeline and stage, with the keys `ntickers`, `ndates`, `nlines`,
+        `size_mb`, `pipeline` and the measurements of `run_stage`).
+    """
+    results = []
+    for ntickers in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            paths = write_dat_files(
+                tmp, ntickers, ndates=ndates, missing=missing,
+                shuffle=shuffle, seed=seed)
+            gen_secs = time.perf_counter() - start
+            size_mb = sum(pth.stat().st_size for pth in paths) / 2**20
+            info = {
+                'ntickers': ntickers,
+                'ndates': ndates,
+                'nlines': ntickers * ndates,
+                'size_mb': size_mb,
+                'gen_secs': gen_secs,
+            }
+            for pipeline in pipelines:
+                records = _run_isolated(paths, pipeline, trace=False)
+                if trace and 'error' not in records[-1]:
+                    traced = _run_isolated(paths, pipeline, trace=True)
+                    if 'error' in traced[-1]:
+                        records[-1]['error'] = traced[-1]['error']
+                    for rec, mem in zip(records, traced):
+                        rec['peak_mb'] = mem.get('peak_mb')
+                        rec['retained_mb'] = mem.get('retained_mb')
+                for rec in records:
+                    results.append({**info, 'pipeline': pipeline, **rec})
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'params': {
+            'scales': list(scales),
+            'ndates': ndates,
+            'missing': missing,
+            'shuffle': shuffle,
+            'pipelines': list(pipelines),
+            'trace': trace,
+            'seed': seed,
+        },
+        'results': results,
+    }
+    if out is not None:
+        with atomic_write(out, 'w') as fobj:
+            json.dump(report, fobj, indent=2)
+    return report
+
+
+def print_report(report: dict):
+    """ Print the results of `run_suite` as a table """
+    header = f"{'ntickers':>8} {'pipeline':<8} {'stage':<20} {'wall_secs':>10} {'peak_mb':>10}"
+    print(header, '-' * len(header), sep='\n')
+    for rec in report['results']:
+        if 'wall_secs' not in rec:
+            print(f"{rec['ntickers']:>8} {rec['pipeline']:<8} {rec['stage']:<20} "
+                  f"{rec['error']}")
+            continue
+        peak = rec.get('peak_mb')
+        peak = '' if peak is None else f'{peak:10.1f}'
+        print(f"{rec['ntickers']:>8} {rec['pipeline']:<8} {rec['stage']:<20} "
+              f"{rec['wall_secs']:>10.4f} {peak:>10}")
+
+
+if __name__ == "__main__":
+    print_report(run_suite())
@@ -0,0 +1,153 @@
+"""
+Module cache
+
+Binary cache for the parsed contents of the `.dat` files in Project 1.
+
+Parsing a `.dat` file means reading its text and converting every field
+from a string. `load_columns` does this once per file and stores the
+resulting column dictionary (see `columnar`) in an uncompressed `.npz`
+file under `CACHE_DIR`:
+
+    toolkit/
+    |__ projects/
+    |   |__ project1/
+    |   |   |__ .cache/
+    |   |   |   |__ <ticker>-<hash>.npz
+
+where `<hash>` identifies the full path of the `.dat` file (see
+`cache_path`), so files with the same name in different folders (e.g.
+with `main.main(..., data_dir=...)`) do not share a cache file.
+
+Each cache file records the modification time and size of the `.dat`
+file it was built from, and the `VERSION` of the column layout. If any of
+them changes, the cache file is rebuilt, so warm runs skip text parsing
+entirely while edited files are re-parsed.
+
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.columnar import (
+        COLUMNS,
+        lines_to_columns,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+CACHE_DIR = Path(__file__).parent.joinpath('.cache')
+
+# Version of the column layout. Version 1 stored `shares` as int64
+VERSION = 2
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+@contextmanager
+def atomic_write(pth: Path, mode: str = 'wb'):
+    """
+    Open a temporary file in the folder of `pth` (creating the folder if
+    needed) and rename it to `pth` when the block exits without an error,
+    so readers never see a partial file. On error, the temporary file is
+    removed and `pth` is left as it was.
+
+    Examples
+    --------
+    >> with atomic_write('out.json', 'w') as fobj:
+           json.dump(data, fobj)
+    """
+    pth = Path(pth)
+    pth.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pth.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as fobj:
+            yield fobj
+        os.replace(tmp, pth)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def cache_path(pth: Path, cache_dir: Path = CACHE_DIR) -> Path:
+    """
+    Return the location of the cache file for the `.dat` file `pth`. The
+    name is the stem of `pth` followed by the first 12 hex digits of the
+    SHA-256 hash of its resolved path.
+    """
+    pth = Path(pth)
+    key = hashlib.sha256(str(pth.resolve()).encode()).hexdigest()[:12]
+    return Path(cache_dir) / f'{pth.stem}-{key}.npz'
+
+
+def _read_cache(cache_pth: Path, stat: os.stat_result) -> dict | None:
+    """
+    Return the column dictionary stored in `cache_pth`, or None if the file
+    does not exist, cannot be read, or was built from a different version
+    of the source file.
+    """
+    try:
+        with np.load(cache_pth, allow_pickle=False) as npz:
+            if ('version' not in npz.files
+                    or int(npz['version']) != VERSION
+                    or int(npz['mtime_ns']) != stat.st_mtime_ns
+                    or int(npz['size']) != stat.st_size):
+                return None
+            cols = {key: npz[key] for key in COLUMNS}
+            cols['tickers'] = npz['tickers'].astype(object)
+    except (OSError, KeyError, ValueError):
+        return None
+    return cols
+
+
+def _write_cache(cache_pth: Path, cols: dict, stat: os.stat_result):
+    """
+    Store `cols` in `cache_pth` (with `atomic_write`), together with the
+    modification time and size of the source file.
+    """
+    arrays = {key: cols[key] for key in COLUMNS}
+    arrays['tickers'] = cols['tickers'].astype(str)
+    arrays['version'] = np.int64(VERSION)
+    arrays['mtime_ns'] = np.int64(stat.st_mtime_ns)
+    arrays['size'] = np.int64(stat.st_size)
+    with atomic_write(cache_pth) as fobj:
+        np.savez(fobj, **arrays)
+
+
+# ----------------------------------------------------------------------------
+#  Cached loading
+# ----------------------------------------------------------------------------
+def load_columns(pth: Path, cache_dir: Path = CACHE_DIR) -> dict:
+    """
+    Return the column dictionary for the `.dat` file `pth`, using the
+    cache in `cache_dir` when it is up to date.
+
+    Parameters
+    ----------
+    pth : Path
+        Location of the `.dat` file.
+
+    cache_dir : Path, default CACHE_DIR
+        Folder with the cache files. It is created if needed.
+
+    Returns
+    -------
+    dict
+        A column dictionary, as returned by `columnar.lines_to_columns`.
+    """
+    pth = Path(pth)
+    stat = pth.stat()
+    cache_pth = cache_path(pth, cache_dir)
+    cols = _read_cache(cache_pth, stat)
+    if cols is None:
+        cols = lines_to_columns(pth.read_text().splitlines())
+        _write_cache(cache_pth, cols, stat)
+    return cols
+
@@ -0,0 +1,353 @@
+"""
+Module columnar
+
+Columnar parsing of the `.dat` files used in Project 1.
+
+`task_project1.lines_to_records` builds one dictionary per line, and
+`task_project1.organize_by_ticker` then walks that list once per column.
+The functions in this module turn the same `key:value` lines into typed
+per-column NumPy arrays instead. The result is a "column dictionary":
+
+     Key         Dtype     Missing values
+     ---         -----     --------------
+     date        int32     row is dropped
+     ticker      int32     row is dropped
+     open        float64   NaN
+     close       float64   NaN
+     adj_close   float64   NaN
+     shares      float64   NaN
+     tickers     object    (not a row column)
+
+Dates are stored as day ordinals (days since 1970-01-01, the same unit as
+`datetime64[D]`). Tickers are stored as integer codes into the sorted
+`tickers` array, so `cols['tickers'][cols['ticker']]` recovers the symbols.
+Share counts are stored as floats, as `organize_by_ticker` returns them,
+so any value `float` accepts (e.g. `'1234.0'`) is parsed the same way.
+
+"""
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+PRC_COLS = ('open', 'close', 'adj_close')
+VALUE_COLS = (*PRC_COLS, 'shares')
+COLUMNS = ('date', 'ticker', *VALUE_COLS)
+
+
+# ----------------------------------------------------------------------------
+#  Date conversion
+# ----------------------------------------------------------------------------
+def dates_to_ords(dates) -> np.ndarray:
+    """
+    Convert `'YYYY-MM-DD'` strings into int32 day ordinals.
+
+    Empty strings are mapped to the smallest int32 value, which can be
+    used to flag rows without a date.
+
+    Examples
+    --------
+    >> dates_to_ords(['1970-01-02', '2016-01-04'])
+    array([    1, 16804], dtype=int32)
+    """
+    days = np.asarray(dates, dtype='datetime64[D]')
+    ords = days.astype(np.int64)
+    ords[np.isnat(days)] = np.iinfo(np.int32).min
+    return ords.astype(np.int32)
+
+
+def ords_to_dates(ords) -> list[str]:
+    """
+    Convert int32 day ordinals back into `'YYYY-MM-DD'` strings.
+
+    Examples
+    --------
+    >> ords_to_dates(np.array([1, 16804], dtype=np.int32))
+    ['1970-01-02', '2016-01-04']
+    """
+    days = np.asarray(ords).astype('datetime64[D]')
+    return np.datetime_as_string(days).tolist()
+
+
+# ----------------------------------------------------------------------------
+#  Parsing
+# ----------------------------------------------------------------------------
+def _to_floats(values: list[str]) -> np.ndarray:
+    """ Convert strings into a float64 array (blank strings become NaN) """
+    try:
+        return np.fromiter(
+            map(float, [v or 'nan' for v in values]),
+            dtype=np.float64,
+            count=len(values),
+        )
+    except ValueError:
+        # Some values are padded with whitespace
+        nan = float('nan')
+        return np.array(
+            [float(v) if v.strip() else nan for v in values],
+            dtype=np.float64,
+        )
+
+
+def _split_fields(lines: list[str]) -> dict[str, list[str]]:
+    """
+    Return a dictionary mapping each key in `COLUMNS` to the list of
+    (unconverted) values of that key, one per non-blank line.
+    """
+    lines = [line for line in lines if line and not line.isspace()]
+    nrows = len(lines)
+    ncols = len(COLUMNS)
+
+    # Fast path: every line lists the keys in the order of `COLUMNS`, so
+    # splitting the joined text on both separators alternates keys and
+    # values, and column `j` is every `ncols`-th value
+    if lines:
+        fields = ','.join(lines).replace(':', ',').split(',')
+        if fields[0::2] == list(COLUMNS) * nrows:
+            values = fields[1::2]
+            return {key: values[j::ncols] for j, key in enumerate(COLUMNS)}
+
+    # General path: keys may appear in any order
+    raw = {key: [] for key in COLUMNS}
+    for line in lines:
+        for ele in line.split(','):
+            key, _, value = ele.partition(':')
+            col = raw.get(key)
+            if col is not None:
+                col.append(value)
+    if any(len(col) != nrows for col in raw.values()):
+        raise ValueError("Every line must contain the keys: " + ', '.join(COLUMNS))
+    return raw
+
+
+def lines_to_columns(lines) -> dict:
+    """
+    Convert lines from `.dat` files into a column dictionary.
+
+    This is the columnar counterpart of `lines_to_records` followed by
+    `organize_by_ticker`: the fields of all lines are split into one list
+    per column, and each list is converted once into a typed array. No
+    per-line dictionaries are created.
+
+    Parameters
+    ----------
+    lines : list[str]
+        A list of strings representing lines from one or more `.dat` files,
+        exactly as they appear in the files. Each line contains
+        comma-separated `key:value` pairs for all the keys in `COLUMNS`.
+        Blank lines are ignored.
+
+    Returns
+    -------
+    dict
+        A column dictionary (see the module docstring). Rows without a date
+        or without a ticker carry no information and are dropped.
+
+    Raises
+    ------
+    ValueError
+        If the lines do not contain one value for each key in `COLUMNS`.
+
+    Examples
+    --------
+    >> lines = [
+            'date:2016-02-10,ticker:CSCO,open:23.13,close:22.51,adj_close:16.8671,shares:5076080000',
+            'date:2016-02-09,ticker:CSCO,open:22.6,close:22.65,adj_close:16.972,shares:',
+        ]
+    >> cols = lines_to_columns(lines)
+    >> cols['adj_close']
+    array([16.8671, 16.972 ])
+    >> cols['shares']
+    array([5.07608e+09,         nan])
+    >> cols['tickers']
+    array(['CSCO'], dtype=object)
+    """
+    raw = _split_fields(lines)
+
+    # Encode the tickers as codes into the sorted list of unique tickers.
+    # The empty ticker gets the code -1
+    tickers = sorted(tic for tic in dict.fromkeys(raw['ticker']) if tic)
+    index = {tic: code for code, tic in enumerate(tickers)}
+    index[''] = -1
+    codes = np.fromiter(
+        map(index.__getitem__, raw['ticker']),
+        dtype=np.int32,
+        count=len(raw['ticker']),
+    )
+
+    dates = dates_to_ords(raw['date'])
+    keep = (dates != np.iinfo(np.int32).min) & (codes >= 0)
+
+    cols = {
+        'date': dates[keep],
+        'ticker': codes[keep],
+    }
+    for key in VALUE_COLS:
+        cols[key] = _to_floats(raw[key])[keep]
+    cols['tickers'] = np.array(tickers, dtype=object)
+    return cols
+
+
+def concat_columns(parts: list[dict]) -> dict:
+    """
+    Concatenate several column dictionaries into one.
+
+    The ticker codes of each part are translated into codes into the
+    sorted union of all tickers, so the rows of the parts can simply be
+    appended to each other.
+
+    Parameters
+    ----------
+    parts : list[dict]
+        Column dictionaries, e.g. one per `.dat` file.
+
+    Returns
+    -------
+    dict
+        A column dictionary with the rows of all parts, in order.
+    """
+    if not parts:
+        return lines_to_columns([])
+    tickers = np.unique(np.concatenate([p['tickers'] for p in parts]))
+    codes = []
+    for part in parts:
+        remap = np.searchsorted(tickers, part['tickers']).astype(np.int32)
+        codes.append(remap[part['ticker']])
+
+    cols = {'date': np.concatenate([p['date'] for p in parts])}
+    cols['ticker'] = np.concatenate(codes)
+    for key in VALUE_COLS:
+        cols[key] = np.concatenate([p[key] for p in parts])
+    cols['tickers'] = tickers.astype(object)
+    return cols
+
+
+# ----------------------------------------------------------------------------
+#  Conversion to the nested dictionaries used by `task_project1`
+# ----------------------------------------------------------------------------
+def missing_mask(cols: dict, column: str) -> np.ndarray:
+    """
+    Return a boolean array which is True where `column` is missing.
+    """
+    if column not in VALUE_COLS:
+        raise ValueError(f"Invalid column '{column}'")
+    return np.isnan(cols[column])
+
+
+def _values_list(cols: dict, column: str, order: np.ndarray) -> list:
+    """ Values of `column` in `order`, as floats or None if missing """
+    values = cols[column][order].tolist()
+    for i in np.flatnonzero(missing_mask(cols, column)[order]).tolist():
+        values[i] = None
+    return values
+
+
+def columns_to_nested_multi(
+        cols: dict,
+        columns: list[str],
+        encoded: bool = False,
+        ) -> dict:
+    """
+    Build the nested dictionaries returned by `organize_by_ticker` for
+    several columns at once.
+
+    The rows are grouped by ticker and each distinct date is converted
+    only once, so all the inner dictionaries share the same key objects and
+    each extra column only costs one `dict(zip(...))` per ticker.
+
+    Parameters
+    ----------
+    cols : dict
+        A column dictionary, as returned by `lines_to_columns`.
+
+    columns : list[str]
+        Columns to extract. Each must be one of `VALUE_COLS`.
+
+    encoded : bool, default False
+        If True, the outer keys are the integer ticker codes (positions in
+        `cols['tickers']`) and the inner keys are integer day ordinals.
+        The functions in `task_project1` accept these keys unchanged, and
+        they are smaller, faster to hash, and faster to sort than strings.
+        Use `decode_nested` or `decode_series` to convert the results back
+        to strings.
+
+    Returns
+    -------
+    dict[str, dict[str, dict[str, float | None]]]
+        A dictionary mapping each column in `columns` to a nested dictionary
+        of the form `{<ticker>: {<date>: <value>}}`, where `<value>` is a
+        float or `None` if missing. For well-formed lines, the nested
+        dictionary for `column` is equal to
+        `organize_by_ticker(lines_to_records(lines), column)`.
+    """
+    tickers = cols['tickers']
+    # Stable sort keeps the file order of the rows within each ticker
+    order = np.argsort(cols['ticker'], kind='stable')
+    bounds = np.searchsorted(
+        cols['ticker'][order], np.arange(len(tickers) + 1)).tolist()
+
+    uniq, date_idx = np.unique(cols['date'][order], return_inverse=True)
+    if encoded:
+        labels = uniq.tolist()
+        tickers = range(len(tickers))
+    else:
+        labels = ords_to_dates(uniq)
+    dates = list(map(labels.__getitem__, date_idx.tolist()))
+
+    out = {}
+    for column in columns:
+        values = _values_list(cols, column, order)
+        out[column] = {
+            tic: dict(zip(dates[lo:hi], values[lo:hi]))
+            for tic, lo, hi in zip(tickers, bounds[:-1], bounds[1:])
+        }
+    return out
+
+
+def decode_nested(nested: dict, tickers) -> dict:
+    """
+    Convert a nested dictionary with encoded keys (see
+    `columns_to_nested_multi`) into one keyed by ticker symbols and
+    `'YYYY-MM-DD'` dates.
+    """
+    out = {}
+    for code, by_date in nested.items():
+        dates = ords_to_dates(np.fromiter(by_date, dtype=np.int32, count=len(by_date)))
+        out[tickers[code]] = dict(zip(dates, by_date.values()))
+    return out
+
+
+def decode_series(by_date: dict) -> dict:
+    """
+    Convert a dictionary keyed by day ordinals, e.g. the output of
+    `mk_vw_port` on encoded inputs, into one keyed by `'YYYY-MM-DD'`
+    dates.
+    """
+    dates = ords_to_dates(np.fromiter(by_date, dtype=np.int32, count=len(by_date)))
+    return dict(zip(dates, by_date.values()))
+
+
+def columns_to_nested(cols: dict, column: str) -> dict:
+    """
+    Build the nested dictionary returned by `organize_by_ticker` from a
+    column dictionary.
+
+    Parameters
+    ----------
+    cols : dict
+        A column dictionary, as returned by `lines_to_columns`.
+
+    column : str
+        One of `VALUE_COLS`.
+
+    Returns
+    -------
+    dict[str, dict[str, float | None]]
+        A nested dictionary of the form `{<ticker>: {<date>: <value>}}`,
+        where `<value>` is a float or `None` if missing. For well-formed
+        lines, this is equal to
+        `organize_by_ticker(lines_to_records(lines), column)`.
+    """
+    return columns_to_nested_multi(cols, [column])[column]
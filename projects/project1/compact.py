@@ -0,0 +1,309 @@
+"""
+Module compact
+
+Compact binary storage for the contents of the `.dat` files in Project 1.
+
+Each `.dat` line repeats every field name and the ticker symbol, and
+the `shares` value usually stays the same for months, so the text files
+are several times larger than the information they hold. A compact file
+stores a whole universe (any number of tickers) as a small JSON header
+followed by raw little-endian arrays:
+
+     Array            Dtype     Contents
+     -----            -----     --------
+     ticker_counts    int64     number of rows of each ticker (the tickers
+                                themselves are a list in the header)
+     date             int32     day ordinals
+     open             float64   prices, NaN if missing
+     close            float64
+     adj_close        float64
+     shares_values    float64   shares, run-length encoded: each run of
+     shares_lengths   int64     equal values (or of NaN) is stored once
+                                with its length
+
+The rows are sorted by ticker and date, so the ticker column is replaced
+by one count per ticker (dictionary plus run-length encoding) and the
+runs of `shares` are as long as possible. Each array starts at an offset
+that is a multiple of `aligned.ALIGN`, so `read_compact` reads the file
+with a single call and only wraps the bytes in arrays; the only work done
+when loading is expanding the two run-length encoded columns.
+
+Use `dat_to_compact` and `compact_to_dat` to convert between formats.
+Values round-trip exactly, but the order of the lines and the textual
+form of the numbers (e.g. trailing zeros) do not.
+
+The layout (a magic string, the size of the JSON header, the header
+padded to a multiple of `aligned.ALIGN`, then the aligned arrays) is not
+specific to `.dat` contents and is implemented by `projects.aligned`.
+
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from projects.aligned import (
+        aligned_size,
+        read_aligned_header,
+        write_aligned,
+        )
+from projects.project1.cache import atomic_write
+from projects.project1.columnar import (
+        PRC_COLS,
+        ords_to_dates,
+        )
+from projects.project1.ingest import read_dat_columns
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+MAGIC = b'P1COMPCT'
+VERSION = 2
+
+# Dtype of each stored array
+ARRAYS = {
+    'ticker_counts': '<i8',
+    'date': '<i4',
+    **{key: '<f8' for key in PRC_COLS},
+    'shares_values': '<f8',
+    'shares_lengths': '<i8',
+}
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def _run_length_encode(values: np.ndarray, bounds: np.ndarray) -> tuple:
+    """
+    Return `(run_values, run_lengths)`, where runs are broken where the
+    value changes and at each position in `bounds`. Consecutive NaN values
+    form a single run.
+    """
+    starts = np.zeros(len(values), dtype=bool)
+    if len(values):
+        starts[0] = True
+        starts[1:] = ~((values[1:] == values[:-1])
+                       | (np.isnan(values[1:]) & np.isnan(values[:-1])))
+        starts[bounds[(bounds > 0) & (bounds < len(values))]] = True
+    pos = np.flatnonzero(starts)
+    lengths = np.diff(np.append(pos, len(values)))
+    return values[pos], lengths
+
+
+def _encode(cols: dict) -> tuple:
+    """
+    Return the header and the arrays of the compact file for a column
+    dictionary.
+    """
+    # Sort by ticker, then date. The sort is stable, so duplicate rows
+    # stay in their original order
+    order = np.lexsort((cols['date'], cols['ticker']))
+    ntickers = len(cols['tickers'])
+    counts = np.bincount(cols['ticker'], minlength=ntickers).astype(np.int64)
+    bounds = np.cumsum(counts)
+
+    arrays = {
+        'ticker_counts': counts,
+        'date': cols['date'][order],
+    }
+    for key in PRC_COLS:
+        arrays[key] = cols[key][order]
+    arrays['shares_values'], arrays['shares_lengths'] = _run_length_encode(
+        cols['shares'][order], bounds)
+
+    header = {
+        'version': VERSION,
+        'nrows': len(order),
+        'tickers': [str(tic) for tic in cols['tickers']],
+        'arrays': {},
+    }
+    offset = 0
+    for key, dtype in ARRAYS.items():
+        arrays[key] = np.ascontiguousarray(arrays[key], dtype=dtype)
+        header['arrays'][key] = {'offset': offset, 'count': len(arrays[key])}
+        offset += aligned_size(arrays[key].nbytes)
+    return header, arrays
+
+
+def _decode(header: dict, buf) -> dict:
+    """
+    Build a column dictionary from the header of a compact file and a
+    buffer with its data section.
+    """
+    arrays = {}
+    for key, dtype in ARRAYS.items():
+        loc = header['arrays'][key]
+        arrays[key] = np.frombuffer(
+            buf, dtype=dtype, count=loc['count'], offset=loc['offset'])
+
+    ntickers = len(header['tickers'])
+    counts = arrays['ticker_counts']
+    cols = {
+        'date': arrays['date'].astype(np.int32, copy=False),
+        'ticker': np.repeat(np.arange(ntickers, dtype=np.int32), counts),
+    }
+    for key in PRC_COLS:
+        cols[key] = arrays[key].astype(np.float64, copy=False)
+    cols['shares'] = np.repeat(
+        arrays['shares_values'].astype(np.float64, copy=False),
+        arrays['shares_lengths'])
+    cols['tickers'] = np.array(header['tickers'], dtype=object)
+    if len(cols['ticker']) != header['nrows'] or len(cols['shares']) != header['nrows']:
+        raise ValueError("Invalid compact file: inconsistent row counts")
+    return cols
+
+
+# ----------------------------------------------------------------------------
+#  Reading and writing
+# ----------------------------------------------------------------------------
+def write_compact(cols: dict, pth: Path) -> Path:
+    """
+    Store a column dictionary in a compact file.
+
+    Parameters
+    ----------
+    cols : dict
+        A column dictionary (see `columnar`).
+
+    pth : Path
+        Location of the compact file. It is written with
+        `cache.atomic_write`.
+
+    Returns
+    -------
+    Path
+        The location of the compact file.
+    """
+    pth = Path(pth)
+    header, arrays = _encode(cols)
+    write_aligned(pth, MAGIC, header, [arrays[key] for key in ARRAYS])
+    return pth
+
+
+def read_compact(pth: Path, mmap: bool = False) -> dict:
+    """
+    Load a compact file into a column dictionary.
+
+    Parameters
+    ----------
+    pth : Path
+        Location of the compact file.
+
+    mmap : bool, default False
+        If True, the file is memory-mapped instead of read, and the date
+        and price arrays are read-only views of the mapping, so only the
+        pages that are used are ever read from disk.
+
+    Returns
+    -------
+    dict
+        A column dictionary (see `columnar`), with the rows sorted by
+        ticker and date.
+
+    Raises
+    ------
+    ValueError
+        If `pth` is not a compact file.
+
+    Examples
+    --------
+    >> dat_to_compact(['data/aapl.dat', 'data/csco.dat'], 'prices.p1c')
+    >> cols = read_compact('prices.p1c')
+    >> cols['tickers']
+    array(['AAPL', 'CSCO'], dtype=object)
+    """
+    pth = Path(pth)
+    with open(pth, 'rb') as fobj:
+        header, start = read_aligned_header(fobj, MAGIC, VERSION)
+        size = pth.stat().st_size - start
+        if mmap and size > 0:
+            buf = np.memmap(pth, dtype=np.uint8, mode='r', offset=start)
+        else:
+            # One read straight into a writable buffer
+            buf = bytearray(size)
+            fobj.readinto(buf)
+    return _decode(header, buf)
+
+
+# ----------------------------------------------------------------------------
+#  Conversion from and to `.dat` files
+# ----------------------------------------------------------------------------
+def columns_to_lines(cols: dict) -> list[str]:
+    """
+    Format the rows of a column dictionary as `.dat` lines. Missing values
+    are left blank, prices use the shortest text that converts back to
+    the same float, and whole share counts are written without a decimal
+    point.
+
+    Examples
+    --------
+    >> columns_to_lines(read_compact('prices.p1c'))[0]
+    'date:2008-01-02,ticker:AAPL,open:199.27,close:194.84,adj_close:24.1074,shares:'
+    """
+    dates = ords_to_dates(cols['date'])
+    tickers = cols['tickers'][cols['ticker']].tolist()
+    fields = {}
+    for key in PRC_COLS:
+        fields[key] = ['' if v != v else repr(v) for v in cols[key].tolist()]
+    fields['shares'] = [
+        '' if v != v else str(int(v)) if v.is_integer() else repr(v)
+        for v in cols['shares'].tolist()
+    ]
+    return [
+        f"date:{date},ticker:{tic},open:{opn},close:{close},"
+        f"adj_close:{adj},shares:{shr}"
+        for date, tic, opn, close, adj, shr in zip(
+            dates, tickers, fields['open'], fields['close'],
+            fields['adj_close'], fields['shares'])
+    ]
+
+
+def dat_to_compact(paths: list[Path], out: Path, workers: int | None = 1) -> Path:
+    """
+    Convert one or more `.dat` files into a single compact file.
+
+    Parameters
+    ----------
+    paths : list[Path]
+        Locations of the `.dat` files (e.g. one per ticker).
+
+    out : Path
+        Location of the compact file.
+
+    workers : int, optional
+        Number of worker processes used to parse the files (see
+        `ingest.read_dat_columns`).
+
+    Returns
+    -------
+    Path
+        The location of the compact file.
+    """
+    cols = read_dat_columns(paths, workers=workers, scan=True)
+    return write_compact(cols, out)
+
+
+def compact_to_dat(pth: Path, out_dir: Path) -> list[Path]:
+    """
+    Convert a compact file back into `.dat` files, one per ticker, named
+    `<ticker>.dat` with the ticker in lower case. The lines of each file
+    are sorted by date, and each file is written with `cache.atomic_write`.
+
+    Returns
+    -------
+    list[Path]
+        The locations of the `.dat` files, in ticker order.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cols = read_compact(pth)
+    lines = columns_to_lines(cols)
+    bounds = np.searchsorted(cols['ticker'], np.arange(len(cols['tickers']) + 1)).tolist()
+    paths = []
+    for tic, lo, hi in zip(cols['tickers'], bounds[:-1], bounds[1:]):
+        dat_pth = out_dir / f'{tic.lower()}.dat'
+        with atomic_write(dat_pth, 'w') as fobj:
+            fobj.write(''.join(line + '\n' for line in lines[lo:hi]))
+        paths.append(dat_pth)
+    return paths
@@ -0,0 +1,239 @@
+"""
+Module extsort
+
+External merge sort for `.dat` files whose lines are not in date order.
+
+`calc_rets` sorts each ticker's dates in memory, which requires the whole
+history of the ticker to fit in RAM. The functions in this module sort a
+`.dat` file of any size with a bounded amount of memory instead:
+
+1. The file is read `run_size` lines at a time. Each batch is sorted by
+   (ticker, date) and spilled to a temporary file (a "sorted run").
+2. The sorted runs are merged lazily with `heapq.merge`, which only keeps
+   one line per run in memory.
+
+The merged lines are then streamed into the return computation
+(`iter_rets`) and into the streaming value-weighted accumulators (see
+`streaming`).
+
+"""
+
+import datetime as dt
+import heapq
+import tempfile
+from itertools import islice
+from pathlib import Path
+
+from projects.project1.streaming import (
+        accumulator_to_vw,
+        extend_accumulator,
+        new_accumulator,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+# Maximum number of lines held in memory while building the sorted runs
+RUN_SIZE = 100_000
+
+# Day ordinal of 1970-01-01 (see `columnar.dates_to_ords`)
+EPOCH_ORD = dt.date(1970, 1, 1).toordinal()
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def line_to_fields(line: str) -> dict[str, str]:
+    """
+    Return a dictionary with the `key:value` pairs in one `.dat` line.
+    """
+    return dict(ele.partition(':')[::2] for ele in line.split(','))
+
+
+def sort_key(line: str) -> tuple[str, str]:
+    """
+    Return the (ticker, date) pair used to sort the lines. Dates in
+    `'YYYY-MM-DD'` format sort in chronological order as strings.
+    """
+    fields = line_to_fields(line)
+    return fields.get('ticker', ''), fields.get('date', '')
+
+
+def _to_float(value: str) -> float | None:
+    """ Convert a string into a float, or None if it is blank """
+    value = value.strip()
+    return float(value) if value else None
+
+
+# ----------------------------------------------------------------------------
+#  External sort
+# ----------------------------------------------------------------------------
+def write_sorted_runs(pth: Path, tmp_dir: Path, run_size: int = RUN_SIZE) -> list[Path]:
+    """
+    Split the `.dat` file `pth` into sorted runs of at most `run_size`
+    lines, stored in `tmp_dir`. Blank lines are dropped.
+
+    Returns
+    -------
+    list[Path]
+        The locations of the sorted runs, in the order they were written.
+    """
+    runs = []
+    with open(pth) as fobj:
+        lines = (line.rstrip('\n') for line in fobj)
+        lines = (line for line in lines if line and not line.isspace())
+        while True:
+            batch = list(islice(lines, run_size))
+            if not batch:
+                break
+            # `sorted` is stable, so lines with the same key keep their
+            # order in the file
+            batch.sort(key=sort_key)
+            run = Path(tmp_dir) / f'run{len(runs):06d}.dat'
+            run.write_text('\n'.join(batch) + '\n')
+            runs.append(run)
+    return runs
+
+
+def iter_sorted_lines(pth: Path, run_size: int = RUN_SIZE, tmp_dir: Path | None = None):
+    """
+    Yield the lines of the `.dat` file `pth` sorted by (ticker, date),
+    using an external merge sort.
+
+    Parameters
+    ----------
+    pth : Path
+        Location of the `.dat` file.
+
+    run_size : int, default RUN_SIZE
+        Maximum number of lines held in memory while sorting.
+
+    tmp_dir : Path, optional
+        Folder where the temporary sorted runs are created. Defaults to
+        the system temporary folder. The runs are deleted when the
+        generator is exhausted or closed.
+
+    Yields
+    ------
+    str
+        The non-blank lines of the file. Lines with the same ticker and
+        date are yielded in the order they appear in the file.
+    """
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        runs = write_sorted_runs(pth, tmp, run_size=run_size)
+        fobjs = [open(run) for run in runs]
+        try:
+            # `heapq.merge` takes lines with equal keys from earlier runs
+            # first, so the file order is preserved
+            merged = heapq.merge(
+                *[(line.rstrip('\n') for line in fobj) for fobj in fobjs],
+                key=sort_key,
+            )
+            yield from merged
+        finally:
+            for fobj in fobjs:
+                fobj.close()
+
+
+# ----------------------------------------------------------------------------
+#  Streaming computations on sorted lines
+# ----------------------------------------------------------------------------
+def iter_rets(sorted_lines, prc_col: str = 'adj_close'):
+    """
+    Compute returns from lines sorted by (ticker, date), one date at a
+    time.
+
+    The rules are the same as in `calc_rets`: the first date of each
+    ticker has a return of None, and so does any date whose price or prior
+    price is missing, or whose prior price is non-positive. If a ticker has
+    several lines for the same date, the last one is used, as in
+    `organize_by_ticker`. Lines without a ticker or a date are skipped.
+
+    Parameters
+    ----------
+    sorted_lines : iterable of str
+        Lines sorted by (ticker, date), e.g. from `iter_sorted_lines`.
+
+    prc_col : str, default 'adj_close'
+        The name of the price column.
+
+    Yields
+    ------
+    tuple
+        `(ticker, date, ret, fields)`, where `fields` is the dictionary of
+        `key:value` pairs of the line used for that date.
+    """
+    def _dedup(lines):
+        # Keep the last line for each (ticker, date) pair
+        prior = None
+        for line in lines:
+            fields = line_to_fields(line)
+            if not fields.get('ticker') or not fields.get('date'):
+                continue
+            if prior is not None and (
+                    prior['ticker'], prior['date']) != (fields['ticker'], fields['date']):
+                yield prior
+            prior = fields
+        if prior is not None:
+            yield prior
+
+    ticker = None
+    prior_prc = None
+    for fields in _dedup(sorted_lines):
+        prc = _to_float(fields[prc_col])
+        ret = None
+        if fields['ticker'] != ticker:
+            ticker = fields['ticker']
+        elif prc is not None and prior_prc is not None and prior_prc > 0:
+            ret = (prc / prior_prc) - 1
+        prior_prc = prc
+        yield ticker, fields['date'], ret, fields
+
+
+def fold_sorted_file(
+        acc: dict,
+        pth: Path,
+        prc_col: str = 'adj_close',
+        run_size: int = RUN_SIZE,
+        tmp_dir: Path | None = None,
+        ):
+    """
+    Add the contributions of all the tickers in the (unsorted) `.dat` file
+    `pth` to the streaming accumulators `acc` (see `streaming`), keeping at
+    most `run_size` lines in memory.
+    """
+    lines = iter_sorted_lines(pth, run_size=run_size, tmp_dir=tmp_dir)
+    for _, date, ret, fields in iter_rets(lines, prc_col=prc_col):
+        if ret is None:
+            continue
+        prc = _to_float(fields[prc_col])
+        shr = _to_float(fields['shares'])
+        if shr is None:
+            continue
+        mv = prc * shr
+        pos = dt.date.fromisoformat(date).toordinal() - EPOCH_ORD
+        extend_accumulator(acc, pos, pos)
+        acc['numer'][pos - acc['start']] += mv * ret
+        acc['denom'][pos - acc['start']] += mv
+
+
+def sorted_vw_rets(
+        paths: list[Path],
+        prc_col: str = 'adj_close',
+        run_size: int = RUN_SIZE,
+        tmp_dir: Path | None = None,
+        ) -> dict:
+    """
+    Compute value-weighted portfolio returns from unsorted `.dat` files of
+    any size, using an external merge sort for each file.
+
+    Returns
+    -------
+    dict[str, float]
+        The same dictionary `mk_vw_port` returns for these files.
+    """
+    acc = new_accumulator()
+    for pth in paths:
+        fold_sorted_file(acc, pth, prc_col=prc_col, run_size=run_size, tmp_dir=tmp_dir)
+    return accumulator_to_vw(acc)
@@ -0,0 +1,519 @@
+"""
+Module incremental
+
+Incremental updates of the value-weighted portfolio returns.
+
+Rerunning `main.main` over the full history to add one trading day means
+re-parsing every file and recomputing every date. The functions in this
+module instead keep a "state" with the aligned panels (see `panel`) and
+the portfolio returns computed so far, and update it with newly arrived
+lines only:
+
+- a line for a new date adds a column, and only that date's portfolio
+  return is computed (using the last present price of each ticker);
+- a late-arriving or corrected line changes the return and market value
+  of that ticker on that date, and the return on its next present date,
+  so only those dates are recomputed.
+
+The state is a panel dictionary with the extra keys:
+
+     Key        Dtype     Shape                Description
+     ---        -----     -----                -----------
+     prc_col    str       ()                   name of the price column
+     rets       float64   (ntickers, ndates)   see `panel.mk_rets_panel`
+     mkt_val    float64   (ntickers, ndates)   see `panel.mk_mkt_val_panel`
+     vw         float64   (ndates,)            see `panel.mk_vw_port_panel`
+
+The (ntickers, ndates) arrays and `vw` are views of larger buffers
+(`state['buffers']`) with room for more dates. Appending a date only
+widens the views; when the room runs out, the buffers are reallocated
+with twice as many dates, so adding dates one at a time costs a constant
+amount per ticker on average instead of a copy of the whole history.
+
+`update_vw_file` keeps the state on disk for daily updates. Lines for new
+dates only need each ticker's last present price and shares, so it
+stores three files:
+
+- `<name>.npz`: the full state (see `save_state`), a checkpoint that is
+  only loaded and saved for late or corrected lines;
+- `<name>.tail.npz`: the "tail" (see `state_to_tail`), i.e. the last
+  present price and shares of each ticker and the portfolio returns;
+- `<name>.pending.dat`: the lines for new dates received since the
+  checkpoint was saved, replayed the next time it is loaded.
+
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.cache import atomic_write
+from projects.project1.columnar import lines_to_columns
+from projects.project1.panel import (
+        columns_to_panel,
+        mk_mkt_val_panel,
+        mk_rets_panel,
+        mk_vw_port_panel,
+        next_present,
+        prior_present,
+        series_to_dict,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+# Keys of the state holding (ntickers, ndates) arrays
+PANEL_KEYS = ('present', 'prc', 'shares', 'rets', 'mkt_val')
+
+# Keys of the tail (see `state_to_tail`)
+TAIL_KEYS = ('prc_col', 'tickers', 'has_last', 'last_prc', 'last_shares',
+             'dates', 'vw', 'pending_size')
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def _fill(key: str):
+    """ Value of the cells of `key` without data """
+    return False if key == 'present' else np.nan
+
+
+def _append_dates(state: dict, dates: np.ndarray):
+    """
+    Expand the arrays in `state` (in place) to `dates`, which must start
+    with the current dates, by widening the views of the buffers.
+    """
+    ndates = len(state['dates'])
+    buffers = state.get('buffers')
+    if buffers is None or len(buffers['vw']) < len(dates):
+        # Reallocate with room for as many new dates as there are now
+        capacity = max(len(dates), 2 * ndates)
+        shape = (len(state['tickers']), capacity)
+        buffers = {}
+        for key in PANEL_KEYS:
+            buffers[key] = np.full(shape, _fill(key), dtype=state[key].dtype)
+            buffers[key][:, :ndates] = state[key]
+        buffers['vw'] = np.full(capacity, np.nan)
+        buffers['vw'][:ndates] = state['vw']
+        state['buffers'] = buffers
+    for key in PANEL_KEYS:
+        state[key] = buffers[key][:, :len(dates)]
+    state['vw'] = buffers['vw'][:len(dates)]
+    state['dates'] = dates
+
+
+def _reindex(state: dict, tickers: np.ndarray, dates: np.ndarray):
+    """
+    Expand the arrays in `state` (in place) to the given sorted tickers and
+    dates, which must include the current ones.
+    """
+    ntickers = len(state['tickers'])
+    ndates = len(state['dates'])
+    if len(tickers) == ntickers and len(dates) == ndates:
+        return
+    if len(tickers) == ntickers and (ndates == 0 or dates[ndates - 1] == state['dates'][-1]):
+        # Only dates after the last one: no cell moves
+        _append_dates(state, dates)
+        return
+
+    rows = np.searchsorted(tickers, state['tickers'])
+    cols = np.searchsorted(dates, state['dates'])
+    shape = (len(tickers), len(dates))
+    for key in PANEL_KEYS:
+        arr = np.full(shape, _fill(key), dtype=state[key].dtype)
+        arr[np.ix_(rows, cols)] = state[key]
+        state[key] = arr
+    vw = np.full(len(dates), np.nan)
+    vw[cols] = state['vw']
+    state['vw'] = vw
+    state['tickers'] = tickers
+    state['dates'] = dates
+    state.pop('buffers', None)
+
+
+def _cell_rets(state: dict, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    Compute the returns for the cells `(rows[k], cols[k])`, with the same
+    rules as `panel.mk_rets_panel`.
+    """
+    prc = state['prc']
+    present = state['present']
+    prior = prior_present(present, rows, cols)
+    has_prior = prior >= 0
+    cur = prc[rows, cols]
+    prev = np.where(has_prior, prc[rows, np.where(has_prior, prior, 0)], np.nan)
+    valid = has_prior & (prev > 0) & ~np.isnan(cur) & present[rows, cols]
+    rets = np.full(len(rows), np.nan)
+    rets[valid] = (cur[valid] / prev[valid]) - 1
+    return rets
+
+
+# ----------------------------------------------------------------------------
+#  State
+# ----------------------------------------------------------------------------
+def init_state(cols: dict, prc_col: str = 'adj_close') -> dict:
+    """
+    Compute the state from scratch from a column dictionary (see
+    `columnar.lines_to_columns`).
+    """
+    panel = columns_to_panel(cols, columns=[prc_col, 'shares'])
+    state = {
+        'prc_col': prc_col,
+        'tickers': panel['tickers'],
+        'dates': panel['dates'],
+        'present': panel['present'],
+        'prc': panel[prc_col],
+        'shares': panel['shares'],
+    }
+    state['rets'] = mk_rets_panel(state, prc_col='prc')
+    state['mkt_val'] = mk_mkt_val_panel(state, prc_col='prc')
+    state['vw'] = mk_vw_port_panel(state['rets'], state['mkt_val'])
+    return state
+
+
+def update_state(state: dict, cols: dict) -> np.ndarray:
+    """
+    Update the state (in place) with new lines.
+
+    Parameters
+    ----------
+    state : dict
+        The state, as returned by `init_state` or `load_state`.
+
+    cols : dict
+        A column dictionary with the new lines. Lines for a (ticker, date)
+        pair already in the state replace the existing values.
+
+    Returns
+    -------
+    ndarray
+        The sorted day ordinals whose portfolio return was recomputed.
+
+    Notes
+    -----
+    After the update, `state['vw']` is identical to the result of
+    computing it from scratch with all the lines received so far (in the
+    order they were received).
+    """
+    prc_col = state['prc_col']
+    new = columns_to_panel(cols, columns=[prc_col, 'shares'])
+    _reindex(
+        state,
+        np.union1d(state['tickers'], new['tickers']).astype(object),
+        np.union1d(state['dates'], new['dates']).astype(np.int32),
+    )
+
+    # Write the new values
+    new_rows, new_cols = np.nonzero(new['present'])
+    rows = np.searchsorted(state['tickers'], new['tickers'])[new_rows]
+    cols = np.searchsorted(state['dates'], new['dates'])[new_cols]
+    state['present'][rows, cols] = True
+    state['prc'][rows, cols] = new[prc_col][new_rows, new_cols]
+    state['shares'][rows, cols] = new['shares'][new_rows, new_cols]
+    state['mkt_val'][rows, cols] = state['prc'][rows, cols] * state['shares'][rows, cols]
+
+    # The return on the next present date depends on the new price too
+    nxt = next_present(state['present'], rows, cols)
+    has_next = nxt >= 0
+    ret_rows = np.concatenate([rows, rows[has_next]])
+    ret_cols = np.concatenate([cols, nxt[has_next]])
+    state['rets'][ret_rows, ret_cols] = _cell_rets(state, ret_rows, ret_cols)
+
+    affected = np.unique(ret_cols)
+    state['vw'][affected] = mk_vw_port_panel(
+        state['rets'][:, affected], state['mkt_val'][:, affected])
+    return state['dates'][affected]
+
+
+def replace_tickers(state: dict, cols: dict, tickers) -> np.ndarray:
+    """
+    Replace (in place) all the lines of some tickers, e.g. after their
+    `.dat` files were rewritten.
+
+    Parameters
+    ----------
+    state : dict
+        The state, as returned by `init_state` or `load_state`.
+
+    cols : dict
+        A column dictionary with the complete new lines of `tickers`.
+        Lines for other tickers are ignored. Tickers without lines in
+        `cols` are removed from the portfolio.
+
+    tickers : list[str]
+        Ticker symbols whose lines are replaced.
+
+    Returns
+    -------
+    ndarray
+        The sorted day ordinals whose portfolio return changed.
+
+    Notes
+    -----
+    Only the rows of `tickers` are recomputed, and only the dates where
+    one of their returns or market values changed are summed again. After
+    the update, `state['vw']` is identical to the result of computing it
+    from scratch with the new lines.
+    """
+    prc_col = state['prc_col']
+    new = columns_to_panel(cols, columns=[prc_col, 'shares'])
+    keep = np.isin(new['tickers'], tickers)
+    tickers = np.unique(np.asarray(tickers, dtype=object))
+    _reindex(
+        state,
+        np.union1d(state['tickers'], tickers).astype(object),
+        np.union1d(state['dates'], new['dates'][new['present'][keep].any(axis=0)])
+        .astype(np.int32),
+    )
+    rows = np.searchsorted(state['tickers'], tickers)
+    old_rets = state['rets'][rows]
+    old_mkt_val = state['mkt_val'][rows]
+
+    # Clear the rows and write the new values
+    state['present'][rows] = False
+    state['prc'][rows] = np.nan
+    state['shares'][rows] = np.nan
+    new_rows, new_cols = np.nonzero(new['present'] & keep[:, None])
+    cells = (
+        np.searchsorted(state['tickers'], new['tickers'][new_rows]),
+        np.searchsorted(state['dates'], new['dates'][new_cols]),
+    )
+    state['present'][cells] = True
+    state['prc'][cells] = new[prc_col][new_rows, new_cols]
+    state['shares'][cells] = new['shares'][new_rows, new_cols]
+
+    # Returns and market values only depend on the row of each ticker
+    sub = {key: state[key][rows] for key in ('present', 'prc', 'shares')}
+    state['rets'][rows] = mk_rets_panel(sub, prc_col='prc')
+    state['mkt_val'][rows] = mk_mkt_val_panel(sub, prc_col='prc')
+
+    changed = ~(
+        ((state['rets'][rows] == old_rets)
+         | (np.isnan(state['rets'][rows]) & np.isnan(old_rets)))
+        & ((state['mkt_val'][rows] == old_mkt_val)
+           | (np.isnan(state['mkt_val'][rows]) & np.isnan(old_mkt_val)))
+    )
+    affected = np.flatnonzero(changed.any(axis=0))
+    state['vw'][affected] = mk_vw_port_panel(
+        state['rets'][:, affected], state['mkt_val'][:, affected])
+    return state['dates'][affected]
+
+
+def state_to_vw(state: dict, dates: np.ndarray | None = None) -> dict:
+    """
+    Return the value-weighted portfolio returns in the state.
+
+    Parameters
+    ----------
+    state : dict
+        The state.
+
+    dates : ndarray, optional
+        If given, only return these day ordinals (e.g. the output of
+        `update_state`).
+
+    Returns
+    -------
+    dict[str, float]
+        A dictionary mapping each date (in `'YYYY-MM-DD'` format) to the
+        value-weighted portfolio return on that date.
+    """
+    vw = state['vw']
+    if dates is not None:
+        vw = np.where(np.isin(state['dates'], dates), vw, np.nan)
+    return series_to_dict(state, vw)
+
+
+def save_state(state: dict, pth: Path):
+    """
+    Store the state in the `.npz` file `pth`.
+    """
+    arrays = {key: value for key, value in state.items() if key not in ('tickers', 'buffers')}
+    arrays['tickers'] = state['tickers'].astype(str)
+    with atomic_write(pth) as fobj:
+        np.savez(fobj, **arrays)
+
+
+def load_state(pth: Path) -> dict:
+    """
+    Read a state stored with `save_state`.
+    """
+    with np.load(pth, allow_pickle=False) as npz:
+        state = {key: npz[key] for key in npz.files}
+    state['prc_col'] = str(state['prc_col'])
+    state['tickers'] = state['tickers'].astype(object)
+    return state
+
+
+# ----------------------------------------------------------------------------
+#  Files
+# ----------------------------------------------------------------------------
+def _last_values(panel: dict) -> dict:
+    """
+    Return the `has_last`, `last_prc` and `last_shares` arrays of the tail
+    (see `state_to_tail`) for a panel with the columns `prc` and `shares`.
+    """
+    present = panel['present']
+    rows = np.flatnonzero(present.any(axis=1))
+    last = present.shape[1] - 1 - np.argmax(present[rows, ::-1], axis=1)
+    out = {
+        'has_last': np.zeros(len(present), dtype=bool),
+        'last_prc': np.full(len(present), np.nan),
+        'last_shares': np.full(len(present), np.nan),
+    }
+    out['has_last'][rows] = True
+    out['last_prc'][rows] = panel['prc'][rows, last]
+    out['last_shares'][rows] = panel['shares'][rows, last]
+    return out
+
+
+def state_to_tail(state: dict) -> dict:
+    """
+    Return what `update_vw_file` needs from the state to add lines for
+    new dates:
+
+     Key           Dtype     Shape          Description
+     ---           -----     -----          -----------
+     prc_col       str       ()             name of the price column
+     tickers       object    (ntickers,)    as in the state
+     has_last      bool      (ntickers,)    whether the ticker has a line
+     last_prc      float64   (ntickers,)    price on its last present date
+     last_shares   float64   (ntickers,)    shares on its last present date
+     dates         int32     (ndates,)      as in the state
+     vw            float64   (ndates,)      as in the state
+     pending_size  int64     ()             see `update_vw_file`
+    """
+    tail = {'prc_col': state['prc_col'], 'tickers': state['tickers']}
+    tail.update(_last_values(state))
+    tail.update({
+        'dates': np.array(state['dates'], dtype=np.int32),
+        'vw': np.array(state['vw']),
+        'pending_size': 0,
+    })
+    return tail
+
+
+def _tail_path(pth: Path) -> Path:
+    """ Location of the tail of the state stored in `pth` """
+    return pth.with_name(f'{pth.stem}.tail.npz')
+
+
+def _pending_path(pth: Path) -> Path:
+    """ Location of the pending lines of the state stored in `pth` """
+    return pth.with_name(f'{pth.stem}.pending.dat')
+
+
+def _save_tail(tail: dict, pth: Path):
+    """ Store the tail of the state stored in `pth` """
+    arrays = dict(tail, tickers=tail['tickers'].astype(str))
+    with atomic_write(_tail_path(pth)) as fobj:
+        np.savez(fobj, **arrays)
+
+
+def _load_tail(pth: Path) -> dict | None:
+    """
+    Read the tail stored next to `pth`, or return None if it is missing
+    or does not match the pending lines.
+    """
+    pending = _pending_path(pth)
+    try:
+        with np.load(_tail_path(pth), allow_pickle=False) as npz:
+            tail = {key: npz[key] for key in npz.files}
+    except (OSError, ValueError):
+        return None
+    if set(tail) != set(TAIL_KEYS):
+        return None
+    size = pending.stat().st_size if pending.exists() else 0
+    if int(tail['pending_size']) != size:
+        return None
+    tail['prc_col'] = str(tail['prc_col'])
+    tail['tickers'] = tail['tickers'].astype(object)
+    return tail
+
+
+def _append_tail(tail: dict, cols: dict) -> np.ndarray:
+    """
+    Add lines whose dates are all after `tail['dates']` to the tail (in
+    place), and return the portfolio returns on the new dates.
+
+    The returns are computed on a panel whose first column holds the last
+    present price and shares of each ticker, followed by the new dates.
+    Each return is relative to the same prior price as in the full panel,
+    and the sums run over the same tickers in the same order, so the
+    results are identical to `update_state`.
+    """
+    prc_col = tail['prc_col']
+    new = columns_to_panel(cols, columns=[prc_col, 'shares'])
+    tickers = np.union1d(tail['tickers'], new['tickers']).astype(object)
+    old_rows = np.searchsorted(tickers, tail['tickers'])
+    new_rows = np.searchsorted(tickers, new['tickers'])
+    shape = (len(tickers), 1 + len(new['dates']))
+    panel = {
+        'present': np.zeros(shape, dtype=bool),
+        'prc': np.full(shape, np.nan),
+        'shares': np.full(shape, np.nan),
+    }
+    panel['present'][old_rows, 0] = tail['has_last']
+    panel['prc'][old_rows, 0] = tail['last_prc']
+    panel['shares'][old_rows, 0] = tail['last_shares']
+    panel['present'][new_rows, 1:] = new['present']
+    panel['prc'][new_rows, 1:] = new[prc_col]
+    panel['shares'][new_rows, 1:] = new['shares']
+    rets = mk_rets_panel(panel, prc_col='prc')
+    mkt_val = mk_mkt_val_panel(panel, prc_col='prc')
+    vw = mk_vw_port_panel(rets[:, 1:], mkt_val[:, 1:])
+
+    tail['tickers'] = tickers
+    tail.update(_last_values(panel))
+    tail['dates'] = np.concatenate([tail['dates'], new['dates']]).astype(np.int32)
+    tail['vw'] = np.concatenate([tail['vw'], vw])
+    return vw
+
+
+def update_vw_file(pth: Path, lines: list[str], prc_col: str = 'adj_close') -> dict:
+    """
+    Apply new `.dat` lines to the state stored in `pth` (creating it if it
+    does not exist), save it, and return the portfolio returns on the
+    dates that were recomputed.
+
+    If all the lines are for dates after the last date received so far,
+    only the tail next to `pth` is read and written, and the lines are
+    appended to the pending file (see the module docstring). Otherwise
+    (late or corrected lines), the full state is loaded, the pending
+    lines and the new lines are applied to it, and it is saved again.
+
+    Returns
+    -------
+    dict[str, float]
+        A dictionary mapping each recomputed date (in `'YYYY-MM-DD'`
+        format) to its value-weighted portfolio return.
+    """
+    pth = Path(pth)
+    cols = lines_to_columns(lines)
+    pending = _pending_path(pth)
+    tail = _load_tail(pth) if pth.exists() else None
+    if (tail is not None and len(tail['dates'])
+            and (len(cols['date']) == 0 or cols['date'].min() > tail['dates'][-1])):
+        vw = _append_tail(tail, cols)
+        # The lines are stored before the tail that refers to them
+        with open(pending, 'a', encoding='utf-8', newline='\n') as fobj:
+            fobj.writelines(line.rstrip('\n') + '\n' for line in lines)
+        tail['pending_size'] = pending.stat().st_size
+        _save_tail(tail, pth)
+        return series_to_dict(tail, np.where(np.isin(tail['dates'], cols['date']), tail['vw'], np.nan))
+
+    # The tail is stale until the new state is saved
+    _tail_path(pth).unlink(missing_ok=True)
+    if pth.exists():
+        state = load_state(pth)
+        if pending.exists():
+            update_state(state, lines_to_columns(pending.read_text(encoding='utf-8').splitlines()))
+        affected = update_state(state, cols)
+    else:
+        state = init_state(cols, prc_col=prc_col)
+        affected = state['dates']
+    save_state(state, pth)
+    pending.unlink(missing_ok=True)
+    _save_tail(state_to_tail(state), pth)
+    return state_to_vw(state, affected)
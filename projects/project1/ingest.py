@@ -0,0 +1,82 @@
+"""
+Module ingest
+
+Parallel ingestion of many `.dat` files.
+
+Each `.dat` file is parsed into its own column dictionary (see
+`columnar`) in a separate process, and the per-file dictionaries are then
+merged with `columnar.concat_columns`, which only concatenates arrays.
+Since files are independent, ingestion scales with the number of cores
+until reading the files from disk becomes the bottleneck.
+
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from projects.project1.cache import load_columns
+from projects.project1.columnar import (
+        concat_columns,
+        lines_to_columns,
+        )
+from projects.project1.scan import scan_dat_file
+
+
+def parse_dat_file(pth: Path) -> dict:
+    """
+    Read and parse one `.dat` file into a column dictionary.
+    """
+    return lines_to_columns(Path(pth).read_text().splitlines())
+
+
+def read_dat_columns(
+        paths: list[Path],
+        workers: int | None = None,
+        cache_dir: Path | None = None,
+        scan: bool = False,
+        ) -> dict:
+    """
+    Read and parse several `.dat` files into a single column dictionary.
+
+    Parameters
+    ----------
+    paths : list[Path]
+        Locations of the `.dat` files.
+
+    workers : int, optional
+        Number of worker processes. If None, use one per CPU. If 1, the
+        files are parsed in the current process.
+
+    cache_dir : Path, optional
+        If given, each file is loaded with `cache.load_columns`, which
+        reuses (and maintains) the binary cache in this folder.
+
+    scan : bool, default False
+        If True (and `cache_dir` is None), each file is memory-mapped and
+        parsed with `scan.scan_dat_file` instead of `parse_dat_file`.
+
+    Returns
+    -------
+    dict
+        A column dictionary with the rows of all files, in the order of
+        `paths`.
+    """
+    if cache_dir is not None:
+        func = partial(load_columns, cache_dir=cache_dir)
+    elif scan:
+        func = scan_dat_file
+    else:
+        func = parse_dat_file
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        parts = [func(pth) for pth in paths]
+    else:
+        # Send several files to a worker at a time, so that the per-task
+        # overhead does not dominate for small files
+        chunksize = max(1, len(paths) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(func, paths, chunksize=chunksize))
+    return concat_columns(parts)
@@ -0,0 +1,144 @@
+"""
+Module instrument
+
+Opt-in per-stage instrumentation of the Project 1 pipeline.
+
+`main.main` runs each of its stages (reading, parsing, organising by
+ticker, returns, market values, aggregation) through `run_stage`. If no
+report is passed, `run_stage` simply calls the stage, so instrumentation
+costs nothing when it is disabled. If a report (see `new_report`) is
+passed, each stage appends a record to `report['stages']`:
+
+     Key           Description
+     ---           -----------
+     stage         name of the stage
+     wall_secs     elapsed time
+     cpu_secs      CPU time of this process
+     blocks        change in the number of memory blocks allocated by
+                   Python (`sys.getallocatedblocks`), a cheap proxy for
+                   the number of objects created and kept by the stage
+     max_rss_mb    peak resident set size of the process after the stage
+                   (None where the `resource` module is not available)
+     peak_mb       peak memory allocated during the stage, above the
+                   memory allocated before it (only if tracemalloc is
+                   tracing)
+     retained_mb   memory still allocated at the end of the stage (only
+                   if tracemalloc is tracing)
+
+`finish_report` adds the totals over all stages, and `report_to_json`
+serialises the report for monitoring tools.
+
+"""
+
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# ----------------------------------------------------------------------------
+#  Measurement
+# ----------------------------------------------------------------------------
+def max_rss_mb() -> float | None:
+    """
+    Return the peak resident set size of this process in MB, or None if
+    it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (2**20 if platform.system() == 'Darwin' else 2**10)
+
+
+def run_stage(report: dict | None, stage: str, func, *args, **kargs):
+    """
+    Call `func(*args, **kargs)` and return its result. If `report` is not
+    None, also append the measurements of the call to `report['stages']`
+    (see the module docstring).
+    """
+    if report is None:
+        return func(*args, **kargs)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+    blocks = sys.getallocatedblocks()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    res = func(*args, **kargs)
+    rec = {
+        'stage': stage,
+        'wall_secs': time.perf_counter() - wall,
+        'cpu_secs': time.process_time() - cpu,
+        'blocks': sys.getallocatedblocks() - blocks,
+        'max_rss_mb': max_rss_mb(),
+    }
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        rec['peak_mb'] = (peak - before) / 2**20
+        rec['retained_mb'] = (current - before) / 2**20
+    report['stages'].append(rec)
+    return res
+
+
+@contextmanager
+def trace_memory(enabled: bool = True):
+    """
+    Trace memory allocations with tracemalloc inside the `with` block (so
+    `run_stage` reports `peak_mb` and `retained_mb`), unless `enabled` is
+    False or tracemalloc is already tracing.
+    """
+    start = enabled and not tracemalloc.is_tracing()
+    if start:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if start:
+            tracemalloc.stop()
+
+
+# ----------------------------------------------------------------------------
+#  Reports
+# ----------------------------------------------------------------------------
+def new_report(**info) -> dict:
+    """
+    Return an empty report. Keyword arguments (e.g. the parameters of the
+    run) are stored under `report['info']`.
+    """
+    return {'info': info, 'stages': []}
+
+
+def finish_report(report: dict) -> dict:
+    """
+    Add (in place) and return `report['total']`, with the total wall and
+    CPU time and allocated blocks over all stages, the peak memory of the
+    most demanding stage, and the final peak resident set size.
+    """
+    stages = report['stages']
+    total = {
+        'wall_secs': sum(rec['wall_secs'] for rec in stages),
+        'cpu_secs': sum(rec['cpu_secs'] for rec in stages),
+        'blocks': sum(rec['blocks'] for rec in stages),
+        'max_rss_mb': max_rss_mb(),
+    }
+    if stages and 'peak_mb' in stages[0]:
+        total['peak_mb'] = max(rec['peak_mb'] for rec in stages)
+    report['total'] = total
+    return report
+
+
+def report_to_json(report: dict, indent: int | None = 2) -> str:
+    """
+    Serialise a report as JSON.
+    """
+    return json.dumps(report, indent=indent, default=str)
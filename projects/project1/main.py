@@ -14,17 +14,72 @@ Please refer to the project description for further details about this module.
 # ----------------------------------------------------------------------------
 
 import os
+import shutil
+import tempfile
 from pathlib import Path
 
+import numpy as np
+
 CURRENT_DIR = Path(__file__).parent  # project1目录
 PROJECTS_DIR = CURRENT_DIR.parent    # projects目录（包含所有项目的父目录）
 
 
 
+from projects.project1.cache import CACHE_DIR
+
+from projects.project1.compact import compact_to_dat, dat_to_compact
+
+from projects.project1.incremental import (
+        init_state,
+        load_state,
+        replace_tickers,
+        state_to_vw,
+        update_state,
+        update_vw_file,
+        )
+
+from projects.project1.extsort import iter_sorted_lines, sorted_vw_rets
+
+from projects.project1.ingest import read_dat_columns
+
+from projects.project1.instrument import (
+        finish_report,
+        new_report,
+        run_stage,
+        trace_memory,
+        )
+
+from projects.project1.columnar import (
+        lines_to_columns,
+        columns_to_nested_multi,
+        decode_series,
+        )
+
+from projects.project1.riskstats import (
+        init_stats,
+        series_stats,
+        update_stats,
+        )
+
+from projects.project1.panel import (
+        basket_membership,
+        columns_to_panel,
+        mk_mkt_val_panel,
+        mk_ports_panel,
+        mk_rets_panel,
+        mk_vw_baskets_panel,
+        mk_vw_port_panel,
+        series_to_dict,
+        )
+
+from projects.project1.streaming import stream_vw_rets
+
+from projects.project1.watch import init_watch, poll
+
 from projects.project1.task_project1 import(
         lines_to_records,
         organize_by_ticker,
-        calc_rets,
+        organize_by_ticker_multi,
         mk_rets_dict,
         mk_mkt_val_dict,
         mk_vw_port,
@@ -102,6 +157,35 @@ def read_lines(ticker: str) -> list[str]:
     # Split the text into individual lines and return them
     return cnts.splitlines()
 
+def dat_path(ticker: str, data_dir: Path | None = None) -> Path:
+    """
+    Return the location of the .dat file for the given ticker.
+
+    The ticker is normalised and validated as in `read_lines`. If
+    `data_dir` is given, the file is looked up in that folder instead of
+    `PRJ_DATA_DIR`, and any ticker is accepted (e.g. the files of
+    `synth.write_dat_files`).
+    """
+    tic = ticker.strip().lower()
+    if data_dir is not None:
+        return Path(data_dir) / f"{tic}.dat"
+    if tic not in VALID_TICKERS:
+        raise ValueError(f"Invalid ticker '{ticker}'")
+    return PRJ_DATA_DIR / f"{tic}.dat"
+
+def read_tickers_lines(tickers: list[str], data_dir: Path | None = None) -> list[str]:
+    """
+    Return the combined lines of the .dat files for the given tickers (see
+    `read_lines` and `dat_path`).
+    """
+    lines = []
+    for tic in tickers:
+        if data_dir is None:
+            lines.extend(read_lines(tic))
+        else:
+            lines.extend(dat_path(tic, data_dir).read_text().splitlines())
+    return lines
+
 def print_msg(*args, as_header = False):
     """
     Pretty-prints a list of arguments, one per line
@@ -130,6 +214,11 @@ def print_msg(*args, as_header = False):
 def main(
         tickers: list[str],
         prc_col: str = 'adj_close',
+        parser: str = 'records',
+        engine: str = 'dict',
+        workers: int | None = 1,
+        report: dict | None = None,
+        data_dir: Path | None = None,
         ):
     """
     Orchestrate the workflow for Project 1 to compute value-weighted portfolio returns.
@@ -154,6 +243,53 @@ def main(
     prc_col : str, default 'adj_close'
         The name of the price column to use when computing returns.
 
+    parser : str, default 'records'
+        How the lines are parsed:
+
+        - 'records': `lines_to_records` followed by
+          `organize_by_ticker_multi`.
+        - 'columnar': `columnar.lines_to_columns`, which parses all the
+          lines into typed arrays in a single pass. Blank lines and lines
+          without a date or ticker are skipped.
+        - 'cached': as 'columnar', but the parsed arrays for each file are
+          loaded from the binary cache in `cache.CACHE_DIR`, which is
+          rebuilt whenever a .dat file changes.
+        - 'scan': as 'columnar', but each file is memory-mapped and its
+          bytes are parsed directly into arrays with
+          `scan.scan_dat_file`, without decoding it into lines first.
+
+    engine : str, default 'dict'
+        How returns and portfolio weights are computed:
+
+        - 'dict': the nested-dictionary functions in `task_project1`.
+        - 'panel': the array functions in `panel`, which process all
+          tickers and dates at once. Requires `parser='columnar'`,
+          `parser='cached'` or `parser='scan'`.
+        - 'stream': `streaming.stream_vw_rets`, which reads one ticker at
+          a time and only keeps per-date running sums in memory. Requires
+          `parser='columnar'`, `parser='cached'` or `parser='scan'`.
+        - 'extsort': `extsort.sorted_vw_rets`, which sorts each file with
+          an external merge sort and streams the sorted lines into
+          per-date running sums, so no file has to fit in memory. It
+          reads the lines itself, so `parser` is ignored.
+
+    workers : int or None, default 1
+        Number of processes used to parse the files with the 'columnar',
+        'cached' and 'scan' parsers and the 'dict' or 'panel' engines. Each
+        file is parsed separately and the resulting arrays are
+        concatenated. If None, use one process per CPU. Must be 1 with the
+        'records' parser or the 'stream' and 'extsort' engines, which read
+        the files in this process.
+
+    report : dict, optional
+        If given (see `instrument.new_report`), the wall time, CPU time,
+        memory and allocated blocks of each stage are appended to
+        `report['stages']`. See also `profile_main`.
+
+    data_dir : Path, optional
+        Folder with the .dat files, instead of `PRJ_DATA_DIR` (see
+        `dat_path`), e.g. for benchmarks on synthetic files.
+
     Returns
     -------
     dict[str, float]
@@ -173,28 +309,218 @@ def main(
     # ----------------------------------
     # PLEASE DO NOT MODIFY THIS FUNCTION
     # ----------------------------------
-    # Create a list with the combined lines for all tickers
-    lines = []
-    for tic in tickers:
-        lines.extend(read_lines(tic))
-
-    # Convert lines to records
-    records = lines_to_records(lines)
+    if engine not in ('dict', 'panel', 'stream', 'extsort'):
+        raise ValueError(f"Invalid engine '{engine}'")
+    if parser not in ('records', 'columnar', 'cached', 'scan'):
+        raise ValueError(f"Invalid parser '{parser}'")
+    if engine in ('panel', 'stream') and parser == 'records':
+        raise ValueError(f"engine='{engine}' requires a columnar parser")
+    if workers != 1 and (engine in ('stream', 'extsort') or parser == 'records'):
+        raise ValueError(
+            f"Invalid workers '{workers}': only the columnar parsers with "
+            "engine='dict' or 'panel' use several processes")
+
+    if engine == 'extsort':
+        paths = [dat_path(tic, data_dir) for tic in tickers]
+        return run_stage(
+            report, 'sorted_vw_rets', sorted_vw_rets, paths, prc_col=prc_col)
+
+    if engine == 'stream':
+        paths = [dat_path(tic, data_dir) for tic in tickers]
+        cache_dir = CACHE_DIR if parser == 'cached' else None
+        return run_stage(
+            report, 'stream_vw_rets', stream_vw_rets,
+            paths, prc_col=prc_col, cache_dir=cache_dir, scan=parser == 'scan')
+
+    if parser in ('cached', 'scan') or (parser == 'columnar' and workers != 1):
+        # Parse (or load from the binary cache) each file separately
+        paths = [dat_path(tic, data_dir) for tic in tickers]
+        cache_dir = CACHE_DIR if parser == 'cached' else None
+        cols = run_stage(
+            report, 'read_dat_columns', read_dat_columns,
+            paths, workers=workers, cache_dir=cache_dir, scan=parser == 'scan')
+    else:
+        # Create a list with the combined lines for all tickers
+        lines = run_stage(report, 'read_lines', read_tickers_lines, tickers, data_dir)
+
+        # Convert lines to records (or columns)
+        if parser == 'records':
+            records = run_stage(report, 'lines_to_records', lines_to_records, lines)
+        else:
+            cols = run_stage(report, 'lines_to_columns', lines_to_columns, lines)
+
+    if engine == 'panel':
+        panel = run_stage(
+            report, 'columns_to_panel', columns_to_panel,
+            cols, columns=[prc_col, 'shares'])
+        rets = run_stage(report, 'mk_rets_panel', mk_rets_panel, panel, prc_col=prc_col)
+        mkt_val = run_stage(
+            report, 'mk_mkt_val_panel', mk_mkt_val_panel, panel, prc_col=prc_col)
+        vw_rets = run_stage(report, 'mk_vw_port_panel', mk_vw_port_panel, rets, mkt_val)
+        return run_stage(report, 'series_to_dict', series_to_dict, panel, vw_rets)
+
+    # Organise prices and shares by ticker (in a single pass). The columnar
+    # parsers key the nested dictionaries by integer ticker codes and day
+    # ordinals, which are only converted back to strings at the end
+    columns = [prc_col, 'shares']
+    if parser == 'records':
+        nested = run_stage(
+            report, 'organize_by_ticker', organize_by_ticker_multi,
+            records, columns=columns)
+    else:
+        nested = run_stage(
+            report, 'organize_by_ticker', columns_to_nested_multi,
+            cols, columns=columns, encoded=True)
+    prices = nested[prc_col]
+    shares = nested['shares']
 
     # prices and returns
-    prices = organize_by_ticker(records, column=prc_col)
-    rets = mk_rets_dict(prices)
+    rets = run_stage(report, 'mk_rets_dict', mk_rets_dict, prices)
 
     # Market value
-    shares = organize_by_ticker(records, column='shares')
-    mkt_val = mk_mkt_val_dict(prices=prices, shares=shares)
+    mkt_val = run_stage(
+        report, 'mk_mkt_val_dict', mk_mkt_val_dict, prices=prices, shares=shares)
 
     # compute value-weighted returns
-    vw_rets = mk_vw_port(rets=rets, mkt_val=mkt_val)
+    vw_rets = run_stage(report, 'mk_vw_port', mk_vw_port, rets=rets, mkt_val=mkt_val)
+    if parser != 'records':
+        vw_rets = run_stage(report, 'decode_series', decode_series, vw_rets)
 
     return vw_rets
 
 
+def profile_main(tickers: list[str], trace: bool = False, **kargs) -> tuple:
+    """
+    Run `main` with per-stage instrumentation.
+
+    Parameters
+    ----------
+    tickers : list[str]
+        Passed to `main`.
+
+    trace : bool, default False
+        If True, memory allocations are traced with tracemalloc, so each
+        stage also reports its peak and retained memory. This slows the
+        run down.
+
+    **kargs
+        Other arguments of `main` (`prc_col`, `parser`, `engine`,
+        `workers`, `data_dir`).
+
+    Returns
+    -------
+    tuple[dict, dict]
+        The output of `main`, and the report (see `instrument`), which
+        `instrument.report_to_json` converts to JSON.
+
+    Examples
+    --------
+    >> vw_rets, report = profile_main(['aapl', 'csco'])
+    >> [(rec['stage'], rec['wall_secs']) for rec in report['stages']]
+    [('read_lines', 0.0011), ('lines_to_records', 0.0062), ...]
+    """
+    report = new_report(tickers=list(tickers), trace=trace, **kargs)
+    with trace_memory(trace):
+        vw_rets = main(tickers, report=report, **kargs)
+    return vw_rets, finish_report(report)
+
+
+def main_baskets(
+        baskets: list[list[str]] | np.ndarray,
+        tickers: list[str] | None = None,
+        prc_col: str = 'adj_close',
+        parser: str = 'scan',
+        workers: int | None = 1,
+        ) -> list[dict]:
+    """
+    Compute value-weighted portfolio returns for many baskets of tickers,
+    reading and parsing the .dat files only once.
+
+    Calling `main(basket)` for each basket re-reads the files of every
+    ticker in every basket. This function parses the union of the baskets
+    once, computes the return and market value panels once, and obtains
+    the returns of all the baskets with one matrix product (see
+    `panel.mk_vw_baskets_panel`).
+
+    Parameters
+    ----------
+    baskets : list[list[str]] or ndarray
+        Either a list of baskets, each a list of ticker symbols (as in
+        `main`), or a basket-membership array of shape
+        (nbaskets, len(tickers)) which is 1 where a ticker belongs to a
+        basket and 0 elsewhere.
+
+    tickers : list[str], optional
+        The universe of tickers to read. Required if `baskets` is an array
+        (its columns follow the order of `tickers`). Otherwise it defaults
+        to the tickers in any of the baskets.
+
+    prc_col : str, default 'adj_close'
+        The name of the price column to use when computing returns.
+
+    parser : str, default 'scan'
+        One of the columnar parsers of `main`: 'columnar', 'cached' or
+        'scan'.
+
+    workers : int or None, default 1
+        Number of processes used to parse the files (see `main`).
+
+    Returns
+    -------
+    list[dict[str, float]]
+        One dictionary per basket, mapping each date (in `'YYYY-MM-DD'`
+        format) to the value-weighted return of the basket on that date.
+        Each one is equal, up to rounding, to `main(basket, prc_col)`.
+
+    Notes
+    -----
+    Each .dat file is assumed to hold the rows of the ticker it is named
+    after (e.g. `aapl.dat` holds the rows of 'AAPL').
+
+    Ticker symbols are normalised as in `read_lines`, so 'AAPL', 'aapl'
+    and ' aapl ' are the same ticker and its file is read once.
+    """
+    if parser not in ('columnar', 'cached', 'scan'):
+        raise ValueError(f"Invalid parser '{parser}'")
+    if isinstance(baskets, np.ndarray):
+        if tickers is None:
+            raise ValueError("A membership array requires the list of tickers")
+        if np.ndim(baskets) != 2 or np.shape(baskets)[1] != len(tickers):
+            raise ValueError(
+                f"Invalid membership shape {np.shape(baskets)} for {len(tickers)} tickers")
+        # Normalise the ticker symbols, and merge the columns of the same
+        # ticker
+        tickers, cols = np.unique(
+            [tic.strip().lower() for tic in tickers], return_inverse=True)
+        tickers = tickers.tolist()
+        membership = np.zeros((len(baskets), len(tickers)))
+        np.maximum.at(membership.T, cols, np.asarray(baskets, dtype=np.float64).T)
+    else:
+        # Normalise the ticker symbols as `read_lines` does
+        baskets = [[tic.strip().lower() for tic in basket] for basket in baskets]
+        if tickers is None:
+            tickers = sorted({tic for basket in baskets for tic in basket})
+        else:
+            tickers = list(dict.fromkeys(tic.strip().lower() for tic in tickers))
+        membership = basket_membership(tickers, baskets)
+
+    paths = [dat_path(tic) for tic in tickers]
+    cache_dir = CACHE_DIR if parser == 'cached' else None
+    cols = read_dat_columns(
+        paths, workers=workers, cache_dir=cache_dir, scan=parser == 'scan')
+    panel = columns_to_panel(cols, columns=[prc_col, 'shares'])
+    rets = mk_rets_panel(panel, prc_col=prc_col)
+    mkt_val = mk_mkt_val_panel(panel, prc_col=prc_col)
+
+    # Reorder the columns of the membership array to follow the panel rows
+    position = {tic: i for i, tic in enumerate(tickers)}
+    rows = [position[tic.lower()] for tic in panel['tickers']]
+    membership = membership[:, rows]
+
+    vw_rets = mk_vw_baskets_panel(rets, mkt_val, membership)
+    return [series_to_dict(panel, row) for row in vw_rets]
+
+
 # ----------------------------------------------------------------------------
 #  Test functions
 #
@@ -224,6 +550,325 @@ def _test_main(tickers, prc_col):
     print_msg(f"vw_rets: {vw_rets}", as_header=True)
 
 
+def _test_mk_rets_dict_keeps_prices():
+    """
+    `mk_rets_dict` must not overwrite the prices, which `main` passes to
+    `mk_mkt_val_dict` afterwards. When it did, market values were
+    computed as return x shares and the portfolio "returns" exceeded 100.
+    """
+    print("Running _test_mk_rets_dict_keeps_prices...")
+    prices = {'AAPL': {'2025-01-01': 100.0, '2025-01-02': 125.0}}
+    rets = mk_rets_dict(prices)
+    assert rets == {'AAPL': {'2025-01-01': None, '2025-01-02': 0.25}}, rets
+    assert prices == {'AAPL': {'2025-01-01': 100.0, '2025-01-02': 125.0}}, prices
+
+    # 2016-02-10, from the lines for that date and the day before in
+    # aapl.dat and csco.dat
+    aapl_mv = 21.4153 * 5544580000
+    csco_mv = 16.8671 * 5076080000
+    aapl_ret = 21.4153 / 21.5788 - 1
+    csco_ret = 16.8671 / 16.972 - 1
+    expected = (aapl_mv * aapl_ret + csco_mv * csco_ret) / (aapl_mv + csco_mv)
+    vw_rets = main(['aapl', 'csco'])
+    assert abs(vw_rets['2016-02-10'] - expected) < 1e-12, vw_rets['2016-02-10']
+    assert abs(vw_rets['2016-02-10'] - (-0.006991958182074645)) < 1e-12
+    assert abs(vw_rets['2024-12-30'] - (-0.012903612023530773)) < 1e-12
+    assert max(abs(ret) for ret in vw_rets.values()) < 1
+
+
+def _test_parsers_engines(tickers, prc_col):
+    """
+    Every combination of parser, engine and number of workers accepted by
+    `main` must give the same returns as the default records path.
+    """
+    print("Running _test_parsers_engines...")
+    expected = main(tickers, prc_col=prc_col)
+    combos = [('records', 'dict', 1), ('records', 'extsort', 1)]
+    for parser in ('columnar', 'cached', 'scan'):
+        combos += [(parser, 'dict', 1), (parser, 'dict', 2),
+                   (parser, 'panel', 1), (parser, 'panel', 2),
+                   (parser, 'stream', 1)]
+    for parser, engine, workers in combos:
+        vw_rets = main(
+            tickers, prc_col=prc_col, parser=parser, engine=engine, workers=workers)
+        assert vw_rets.keys() == expected.keys(), (parser, engine, workers)
+        assert all(abs(vw_rets[date] - ret) < 1e-12 for date, ret in expected.items()), \
+            (parser, engine, workers)
+
+    # Several workers only apply to the columnar parsers
+    for parser, engine in (('records', 'dict'), ('scan', 'stream'), ('scan', 'extsort')):
+        try:
+            main(tickers, prc_col=prc_col, parser=parser, engine=engine, workers=2)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"workers=2 accepted with {parser=}, {engine=}")
+
+def _test_extsort(tickers, prc_col):
+    """
+    `extsort.sorted_vw_rets` must give the same returns as `mk_vw_port`
+    for a file whose lines are shuffled, when the sort needs several runs
+    and the heap merge, and it must not leave any sorted run behind.
+    """
+    print("Running _test_extsort...")
+    lines = read_tickers_lines(tickers)
+    # Repeated (ticker, date) lines keep their shuffled order in both
+    shuffled = np.random.default_rng(0).permutation(lines).tolist()
+    records = lines_to_records(shuffled)
+    prices = organize_by_ticker(records, column=prc_col)
+    shares = organize_by_ticker(records, column='shares')
+    expected = mk_vw_port(
+        rets=mk_rets_dict(prices), mkt_val=mk_mkt_val_dict(prices=prices, shares=shares))
+
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as runs:
+        pth = Path(tmp, 'shuffled.dat')
+        pth.write_text('\n'.join(shuffled) + '\n')
+        run_size = len(lines) // 5 + 1
+        vw_rets = sorted_vw_rets([pth], prc_col=prc_col, run_size=run_size, tmp_dir=runs)
+        assert vw_rets.keys() == expected.keys()
+        assert all(abs(vw_rets[date] - ret) < 1e-12 for date, ret in expected.items())
+        assert not any(Path(runs).iterdir())
+
+        # The runs are also removed when the merge is not read to the end
+        merged = iter_sorted_lines(pth, run_size=run_size, tmp_dir=runs)
+        first = next(merged)
+        assert len(list(Path(runs).iterdir())) == 1
+        assert len(list(next(Path(runs).iterdir()).iterdir())) == 5
+        merged.close()
+        assert first == min(shuffled, key=lambda line: line.split(',')[1::-1])
+        assert not any(Path(runs).iterdir())
+
+
+def _test_compact(tickers, prc_col):
+    """
+    Converting the .dat files to a compact file and back with
+    `compact.dat_to_compact` and `compact.compact_to_dat` must not change
+    the returns of `main`.
+    """
+    print("Running _test_compact...")
+    expected = main(tickers, prc_col=prc_col)
+    with tempfile.TemporaryDirectory() as tmp:
+        pth = dat_to_compact([dat_path(tic) for tic in tickers], Path(tmp, 'prices.p1c'))
+        paths = compact_to_dat(pth, Path(tmp, 'dat'))
+        assert [p.name for p in paths] == sorted(f'{tic}.dat' for tic in tickers)
+        assert not list(Path(tmp, 'dat').glob('*.tmp'))
+        vw_rets = main(tickers, prc_col=prc_col, parser='columnar', data_dir=Path(tmp, 'dat'))
+    assert vw_rets == expected
+
+
+def _test_ports_panel():
+    """
+    Check every scheme of `panel.mk_ports_panel` against values computed
+    by hand on a panel of four tickers (A, B, C, D) and five dates, with
+    `cap=0.4`:
+
+    - date 1: A has 60% of the market value and is capped at 40%; the
+      excess goes to B, C and D in proportion to their weights;
+    - date 2: only A and B have a return and a market value, so no
+      weights of at most 40% exist and 'capped' uses equal weights;
+    - date 3: D is back after a gap, so its prior-day market value for
+      'lag_vw' is the one on date 1;
+    - date 4: capping A pushes B over the cap, so both end up at 40%.
+    """
+    print("Running _test_ports_panel...")
+    nan = np.nan
+    present = np.array([
+        [True, True, True, True, True],
+        [True, True, True, False, True],
+        [True, True, True, False, True],
+        [True, True, False, True, True],
+    ])
+    mkt_val = np.array([
+        [4.0, 6.0, 3.0, 5.0, 45.0],
+        [4.0, 2.0, 1.0, nan, 38.0],
+        [1.0, 1.0, 2.0, nan, 10.0],
+        [1.0, 1.0, nan, 5.0, 7.0],
+    ])
+    rets = np.array([
+        [nan, 0.1, 0.1, 0.02, 0.1],
+        [nan, 0.2, -0.1, nan, 0.2],
+        [nan, -0.1, nan, nan, 0.3],
+        [nan, 0.0, nan, 0.04, 0.4],
+    ])
+    expected = {
+        'vw': [nan, 0.6 * 0.1 + 0.2 * 0.2 - 0.1 * 0.1, 0.75 * 0.1 - 0.25 * 0.1,
+               0.5 * 0.02 + 0.5 * 0.04, 0.45 * 0.1 + 0.38 * 0.2 + 0.1 * 0.3 + 0.07 * 0.4],
+        'ew': [nan, (0.1 + 0.2 - 0.1) / 4, 0.0, (0.02 + 0.04) / 2, (0.1 + 0.2 + 0.3 + 0.4) / 4],
+        # Date 0 of D and date 2 of A and B are the prior-day values
+        'lag_vw': [nan, 0.4 * 0.1 + 0.4 * 0.2 - 0.1 * 0.1, 0.75 * 0.1 - 0.25 * 0.1,
+                   (3 * 0.02 + 1 * 0.04) / 4, (5 * 0.1 + 1 * 0.2 + 2 * 0.3 + 5 * 0.4) / 13],
+        'capped': [nan, 0.4 * 0.1 + 0.3 * 0.2 - 0.15 * 0.1, 0.5 * 0.1 - 0.5 * 0.1,
+                   0.5 * 0.02 + 0.5 * 0.04,
+                   0.4 * 0.1 + 0.4 * 0.2 + 0.2 * 10 / 17 * 0.3 + 0.2 * 7 / 17 * 0.4],
+    }
+    out = mk_ports_panel(rets, mkt_val, present, cap=0.4)
+    assert out.keys() == expected.keys()
+    for scheme, values in expected.items():
+        assert np.allclose(out[scheme], values, rtol=0, atol=1e-15, equal_nan=True), \
+            (scheme, out[scheme], values)
+    assert np.array_equal(out['vw'], mk_vw_port_panel(rets, mkt_val), equal_nan=True)
+
+
+def _test_incremental(tickers, prc_col):
+    """
+    `incremental.update_state`, `incremental.replace_tickers` and
+    `incremental.update_vw_file` must give the same portfolio returns as
+    `incremental.init_state` with all the lines.
+    """
+    print("Running _test_incremental...")
+    lines = read_tickers_lines(tickers)
+    expected = state_to_vw(init_state(lines_to_columns(lines), prc_col=prc_col))
+    by_date = {}
+    for line in lines:
+        by_date.setdefault(line.split('date:')[1][:10], []).append(line)
+    dates = sorted(by_date)
+    half = [line for date in dates[:len(dates) // 2] for line in by_date[date]]
+
+    # One date at a time, after the first half
+    state = init_state(lines_to_columns(half), prc_col=prc_col)
+    for date in dates[len(dates) // 2:]:
+        update_state(state, lines_to_columns(by_date[date]))
+    assert state_to_vw(state) == expected
+
+    # All the lines of the first ticker again
+    state = init_state(lines_to_columns(read_tickers_lines(tickers[1:])), prc_col=prc_col)
+    replace_tickers(state, lines_to_columns(read_lines(tickers[0])), [tickers[0].upper()])
+    assert state_to_vw(state) == expected
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pth = Path(tmp, 'state.npz')
+        vw_rets = update_vw_file(pth, half, prc_col=prc_col)
+        # New dates only update the tail
+        for date in dates[len(dates) // 2:]:
+            vw_rets.update(update_vw_file(pth, by_date[date], prc_col=prc_col))
+        assert vw_rets == expected
+        assert Path(tmp, 'state.pending.dat').exists()
+        # A corrected line loads the full state
+        vw_rets.update(update_vw_file(pth, by_date[dates[1]], prc_col=prc_col))
+        assert vw_rets == expected
+        assert not Path(tmp, 'state.pending.dat').exists()
+        assert state_to_vw(load_state(pth)) == expected
+
+
+def _test_watch(tickers, prc_col):
+    """
+    After each `watch.poll` that applies an edited, added or deleted file,
+    the returns kept by the watcher must equal those of a new
+    `watch.init_watch` on the folder. A file that cannot be parsed must
+    be reported in `watcher['errors']`, and the previous version of its
+    tickers kept until it is fixed.
+    """
+    print("Running _test_watch...")
+    first, second, added = tickers[0], tickers[1], 'tsla'
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        mtime = 10**18
+
+        def touch(name):
+            # Explicit times, so every change is seen whatever the clock resolution
+            nonlocal mtime
+            mtime += 10**9
+            os.utime(data_dir / name, ns=(mtime, mtime))
+
+        def check(watcher):
+            fresh = init_watch(data_dir, prc_col=prc_col)
+            assert watcher['vw'] == fresh['vw']
+            assert watcher['errors'].keys() == fresh['errors'].keys()
+
+        for tic in (first, second):
+            shutil.copy(dat_path(tic), data_dir)
+            touch(f'{tic}.dat')
+        watcher = init_watch(data_dir, prc_col=prc_col)
+        assert poll(watcher) == {}
+
+        # Edit one price
+        lines = dat_path(first).read_text().splitlines()
+        lines[10] = lines[10].replace(f'{prc_col}:', f'{prc_col}:1')
+        (data_dir / f'{first}.dat').write_text('\n'.join(lines) + '\n')
+        touch(f'{first}.dat')
+        assert poll(watcher)
+        check(watcher)
+
+        # Add a file, then delete one
+        shutil.copy(dat_path(added), data_dir)
+        touch(f'{added}.dat')
+        assert poll(watcher)
+        check(watcher)
+        (data_dir / f'{second}.dat').unlink()
+        assert poll(watcher)
+        check(watcher)
+
+        # A new file that cannot be parsed
+        (data_dir / 'bad.dat').write_text('date:2020-01-02,ticker:BAD\n')
+        touch('bad.dat')
+        assert poll(watcher) == {}
+        assert 'bad.dat' in watcher['errors']
+        check(watcher)
+
+        # An unparsable version of a known file keeps the previous one
+        before = dict(watcher['vw'])
+        (data_dir / f'{first}.dat').write_text('garbage\n')
+        touch(f'{first}.dat')
+        poll(watcher)
+        assert f'{first}.dat' in watcher['errors']
+        assert watcher['vw'] == before
+
+        # Until it is fixed and the bad file removed
+        shutil.copy(dat_path(first), data_dir)
+        touch(f'{first}.dat')
+        (data_dir / 'bad.dat').unlink()
+        assert poll(watcher)
+        assert not watcher['errors']
+        check(watcher)
+
+
+def _test_update_stats(tickers, prc_col):
+    """
+    `riskstats.update_stats`, from scratch or after
+    `riskstats.init_stats(history=...)`, must give the same statistics
+    as `riskstats.series_stats` on the full history.
+    """
+    print("Running _test_update_stats...")
+    vw_rets = main(tickers, prc_col=prc_col)
+    expected = series_stats(vw_rets, window=21)
+    dates = sorted(vw_rets)
+    half = len(dates) // 2
+    for start in (0, half):
+        state = init_stats(window=21, history={date: vw_rets[date] for date in dates[:start]})
+        for i, date in enumerate(dates[start:]):
+            if i == 1:
+                # Missing returns are skipped
+                assert update_stats(state, date, None) is None
+            stats = update_stats(state, date, vw_rets[date])
+            for key, value in stats.items():
+                ref = expected[key][date]
+                assert (np.isnan(value) and np.isnan(ref)) or abs(value - ref) <= 1e-9 * max(1, abs(ref)), \
+                    (start, date, key, value, ref)
+
+
+def _test_main_baskets_case(tickers, prc_col):
+    """
+    `main_baskets` must normalise the ticker symbols as `main` does, so a
+    basket with mixed-case symbols gives the same returns as `main`.
+    """
+    print("Running _test_main_baskets_case...")
+    mixed = [tic.upper() if i % 2 == 0 else f' {tic} ' for i, tic in enumerate(tickers)]
+    expected = main(tickers, prc_col=prc_col)
+    first = main([tickers[0]], prc_col=prc_col)
+    out = main_baskets([mixed, tickers, [tickers[0], mixed[0]]], prc_col=prc_col)
+    assert out[0].keys() == expected.keys()
+    assert all(abs(out[0][date] - ret) < 1e-12 for date, ret in expected.items())
+    assert out[1] == out[0]
+    assert out[2].keys() == first.keys()
+    assert all(abs(out[2][date] - ret) < 1e-12 for date, ret in first.items())
+
+    # Duplicate columns of a membership array are merged
+    membership = np.array([[1, 0] + [1] * (len(tickers) - 1)])
+    out = main_baskets(membership, tickers=[mixed[0], *tickers], prc_col=prc_col)
+    assert out[0] == main_baskets([tickers], prc_col=prc_col)[0]
+
+
+
 
 
 # ----------------------------------------------------------------------------
@@ -253,12 +898,22 @@ def run_tests():
     #_test_main(tickers=tickers,prc_col=prc_col)
 
     # Add other function calls here
+    _test_mk_rets_dict_keeps_prices()
+    _test_parsers_engines(tickers=tickers, prc_col=prc_col)
+    _test_extsort(tickers=tickers, prc_col=prc_col)
+    _test_compact(tickers=tickers, prc_col=prc_col)
+    _test_ports_panel()
+    _test_incremental(tickers=tickers, prc_col=prc_col)
+    _test_watch(tickers=tickers, prc_col=prc_col)
+    _test_update_stats(tickers=tickers, prc_col=prc_col)
+    _test_main_baskets_case(tickers=tickers, prc_col=prc_col)
 
 
 # ----------------------------------------------------------------------------
 #  Call the function to run the tests
 # ----------------------------------------------------------------------------
-run_tests()
+if __name__ == "__main__":
+    run_tests()
 
 
 
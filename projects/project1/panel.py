@@ -0,0 +1,705 @@
+"""
+Module panel
+
+Array-backed ticker x date panels for Project 1.
+
+The functions in `task_project1` work on nested dictionaries of the form
+`{<ticker>: {<date>: <value>}}`. The functions in this module store the
+same information in a "panel dictionary":
+
+     Key        Dtype     Shape                Description
+     ---        -----     -----                -----------
+     tickers    object    (ntickers,)          row labels
+     dates      int32     (ndates,)            sorted day ordinals
+     present    bool      (ntickers, ndates)   True where the nested
+                                               dictionary has the date
+     <column>   float64   (ntickers, ndates)   NaN where missing or not
+                                               present
+
+The distinction between `present` and NaN matters: as in `calc_rets`, the
+return on a date is computed relative to the previous date *present* for
+that ticker, even if the price on that date is missing.
+
+"""
+
+import numpy as np
+
+from projects.project1.columnar import (
+        dates_to_ords,
+        missing_mask,
+        ords_to_dates,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  Panel construction
+# ----------------------------------------------------------------------------
+def columns_to_panel(cols: dict, columns: list[str]) -> dict:
+    """
+    Build a panel dictionary from a column dictionary.
+
+    Parameters
+    ----------
+    cols : dict
+        A column dictionary, as returned by `columnar.lines_to_columns`.
+
+    columns : list[str]
+        Columns to include in the panel. Each must be one of
+        `columnar.VALUE_COLS`.
+
+    Returns
+    -------
+    dict
+        A panel dictionary (see the module docstring). If a ticker has
+        several rows for the same date, the last one is used, as in
+        `organize_by_ticker`.
+    """
+    dates, date_idx = np.unique(cols['date'], return_inverse=True)
+    tic_idx = cols['ticker']
+    shape = (len(cols['tickers']), len(dates))
+
+    # Keep the last row for each (ticker, date) pair
+    flat = tic_idx.astype(np.int64) * shape[1] + date_idx
+    _, last = np.unique(flat[::-1], return_index=True)
+    rows = len(flat) - 1 - last
+    rows.sort()
+
+    present = np.zeros(shape, dtype=bool)
+    present[tic_idx[rows], date_idx[rows]] = True
+    panel = {
+        'tickers': cols['tickers'],
+        'dates': dates.astype(np.int32),
+        'present': present,
+    }
+    for column in columns:
+        values = np.full(shape, np.nan)
+        col = cols[column][rows].astype(np.float64)
+        col[missing_mask(cols, column)[rows]] = np.nan
+        values[tic_idx[rows], date_idx[rows]] = col
+        panel[column] = values
+    return panel
+
+
+def nested_to_panel(nested: dict, column: str) -> dict:
+    """
+    Build a single-column panel dictionary from a nested dictionary.
+
+    Parameters
+    ----------
+    nested : dict[str, dict[str, float | None]]
+        A nested dictionary of the form `{<ticker>: {<date>: <value>}}`,
+        e.g. the output of `organize_by_ticker`.
+
+    column : str
+        Key under which the values are stored in the panel.
+
+    Returns
+    -------
+    dict
+        A panel dictionary (see the module docstring). `None` values are
+        stored as NaN.
+    """
+    tickers = list(nested)
+    all_dates = {date for by_date in nested.values() for date in by_date}
+    dates = np.sort(dates_to_ords(list(all_dates)))
+    date_pos = dict(zip(ords_to_dates(dates), range(len(dates))))
+
+    shape = (len(tickers), len(dates))
+    present = np.zeros(shape, dtype=bool)
+    values = np.full(shape, np.nan)
+    for i, by_date in enumerate(nested.values()):
+        pos = [date_pos[date] for date in by_date]
+        present[i, pos] = True
+        values[i, pos] = [np.nan if v is None else v for v in by_date.values()]
+    return {
+        'tickers': np.array(tickers, dtype=object),
+        'dates': dates,
+        'present': present,
+        column: values,
+    }
+
+
+def panel_to_nested(panel: dict, values: np.ndarray) -> dict:
+    """
+    Convert a ticker x date array into a nested dictionary.
+
+    Parameters
+    ----------
+    panel : dict
+        The panel dictionary `values` is aligned with.
+
+    values : ndarray
+        A float array with the same shape as `panel['present']`.
+
+    Returns
+    -------
+    dict[str, dict[str, float | None]]
+        A nested dictionary of the form `{<ticker>: {<date>: <value>}}`
+        with one entry for each present cell. NaN values are returned as
+        `None`.
+    """
+    dates = ords_to_dates(panel['dates'])
+    out = {}
+    for tic, present, row in zip(panel['tickers'], panel['present'], values):
+        pos = np.flatnonzero(present)
+        vals = row[pos]
+        vals = np.where(np.isnan(vals), None, vals).tolist()
+        out[tic] = dict(zip([dates[j] for j in pos.tolist()], vals))
+    return out
+
+
+def select_tickers(panel: dict, rows) -> dict:
+    """
+    Return a panel dictionary with only the tickers in positions `rows`.
+    """
+    out = {}
+    for key, value in panel.items():
+        if key == 'dates':
+            out[key] = value
+        elif key == 'tickers':
+            out[key] = value[rows]
+        else:
+            out[key] = value[rows, :]
+    return out
+
+
+# ----------------------------------------------------------------------------
+#  Returns
+# ----------------------------------------------------------------------------
+def prior_present(present: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    For each cell `(rows[k], cols[k])`, return the column index of the
+    previous present date in the same row, or -1 if there is none.
+
+    The search walks back one date at a time for all the cells together,
+    so it is meant for the (few) cells that follow a gap in a ticker's
+    history.
+    """
+    prior = cols - 1
+    todo = prior >= 0
+    while True:
+        todo[todo] = ~present[rows[todo], prior[todo]]
+        if not todo.any():
+            return prior
+        prior[todo] -= 1
+        todo &= prior >= 0
+
+
+def next_present(present: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    For each cell `(rows[k], cols[k])`, return the column index of the
+    next present date in the same row, or -1 if there is none.
+
+    See `prior_present`.
+    """
+    ndates = present.shape[1]
+    nxt = cols + 1
+    todo = nxt < ndates
+    while True:
+        todo[todo] = ~present[rows[todo], nxt[todo]]
+        if not todo.any():
+            break
+        nxt[todo] += 1
+        todo &= nxt < ndates
+    nxt[nxt >= ndates] = -1
+    return nxt
+
+
+def mk_rets_panel(
+        panel: dict,
+        prc_col: str = 'adj_close',
+        chunk: int = 64,
+        ) -> np.ndarray:
+    """
+    Compute simple returns for every ticker in a panel at once.
+
+    This is the vectorised counterpart of `mk_rets_dict`, and follows the
+    same rules as `calc_rets`: each return is computed relative to the
+    previous present date for that ticker, and it is missing (NaN) on the
+    first present date, or when the price or the prior price is missing,
+    or when the prior price is non-positive.
+
+    Parameters
+    ----------
+    panel : dict
+        A panel dictionary containing the column `prc_col`.
+
+    prc_col : str, default 'adj_close'
+        The name of the price column.
+
+    chunk : int, default 64
+        Number of tickers processed at a time. Each block of rows is
+        divided, shifted and checked for gaps while it is still in the
+        CPU cache, instead of making one pass over the whole panel per
+        step.
+
+    Returns
+    -------
+    ndarray
+        A float64 array with the same shape as `panel['present']`. Use
+        `panel_to_nested(panel, rets)` to obtain the output of
+        `mk_rets_dict`.
+
+    Examples
+    --------
+    >> prices = {
+            'AAPL': {'2025-01-01': 100.0, '2025-01-02': 110.0},
+            'MSFT': {'2025-01-01': 200.0, '2025-01-03': 210.0}
+        }
+    >> panel = nested_to_panel(prices, column='prc')
+    >> panel_to_nested(panel, mk_rets_panel(panel, prc_col='prc'))
+    {
+        'AAPL': {'2025-01-01': None, '2025-01-02': 0.1},
+        'MSFT': {'2025-01-01': None, '2025-01-03': 0.05}
+    }
+    """
+    prc = panel[prc_col]
+    present = panel['present']
+    ntickers, ndates = prc.shape
+    rets = np.empty(prc.shape)
+    if rets.size == 0:
+        return rets
+
+    # Returns relative to the previous date in the panel. Cells that are
+    # missing or not present are NaN in `prc`, so they give NaN here.
+    # Non-positive prices are rare, so only look for them if there are any
+    nonpos = not np.fmin.reduce(prc, axis=None, initial=np.inf) > 0
+    gaps = []
+    for lo in range(0, ntickers, chunk):
+        prc_blk = prc[lo:lo + chunk]
+        rets_blk = rets[lo:lo + chunk]
+        rets_blk[:, 0] = np.nan
+        prior_prc = prc_blk[:, :-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(prc_blk[:, 1:], prior_prc, out=rets_blk[:, 1:])
+        np.subtract(rets_blk, 1, out=rets_blk)
+        if nonpos:
+            rets_blk[:, 1:][prior_prc <= 0] = np.nan
+        present_blk = present[lo:lo + chunk]
+        gap = present_blk[:, 1:] > present_blk[:, :-1]
+        gaps.append(np.flatnonzero(gap) + lo * (ndates - 1))
+
+    # Cells present after a gap in the ticker's history must be computed
+    # relative to the last present date before the gap
+    rows, cols = np.divmod(np.concatenate(gaps), ndates - 1)
+    cols += 1
+    prior = prior_present(present, rows, cols)
+    has_prior = prior >= 0
+    rows, cols, prior = rows[has_prior], cols[has_prior], prior[has_prior]
+    prc_gap = prc[rows, cols]
+    prior_gap = prc[rows, prior]
+    rets_gap = np.full(len(rows), np.nan)
+    valid = (prior_gap > 0) & ~np.isnan(prc_gap)
+    rets_gap[valid] = (prc_gap[valid] / prior_gap[valid]) - 1
+    rets[rows, cols] = rets_gap
+    return rets
+
+
+# ----------------------------------------------------------------------------
+#  Value-weighted portfolio
+# ----------------------------------------------------------------------------
+def mk_mkt_val_panel(
+        panel: dict,
+        prc_col: str = 'adj_close',
+        shares_col: str = 'shares',
+        ) -> np.ndarray:
+    """
+    Compute market values by multiplying prices and shares.
+
+    This is the vectorised counterpart of `mk_mkt_val_dict`.
+
+    Returns
+    -------
+    ndarray
+        A float64 array with the same shape as `panel['present']`, which is
+        NaN where the price or the number of shares is missing.
+    """
+    return panel[prc_col] * panel[shares_col]
+
+
+def _sum_rows(arr: np.ndarray) -> np.ndarray:
+    """
+    Sum a 2D array over its rows, adding the rows one at a time in order.
+
+    `arr.sum(axis=0)` only does this for a C-contiguous array with several
+    columns; otherwise NumPy sums each column pairwise (e.g. for a column
+    subset `arr[:, idx]`, which is Fortran-ordered), which can differ in
+    the last bit.
+    """
+    if arr.shape[1] == 1 and len(arr) > 0:
+        return np.cumsum(arr, axis=0)[-1]
+    return np.ascontiguousarray(arr).sum(axis=0)
+
+
+def mk_vw_port_panel(
+        rets: np.ndarray,
+        mkt_val: np.ndarray,
+        chunk: int = 512,
+        ) -> np.ndarray:
+    """
+    Compute value-weighted portfolio returns for all dates at once.
+
+    This is the vectorised counterpart of `mk_vw_port`. A (ticker, date)
+    cell contributes to the portfolio return only if both its return and
+    its market value are available. On each date, the portfolio return is
+    the sum of `mkt_val * ret` over the valid cells, divided by the sum of
+    `mkt_val` over the same cells, and it is NaN if that sum is not
+    positive.
+
+    Parameters
+    ----------
+    rets : ndarray
+        Returns, as returned by `mk_rets_panel`.
+
+    mkt_val : ndarray
+        Market values aligned with `rets`, as returned by
+        `mk_mkt_val_panel`.
+
+    chunk : int, default 512
+        Number of dates processed at a time. Temporary arrays have shape
+        (ntickers, chunk), so memory use does not grow with the number of
+        dates.
+
+    Returns
+    -------
+    ndarray
+        A float64 array with one portfolio return per date. Use
+        `series_to_dict(panel, vw_rets)` to obtain the output of
+        `mk_vw_port`.
+
+    Notes
+    -----
+    The sums run over tickers in panel order, which is the order in which
+    `mk_vw_port` adds them up when the nested dictionaries list the
+    tickers in the same order, so the results are identical.
+    """
+    ndates = rets.shape[1]
+    out = np.full(ndates, np.nan)
+    for lo in range(0, ndates, chunk):
+        ret = rets[:, lo:lo + chunk]
+        mv = mkt_val[:, lo:lo + chunk]
+        valid = ~(np.isnan(ret) | np.isnan(mv))
+        wgt = np.where(valid, mv, 0.0)
+        numer = np.where(valid, ret, 0.0)
+        numer *= wgt
+        numer = _sum_rows(numer)
+        denom = _sum_rows(wgt)
+        pos = denom > 0
+        out[lo:lo + chunk][pos] = numer[pos] / denom[pos]
+    return out
+
+
+def series_to_dict(panel: dict, values: np.ndarray) -> dict:
+    """
+    Convert an array with one value per date into a dictionary mapping
+    each date (in `'YYYY-MM-DD'` format) to its value. NaN values are
+    dropped.
+    """
+    keep = ~np.isnan(values)
+    dates = ords_to_dates(panel['dates'][keep])
+    return dict(zip(dates, values[keep].tolist()))
+
+
+def mk_vw_rets_panel(
+        panel: dict,
+        prc_col: str = 'adj_close',
+        shares_col: str = 'shares',
+        ) -> dict:
+    """
+    Compute value-weighted portfolio returns from a panel with prices and
+    shares.
+
+    This is the panel counterpart of the last steps of `main.main`:
+    `mk_rets_dict`, `mk_mkt_val_dict`, and `mk_vw_port`.
+
+    Returns
+    -------
+    dict[str, float]
+        A dictionary mapping each date (in `'YYYY-MM-DD'` format) to the
+        value-weighted portfolio return on that date.
+    """
+    rets = mk_rets_panel(panel, prc_col=prc_col)
+    mkt_val = mk_mkt_val_panel(panel, prc_col=prc_col, shares_col=shares_col)
+    vw_rets = mk_vw_port_panel(rets, mkt_val)
+    return series_to_dict(panel, vw_rets)
+
+
+# ----------------------------------------------------------------------------
+#  Baskets of tickers
+# ----------------------------------------------------------------------------
+def basket_membership(tickers, baskets: list[list[str]]) -> np.ndarray:
+    """
+    Build a basket-membership matrix.
+
+    Parameters
+    ----------
+    tickers : array-like
+        The tickers of the panel (its row labels).
+
+    baskets : list[list[str]]
+        Each basket is a list of tickers in `tickers`.
+
+    Returns
+    -------
+    ndarray
+        A float64 array of shape (nbaskets, ntickers) which is 1.0 where the
+        ticker belongs to the basket and 0.0 elsewhere.
+
+    Raises
+    ------
+    ValueError
+        If a basket contains a ticker which is not in `tickers`.
+    """
+    index = {tic: i for i, tic in enumerate(tickers)}
+    out = np.zeros((len(baskets), len(index)))
+    for row, basket in enumerate(baskets):
+        for tic in basket:
+            if tic not in index:
+                raise ValueError(f"Invalid ticker '{tic}'")
+            out[row, index[tic]] = 1.0
+    return out
+
+
+def mk_vw_baskets_panel(
+        rets: np.ndarray,
+        mkt_val: np.ndarray,
+        membership: np.ndarray,
+        chunk: int = 512,
+        ) -> np.ndarray:
+    """
+    Compute value-weighted portfolio returns for many baskets of tickers
+    at once.
+
+    The masked `mkt_val * ret` and `mkt_val` panels are shared by all the
+    baskets, so the numerators and denominators of every basket on every
+    date are obtained with two matrix products:
+
+        numer = membership @ (mkt_val * ret)
+        denom = membership @ mkt_val
+
+    Parameters
+    ----------
+    rets, mkt_val : ndarray
+        Returns and market values, as in `mk_vw_port_panel`.
+
+    membership : ndarray
+        An array of shape (nbaskets, ntickers), e.g. as returned by
+        `basket_membership`. Row `b` is 1.0 for the tickers in basket `b`
+        and 0.0 elsewhere. Other non-negative values scale the market
+        values of the tickers in that basket.
+
+    chunk : int, default 512
+        Number of dates processed at a time.
+
+    Returns
+    -------
+    ndarray
+        A float64 array of shape (nbaskets, ndates). Row `b` is equal (up
+        to rounding, since the matrix product adds up the tickers in a
+        different order) to `mk_vw_port_panel` on the tickers of basket `b`.
+    """
+    membership = np.asarray(membership, dtype=np.float64)
+    if membership.ndim != 2 or membership.shape[1] != rets.shape[0]:
+        raise ValueError(
+            f"Invalid membership shape {membership.shape} for {rets.shape[0]} tickers")
+    ndates = rets.shape[1]
+    out = np.full((len(membership), ndates), np.nan)
+    for lo in range(0, ndates, chunk):
+        ret = rets[:, lo:lo + chunk]
+        mv = mkt_val[:, lo:lo + chunk]
+        valid = ~(np.isnan(ret) | np.isnan(mv))
+        wgt = np.where(valid, mv, 0.0)
+        numer = np.where(valid, ret, 0.0)
+        numer *= wgt
+        numer = membership @ numer
+        denom = membership @ wgt
+        pos = denom > 0
+        block = out[:, lo:lo + chunk]
+        block[pos] = numer[pos] / denom[pos]
+    return out
+
+
+# ----------------------------------------------------------------------------
+#  Weighting schemes
+# ----------------------------------------------------------------------------
+# Weighting schemes supported by `mk_ports_panel`
+SCHEMES = ('vw', 'ew', 'lag_vw', 'capped')
+
+
+def lag_panel(present: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Return the value of each cell on the previous present date of the same
+    ticker (NaN on the first present date and on cells not present).
+
+    Examples
+    --------
+    >> present = np.array([[True, False, True]])
+    >> lag_panel(present, np.array([[1.0, np.nan, 3.0]]))
+    array([[nan, nan,  1.]])
+    """
+    lag = np.full(values.shape, np.nan)
+    lag[:, 1:] = values[:, :-1]
+    gap = present[:, 1:] > present[:, :-1]
+    rows, cols = np.divmod(np.flatnonzero(gap), gap.shape[1])
+    cols += 1
+    prior = prior_present(present, rows, cols)
+    has_prior = prior >= 0
+    lag[rows, cols] = np.nan
+    lag[rows[has_prior], cols[has_prior]] = values[rows[has_prior], prior[has_prior]]
+    lag[~present] = np.nan
+    return lag
+
+
+def _capped_weights(wgt: np.ndarray, valid: np.ndarray, cap: float) -> np.ndarray:
+    """
+    Turn the market values `wgt` (0.0 where not `valid`) of a block of
+    dates into weights which add up to one on each date and are at most
+    `cap`. The excess weight of the capped tickers is redistributed among
+    the others in proportion to their weights, until no weight exceeds
+    `cap`. Dates with fewer than `1 / cap` valid tickers, where no such
+    weights exist, get equal weights.
+    """
+    denom = _sum_rows(wgt)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = wgt / denom
+    count = valid.sum(axis=0)
+    equal = count * cap < 1
+    w[:, equal] = valid[:, equal] / np.maximum(count[equal], 1)
+    # Equal weights are final, even though they exceed `cap`
+    fixed = np.zeros(w.shape, dtype=bool)
+    fixed[:, equal] = True
+    while True:
+        over = (w > cap) & ~fixed
+        if not over.any():
+            return w
+        fixed |= over
+        w[over] = cap
+        free = np.where(fixed, 0.0, w)
+        free_total = free.sum(axis=0)
+        excess = 1.0 - cap * fixed.sum(axis=0) - free_total
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(free_total > 0, 1.0 + excess / free_total, 1.0)
+        w = np.where(fixed, w, w * scale)
+
+
+def mk_ports_panel(
+        rets: np.ndarray,
+        mkt_val: np.ndarray,
+        present: np.ndarray,
+        schemes: tuple = SCHEMES,
+        cap: float = 0.1,
+        chunk: int = 512,
+        ) -> dict:
+    """
+    Compute portfolio returns under several weighting schemes at once.
+
+    The masked returns and market values are built once per block of
+    dates and shared by all the schemes, so each extra scheme only costs
+    its own reduction.
+
+    Parameters
+    ----------
+    rets, mkt_val : ndarray
+        Returns and market values, as in `mk_vw_port_panel`.
+
+    present : ndarray
+        The `present` array of the panel (used to find each ticker's
+        prior-day market value).
+
+    schemes : tuple[str], default SCHEMES
+        Any of:
+
+        - 'vw': weights proportional to the market value on the same day,
+          identical to `mk_vw_port_panel`.
+        - 'ew': equal weights.
+        - 'lag_vw': weights proportional to the market value on the
+          previous present date, i.e. the date the return is measured
+          from.
+        - 'capped': as 'vw', but no ticker's weight exceeds `cap` (see
+          `_capped_weights`).
+
+    cap : float, default 0.1
+        The largest weight of a ticker in the 'capped' scheme.
+
+    chunk : int, default 512
+        Number of dates processed at a time.
+
+    Returns
+    -------
+    dict[str, ndarray]
+        A dictionary mapping each scheme to a float64 array with one
+        portfolio return per date (NaN on dates without valid tickers).
+
+    Notes
+    -----
+    On each date, 'vw', 'ew' and 'capped' use the tickers with both a
+    return and a market value, and 'lag_vw' uses the tickers with both a
+    return and a prior-day market value.
+    """
+    for scheme in schemes:
+        if scheme not in SCHEMES:
+            raise ValueError(f"Invalid scheme '{scheme}'")
+    if not 0 < cap <= 1:
+        raise ValueError(f"Invalid cap '{cap}'")
+    ndates = rets.shape[1]
+    out = {scheme: np.full(ndates, np.nan) for scheme in schemes}
+    lag_mv = lag_panel(present, mkt_val) if 'lag_vw' in schemes else None
+
+    for lo in range(0, ndates, chunk):
+        hi = lo + chunk
+        ret = rets[:, lo:hi]
+        has_ret = ~np.isnan(ret)
+        ret0 = np.where(has_ret, ret, 0.0)
+        valid = has_ret & ~np.isnan(mkt_val[:, lo:hi])
+        wgt = np.where(valid, mkt_val[:, lo:hi], 0.0)
+
+        if 'vw' in out or 'capped' in out:
+            denom = _sum_rows(wgt)
+            pos = denom > 0
+        if 'vw' in out:
+            numer = np.where(valid, ret, 0.0)
+            numer *= wgt
+            numer = _sum_rows(numer)
+            out['vw'][lo:hi][pos] = numer[pos] / denom[pos]
+        if 'ew' in out:
+            count = valid.sum(axis=0)
+            total = _sum_rows(np.where(valid, ret0, 0.0))
+            has = count > 0
+            out['ew'][lo:hi][has] = total[has] / count[has]
+        if 'capped' in out:
+            w = _capped_weights(wgt, valid, cap)
+            out['capped'][lo:hi][pos] = _sum_rows(w * ret0)[pos]
+        if 'lag_vw' in out:
+            lag = lag_mv[:, lo:hi]
+            lag_valid = has_ret & ~np.isnan(lag)
+            lag_wgt = np.where(lag_valid, lag, 0.0)
+            lag_denom = _sum_rows(lag_wgt)
+            lag_pos = lag_denom > 0
+            out['lag_vw'][lo:hi][lag_pos] = (
+                _sum_rows(lag_wgt * ret0)[lag_pos] / lag_denom[lag_pos])
+    return out
+
+
+def mk_ports_rets_panel(
+        panel: dict,
+        prc_col: str = 'adj_close',
+        shares_col: str = 'shares',
+        schemes: tuple = SCHEMES,
+        cap: float = 0.1,
+        ) -> dict:
+    """
+    Compute portfolio returns under several weighting schemes from a panel
+    with prices and shares (see `mk_ports_panel`).
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        A dictionary mapping each scheme to a dictionary of portfolio
+        returns keyed by date (in `'YYYY-MM-DD'` format). The 'vw' entry
+        is identical to `mk_vw_rets_panel(panel)`.
+    """
+    rets = mk_rets_panel(panel, prc_col=prc_col)
+    mkt_val = mk_mkt_val_panel(panel, prc_col=prc_col, shares_col=shares_col)
+    ports = mk_ports_panel(
+        rets, mkt_val, panel['present'], schemes=schemes, cap=cap)
+    return {scheme: series_to_dict(panel, vw) for scheme, vw in ports.items()}
@@ -0,0 +1,341 @@
+"""
+Module riskstats
+
+Rolling risk statistics of a portfolio return series, such as the
+value-weighted returns produced by `main.main`.
+
+For each date, the statistics are:
+
+     Key             Description
+     ---             -----------
+     mean            mean daily return over the last `window` returns
+     vol             annualised volatility over the last `window` returns
+                     (sample standard deviation times sqrt(`periods`))
+     sharpe          annualised Sharpe ratio over the last `window`
+                     returns, (mean - rf) / std * sqrt(`periods`)
+     q<q>            quantiles of the last `window` returns, e.g. `q0.05`
+     drawdown        decline of the cumulative return index from its
+                     running peak over the full history, e.g. -0.2
+     max_drawdown    most negative drawdown so far
+
+The windowed statistics are NaN until `window` returns have been seen.
+Missing returns (None or NaN) are skipped.
+
+Two ways of computing them give the same results:
+
+- `init_stats` / `update_stats` keep a "state" and add one return at a
+  time: the mean and variance use Welford's updates (adding the new
+  return and removing the one leaving the window), the drawdown a
+  running peak, and the quantiles a sorted copy of the window. Each
+  update is constant time, apart from one insertion into a sorted list of
+  `window` floats for the quantiles.
+- `rolling_stats` computes the full history at once with vectorised
+  passes over sliding windows. Use it for backfills, and
+  `init_stats(history=...)` to continue from a backfill with daily
+  updates.
+
+"""
+
+import bisect
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+WINDOW = 63  # About three months of trading days
+PERIODS_PER_YEAR = 252
+QUANTILES = (0.05,)
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def _quantile_key(q: float) -> str:
+    """ Key of the quantile `q` in the statistics, e.g. 'q0.05' """
+    return f'q{q:g}'
+
+
+def _sorted_quantile(values: list, q: float) -> float:
+    """
+    Quantile of sorted values with linear interpolation (the default
+    method of `np.quantile`).
+    """
+    pos = q * (len(values) - 1)
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def _series_arrays(series: dict) -> tuple:
+    """
+    Return the sorted dates of a `{<date>: <ret>}` dictionary with a valid
+    return, and the float64 array of those returns.
+    """
+    dates = sorted(series)
+    rets = np.array([series[dt] for dt in dates], dtype=np.float64)
+    valid = ~np.isnan(rets)
+    return [dt for dt, ok in zip(dates, valid.tolist()) if ok], rets[valid]
+
+
+# ----------------------------------------------------------------------------
+#  Vectorised computation
+# ----------------------------------------------------------------------------
+def rolling_stats(
+        rets: np.ndarray,
+        window: int = WINDOW,
+        quantiles: tuple = QUANTILES,
+        periods: int = PERIODS_PER_YEAR,
+        rf: float = 0.0,
+        ) -> dict[str, np.ndarray]:
+    """
+    Compute the rolling statistics (see the module docstring) of a full
+    return history with vectorised passes.
+
+    Parameters
+    ----------
+    rets : np.ndarray
+        Returns in date order. NaN values are skipped (their statistics
+        are NaN and they do not count towards the window).
+
+    window : int, default WINDOW
+        Number of returns in each window. Must be at least 2.
+
+    quantiles : tuple[float], default QUANTILES
+        Quantiles of the windowed returns to compute.
+
+    periods : int, default PERIODS_PER_YEAR
+        Number of returns per year, used to annualise `vol` and `sharpe`.
+
+    rf : float, default 0.0
+        Risk-free return per period, used for `sharpe`.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        A dictionary mapping each statistic to a float64 array aligned
+        with `rets`.
+    """
+    if window < 2:
+        raise ValueError(f"Invalid window '{window}'")
+    rets = np.asarray(rets, dtype=np.float64)
+    valid = ~np.isnan(rets)
+    obs = rets[valid]
+    nobs = len(obs)
+
+    stats = {}
+    keys = ['mean', 'vol', 'sharpe', *map(_quantile_key, quantiles)]
+    for key in keys:
+        stats[key] = np.full(nobs, np.nan)
+    if nobs >= window:
+        view = sliding_window_view(obs, window)
+        mean = view.mean(axis=1)
+        std = view.std(axis=1, ddof=1)
+        stats['mean'][window - 1:] = mean
+        stats['vol'][window - 1:] = std * math.sqrt(periods)
+        # The Sharpe ratio is undefined (NaN) for flat windows
+        pos = std > 0
+        sharpe = np.full(len(std), np.nan)
+        sharpe[pos] = (mean[pos] - rf) / std[pos] * math.sqrt(periods)
+        stats['sharpe'][window - 1:] = sharpe
+        if quantiles:
+            qvals = np.quantile(view, quantiles, axis=1)
+            for q, values in zip(quantiles, qvals):
+                stats[_quantile_key(q)][window - 1:] = values
+
+    # Drawdowns of the cumulative return index over the full history
+    wealth = np.cumprod(1 + obs)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    stats['drawdown'] = wealth / peak - 1
+    stats['max_drawdown'] = np.minimum.accumulate(np.minimum(stats['drawdown'], 0.0))
+
+    out = {}
+    for key, values in stats.items():
+        out[key] = np.full(len(rets), np.nan)
+        out[key][valid] = values
+    return out
+
+
+def series_stats(series: dict, **kargs) -> dict[str, dict]:
+    """
+    Compute the rolling statistics of a `{<date>: <ret>}` dictionary, such
+    as the output of `main.main`, with `rolling_stats`.
+
+    Parameters
+    ----------
+    series : dict
+        Returns keyed by date. Dates are processed in sorted order, and
+        dates with a missing return are skipped.
+
+    **kargs
+        Other arguments of `rolling_stats`.
+
+    Returns
+    -------
+    dict[str, dict]
+        A dictionary mapping each statistic to a `{<date>: <value>}`
+        dictionary, in date order.
+
+    Examples
+    --------
+    >> stats = series_stats(main(['aapl', 'csco']), window=21)
+    >> stats['vol']['2024-12-30']
+    0.1552272246217947
+    """
+    dates, rets = _series_arrays(series)
+    stats = rolling_stats(rets, **kargs)
+    return {key: dict(zip(dates, values.tolist())) for key, values in stats.items()}
+
+
+# ----------------------------------------------------------------------------
+#  Online updates
+# ----------------------------------------------------------------------------
+def init_stats(
+        window: int = WINDOW,
+        quantiles: tuple = QUANTILES,
+        periods: int = PERIODS_PER_YEAR,
+        rf: float = 0.0,
+        history: dict | None = None,
+        ) -> dict:
+    """
+    Create the state for `update_stats`.
+
+    Parameters
+    ----------
+    window, quantiles, periods, rf
+        See `rolling_stats`.
+
+    history : dict, optional
+        Returns already observed, as a `{<date>: <ret>}` dictionary. The
+        state is built from them directly (the cumulative return index
+        and its peak with vectorised passes, the window statistics from
+        the last `window` returns) instead of one update per date.
+
+    Returns
+    -------
+    dict
+        The state, with the parameters and the keys `last_date`, `count`
+        (returns in the window), `values` (the window, oldest first),
+        `sorted` (the window, sorted), `mean`, `m2` (sum of squared
+        deviations from the mean), `wealth`, `peak` and `max_drawdown`.
+    """
+    if window < 2:
+        raise ValueError(f"Invalid window '{window}'")
+    state = {
+        'window': window,
+        'quantiles': tuple(quantiles),
+        'periods': periods,
+        'rf': rf,
+        'last_date': None,
+        'count': 0,
+        'values': deque(),
+        'sorted': [],
+        'mean': 0.0,
+        'm2': 0.0,
+        'wealth': 1.0,
+        'peak': 1.0,
+        'max_drawdown': 0.0,
+    }
+    if not history:
+        return state
+
+    dates, rets = _series_arrays(history)
+    if not dates:
+        return state
+    wealth = np.cumprod(1 + rets)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    last = rets[-window:]
+    state.update({
+        'last_date': dates[-1],
+        'count': len(last),
+        'values': deque(last.tolist()),
+        'sorted': sorted(last.tolist()),
+        'mean': float(last.mean()),
+        'm2': float(((last - last.mean()) ** 2).sum()),
+        'wealth': float(wealth[-1]),
+        'peak': float(peak[-1]),
+        'max_drawdown': min(0.0, float((wealth / peak - 1).min())),
+    })
+    return state
+
+
+def update_stats(state: dict, date, ret: float | None) -> dict | None:
+    """
+    Add the return of a new date to the state (in place) and return the
+    statistics for that date.
+
+    Parameters
+    ----------
+    state : dict
+        A state created by `init_stats`.
+
+    date
+        The date of the return. It must be after the last date added.
+
+    ret : float or None
+        The return. If missing (None or NaN), the state is not changed.
+
+    Returns
+    -------
+    dict or None
+        A dictionary with the statistics (see the module docstring), or
+        None if `ret` is missing.
+
+    Examples
+    --------
+    >> state = init_stats(window=21, history=main(['aapl', 'csco']))
+    >> update_stats(state, '2024-12-31', 0.004)
+    {'mean': 0.00296..., 'vol': 0.15358..., 'sharpe': 4.86600...,
+     'q0.05': -0.01290..., 'drawdown': -0.02167..., 'max_drawdown': -0.30918...}
+    """
+    if state['last_date'] is not None and not date > state['last_date']:
+        raise ValueError(f"Invalid date '{date}': not after '{state['last_date']}'")
+    if ret is None or math.isnan(ret):
+        return None
+    state['last_date'] = date
+    window = state['window']
+
+    # Welford's updates of the window mean and sum of squared deviations
+    values = state['values']
+    mean = state['mean']
+    if state['count'] < window:
+        state['count'] += 1
+        delta = ret - mean
+        mean += delta / state['count']
+        state['m2'] += delta * (ret - mean)
+    else:
+        old = values.popleft()
+        new_mean = mean + (ret - old) / window
+        state['m2'] += (ret - old) * (ret - new_mean + old - mean)
+        mean = new_mean
+        del state['sorted'][bisect.bisect_left(state['sorted'], old)]
+    state['mean'] = mean
+    values.append(ret)
+    bisect.insort(state['sorted'], ret)
+
+    # Running peak of the cumulative return index
+    state['wealth'] *= 1 + ret
+    state['peak'] = max(state['peak'], state['wealth'])
+    drawdown = state['wealth'] / state['peak'] - 1
+    state['max_drawdown'] = min(state['max_drawdown'], drawdown)
+
+    stats = {key: math.nan for key in ('mean', 'vol', 'sharpe')}
+    for q in state['quantiles']:
+        stats[_quantile_key(q)] = math.nan
+    if state['count'] == window:
+        # Rounding can make m2 slightly negative when the window is flat
+        std = math.sqrt(max(state['m2'], 0.0) / (window - 1))
+        scale = math.sqrt(state['periods'])
+        stats['mean'] = mean
+        stats['vol'] = std * scale
+        if std > 0:
+            stats['sharpe'] = (mean - state['rf']) / std * scale
+        for q in state['quantiles']:
+            stats[_quantile_key(q)] = _sorted_quantile(state['sorted'], q)
+    stats['drawdown'] = drawdown
+    stats['max_drawdown'] = state['max_drawdown']
+    return stats
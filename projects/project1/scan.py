@@ -0,0 +1,311 @@
+"""
+Module scan
+
+Byte-level parsing of the `.dat` files used in Project 1.
+
+`columnar.lines_to_columns` starts from the lines of a file, so the file
+is first decoded into a str, split into a list of line strings, and then
+split again into one str per field before any value is converted. The
+functions in this module memory-map the file instead and work on its raw
+bytes as a NumPy `uint8` array:
+
+1. The positions of all `:` and `,`/newline bytes are found with a single
+   comparison each. Every `key:value` field runs from the separator
+   before its colon to the separator after it.
+2. The layout is validated (keys in the order of `columnar.COLUMNS`, one
+   line per record, nothing outside the fields but whitespace).
+3. Each column is gathered into a small (rows, width) byte matrix and
+   converted with vectorised digit arithmetic directly into the arrays
+   of a column dictionary.
+
+Prices and share counts are converted exactly: a decimal with at most
+15 significant digits is an integer mantissa `m < 2**53` divided by a
+power of ten `10**k <= 10**22`, and both are exact float64 values, so the
+single (correctly rounded) division `m / 10**k` gives the same float as
+`float(text)`.
+
+Files that use any other layout (keys in a different order, exponents,
+long mantissas, malformed values, ...) are parsed with
+`columnar.lines_to_columns` instead, so the result is always the same as
+`ingest.parse_dat_file`.
+
+"""
+
+import mmap
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.columnar import (
+        COLUMNS,
+        VALUE_COLS,
+        lines_to_columns,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+COLON, COMMA, LF, CR, DOT, MINUS, PLUS, SPACE, TAB = b':,\n\r.-+ \t'
+
+# Powers of ten, as int64 (for mantissas) and float64 (for divisors)
+POW10 = 10 ** np.arange(19, dtype=np.int64)
+FPOW10 = POW10.astype(np.float64)
+
+# Largest number of significant digits converted exactly
+MAX_FLOAT_DIGITS = 15
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def _gather(buf: np.ndarray, starts: np.ndarray, lens: np.ndarray) -> np.ndarray:
+    """
+    Return a (rows, width) matrix with the bytes of each field, zero-padded
+    on the right.
+    """
+    width = int(lens.max(initial=0))
+    offsets = np.arange(width)
+    idx = starts[:, None] + offsets
+    np.minimum(idx, len(buf) - 1, out=idx)
+    chars = buf[idx]
+    chars[offsets >= lens[:, None]] = 0
+    return chars
+
+
+def _field_bounds(buf: np.ndarray) -> tuple | None:
+    """
+    Locate the values of every field.
+
+    Returns
+    -------
+    tuple or None
+        `(starts, ends)`, two arrays of shape (nrows, len(COLUMNS)) with
+        the positions of the first byte of each value and of the separator
+        after it, or None if the file does not follow the expected layout.
+    """
+    ncols = len(COLUMNS)
+    # Positions of all colons and separators, with a final newline at the
+    # end of the file
+    is_colon = buf == COLON
+    marks = np.flatnonzero(is_colon | (buf == COMMA) | (buf == LF) | (buf == CR))
+    chars = np.append(buf[marks], np.uint8(LF))
+    marks = np.append(marks, len(buf))
+    colons = np.flatnonzero(chars == COLON)
+    if len(colons) == 0 or len(colons) % ncols:
+        return None
+
+    # Every field ends at the mark after its colon and starts after the
+    # mark before it
+    after = chars[colons + 1]
+    if (after == COLON).any():
+        # More than one colon in a field
+        return None
+    starts = (marks[colons] + 1).reshape(-1, ncols)
+    ends = marks[colons + 1].reshape(-1, ncols)
+    key_starts = np.where(colons > 0, marks[colons - 1] + 1, 0).reshape(-1, ncols)
+
+    # Keys must follow the order of COLUMNS on every line
+    for j, key in enumerate(COLUMNS):
+        if (starts[:, j] - 1 - key_starts[:, j] != len(key)).any():
+            return None
+        key_chars = buf[key_starts[:, j, None] + np.arange(len(key))]
+        if (key_chars != np.frombuffer(key.encode(), dtype=np.uint8)).any():
+            return None
+
+    # Fields on the same line are separated by exactly one comma, and the
+    # last field ends the line
+    after = after.reshape(-1, ncols)
+    if ((after[:, :-1] != COMMA).any()
+            or (key_starts[:, 1:] != ends[:, :-1] + 1).any()
+            or (after[:, -1] == COMMA).any()):
+        return None
+
+    # Outside the fields, only whitespace is allowed (e.g. blank lines).
+    # Lines are normally separated by a single newline, so only the longer
+    # gaps between the last field of a line and the first of the next one
+    # need to be looked at
+    gap_starts = np.append(0, ends[:, -1])
+    gap_ends = np.append(key_starts[:, 0], len(buf))
+    long_gaps = gap_ends - gap_starts > 1
+    for lo, hi in zip(gap_starts[long_gaps].tolist(), gap_ends[long_gaps].tolist()):
+        gap = buf[lo:hi]
+        if not ((gap == LF) | (gap == CR) | (gap == SPACE) | (gap == TAB)).all():
+            return None
+    return starts, ends
+
+
+def _to_numbers(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple:
+    """
+    Convert decimal fields into numbers.
+
+    The fields are processed one byte position at a time (Horner's rule),
+    so each step only works on one contiguous byte per row.
+
+    Returns
+    -------
+    tuple or None
+        `(values, blank)`, where `values` is a float64 array and `blank`
+        flags empty or whitespace-only fields. None if a field is not a
+        plain decimal.
+    """
+    lens = ends - starts
+    nrows = len(lens)
+    last = len(buf) - 1
+    mantissa = np.zeros(nrows, dtype=np.int64)
+    ndots = np.zeros(nrows, dtype=np.int32)
+    dot_pos = np.zeros(nrows, dtype=np.int64)
+    neg = np.zeros(nrows, dtype=bool)
+    sign = np.zeros(nrows, dtype=bool)
+    bad = np.zeros(nrows, dtype=bool)
+    for k in range(int(lens.max(initial=0))):
+        inside = lens > k
+        char = buf[np.minimum(starts + k, last)]
+        digit = char - np.uint8(ord('0'))
+        is_digit = inside & (digit < 10)
+        is_dot = inside & (char == DOT)
+        other = inside & ~(is_digit | is_dot)
+        if k == 0:
+            neg = inside & (char == MINUS)
+            sign = neg | (inside & (char == PLUS))
+            other &= ~sign
+        bad |= other
+        np.copyto(mantissa, mantissa * 10 + digit, where=is_digit)
+        np.copyto(dot_pos, k, where=is_dot)
+        ndots += is_dot
+
+    # Empty fields and fields with only whitespace are missing values
+    blank = lens == 0
+    for i in np.flatnonzero(bad).tolist():
+        field = buf[starts[i]:ends[i]]
+        if not ((field == SPACE) | (field == TAB)).all():
+            return None
+        blank[i] = True
+
+    ndigits = lens - ndots - sign
+    valid = ndigits > 0
+    valid &= ndots <= 1
+    valid &= ndigits <= MAX_FLOAT_DIGITS
+    if not (valid | blank).all():
+        return None
+
+    nfrac = np.where(ndots > 0, lens - 1 - dot_pos, 0)
+    values = mantissa / FPOW10[nfrac]
+    np.negative(values, out=values, where=neg)
+    return values, blank
+
+
+def _to_ords(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple | None:
+    """
+    Convert `YYYY-MM-DD` fields into int32 day ordinals.
+
+    Returns
+    -------
+    tuple or None
+        `(ords, blank)`, where `blank` flags empty fields, or None if a
+        field is not a valid date.
+    """
+    lens = ends - starts
+    blank = lens == 0
+    if not ((lens == 10) | blank).all():
+        return None
+    chars = _gather(buf, starts, np.where(blank, 0, 10))
+    if len(chars) == 0 or blank.all():
+        return np.zeros(len(chars), dtype=np.int32), blank
+    chars = chars[~blank]
+    digits = chars.astype(np.int64) - ord('0')
+    pos = np.array([0, 1, 2, 3, 5, 6, 8, 9])
+    if ((digits[:, pos] < 0) | (digits[:, pos] > 9)).any() or (chars[:, [4, 7]] != MINUS).any():
+        return None
+    year = digits[:, :4] @ POW10[3::-1]
+    month = digits[:, 5] * 10 + digits[:, 6]
+    day = digits[:, 8] * 10 + digits[:, 9]
+    if ((month < 1) | (month > 12) | (day < 1)).any():
+        return None
+
+    months = (year - 1970) * 12 + (month - 1)
+    first = months.astype('datetime64[M]').astype('datetime64[D]')
+    days = first + (day - 1)
+    if (days.astype('datetime64[M]') != months.astype('datetime64[M]')).any():
+        # Day past the end of the month
+        return None
+    ords = np.zeros(len(lens), dtype=np.int32)
+    ords[~blank] = days.astype(np.int64)
+    return ords, blank
+
+
+def _scan_buffer(buf: np.ndarray) -> dict | None:
+    """
+    Parse the bytes of a `.dat` file into a column dictionary, or return
+    None if they cannot be parsed at the byte level.
+    """
+    bounds = _field_bounds(buf)
+    if bounds is None:
+        return None
+    starts, ends = bounds
+    idx = {key: j for j, key in enumerate(COLUMNS)}
+
+    dates = _to_ords(buf, starts[:, idx['date']], ends[:, idx['date']])
+    if dates is None:
+        return None
+    ords, no_date = dates
+
+    # Tickers: view each padded row of bytes as one fixed-width string
+    j = idx['ticker']
+    chars = _gather(buf, starts[:, j], ends[:, j] - starts[:, j])
+    no_ticker = ends[:, j] == starts[:, j]
+    keep = ~(no_date | no_ticker)
+    names = np.ascontiguousarray(chars[keep]).view(f'S{max(chars.shape[1], 1)}').ravel()
+    uniq, codes = np.unique(names, return_inverse=True)
+
+    cols = {
+        'date': ords[keep],
+        'ticker': codes.astype(np.int32),
+    }
+    for key in VALUE_COLS:
+        res = _to_numbers(buf, starts[keep, idx[key]], ends[keep, idx[key]])
+        if res is None:
+            return None
+        values, blank = res
+        values[blank] = np.nan
+        cols[key] = values
+    cols['tickers'] = np.array([tic.decode() for tic in uniq.tolist()], dtype=object)
+    return cols
+
+
+# ----------------------------------------------------------------------------
+#  Parsing
+# ----------------------------------------------------------------------------
+def scan_dat_file(pth: Path) -> dict:
+    """
+    Memory-map a `.dat` file and parse its bytes into a column dictionary.
+
+    Parameters
+    ----------
+    pth : Path
+        Location of the `.dat` file.
+
+    Returns
+    -------
+    dict
+        The same column dictionary `ingest.parse_dat_file(pth)` returns.
+
+    Raises
+    ------
+    ValueError
+        If the file cannot be parsed (see `columnar.lines_to_columns`).
+    """
+    pth = Path(pth)
+    cols = None
+    with open(pth, 'rb') as fobj:
+        if pth.stat().st_size > 0:
+            with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = np.frombuffer(mm, dtype=np.uint8)
+                try:
+                    cols = _scan_buffer(buf)
+                finally:
+                    # The mapping cannot be closed while `buf` exists
+                    del buf
+    if cols is None:
+        cols = lines_to_columns(pth.read_text().splitlines())
+    return cols
@@ -0,0 +1,198 @@
+"""
+Module shared
+
+Panels in shared memory, so that several processes can use the same
+parsed data without each parsing the `.dat` files again.
+
+One process parses the files once and calls `publish_panel` (or
+`publish_dat_files`), which copies the arrays of a panel dictionary (see
+`panel`) into a single `multiprocessing.shared_memory` block and returns
+a small descriptor:
+
+    {
+        'name': 'psm_1a2b3c',          # name of the shared memory block
+        'tickers': ['AAPL', ...],
+        'arrays': {
+            'dates': {'dtype': '<i4', 'shape': [2515], 'offset': 0},
+            'present': {'dtype': '|b1', 'shape': [22, 2515], 'offset': 2560},
+            ...
+        },
+    }
+
+The descriptor only holds names, shapes and offsets, so it can be pickled
+to worker processes or saved as JSON. Workers call `attach_panel` with it
+and get NumPy arrays that are read-only views of the shared block: no
+parsing and no copy. The publishing process must keep the block alive
+while workers use it and call `release` when they are done.
+
+"""
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+
+from projects.aligned import array_layout, array_views
+from projects.project1.ingest import read_dat_columns
+from projects.project1.panel import (
+        columns_to_panel,
+        mk_mkt_val_panel,
+        mk_rets_panel,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def _attach(name: str) -> SharedMemory:
+    """
+    Attach to an existing shared memory block without taking ownership of
+    it, so that it is not removed when this process exits.
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13, attaching registers the block with the resource
+    # tracker, which removes it when this process exits. Skip the
+    # registration (unregistering afterwards would also drop the
+    # registration of the publishing process if it shares the tracker)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+# ----------------------------------------------------------------------------
+#  Publishing and attaching
+# ----------------------------------------------------------------------------
+def publish_panel(panel: dict, name: str | None = None) -> tuple:
+    """
+    Copy the arrays of a panel dictionary into a new shared memory block.
+
+    Parameters
+    ----------
+    panel : dict
+        A panel dictionary (see `panel`). Every key other than `tickers`
+        must be a NumPy array, e.g. `dates`, `present`, price, shares,
+        return and market value panels.
+
+    name : str, optional
+        Name of the shared memory block. If None, a unique name is chosen.
+
+    Returns
+    -------
+    tuple[dict, SharedMemory]
+        The descriptor (see the module docstring) and the shared memory
+        block. Keep the block while other processes use the panel and
+        pass it to `release` afterwards.
+
+    Examples
+    --------
+    >> desc, shm = publish_dat_files(paths)
+    >> with ProcessPoolExecutor() as pool:
+           list(pool.map(work, [desc] * 4))
+    >> release(shm)
+    """
+    arrays = {
+        key: np.ascontiguousarray(value)
+        for key, value in panel.items() if key != 'tickers'
+    }
+    # Each array starts at a multiple of `aligned.ALIGN` bytes
+    layout, size = array_layout(arrays)
+
+    shm = SharedMemory(name=name, create=True, size=max(size, 1))
+    try:
+        views = array_views(layout, shm.buf)
+        for key, arr in arrays.items():
+            views[key][...] = arr
+        del views
+    except BaseException:
+        release(shm)
+        raise
+    desc = {
+        'name': shm.name,
+        'tickers': [str(tic) for tic in panel['tickers']],
+        'arrays': layout,
+    }
+    return desc, shm
+
+
+def attach_panel(desc: dict) -> tuple:
+    """
+    Attach to a panel published with `publish_panel`.
+
+    Parameters
+    ----------
+    desc : dict
+        The descriptor returned by `publish_panel`.
+
+    Returns
+    -------
+    tuple[dict, SharedMemory]
+        The panel dictionary, whose arrays are read-only views of the
+        shared memory block (`tickers` is a regular object array), and the
+        block. Delete the panel and then call `shm.close()` when done; the
+        block itself is only removed by the publishing process.
+    """
+    shm = _attach(desc['name'])
+    panel = {'tickers': np.array(desc['tickers'], dtype=object)}
+    for key, arr in array_views(desc['arrays'], shm.buf).items():
+        arr.flags.writeable = False
+        panel[key] = arr
+    return panel, shm
+
+
+def release(shm: SharedMemory):
+    """
+    Close and remove a shared memory block created by `publish_panel`.
+    Processes still attached keep their mapping until they close it.
+    """
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def publish_dat_files(
+        paths: list[Path],
+        prc_col: str = 'adj_close',
+        workers: int | None = 1,
+        name: str | None = None,
+        ) -> tuple:
+    """
+    Parse `.dat` files once and publish their price, shares, return and
+    market value panels in shared memory.
+
+    Parameters
+    ----------
+    paths : list[Path]
+        Locations of the `.dat` files.
+
+    prc_col : str, default 'adj_close'
+        Price column used for returns and market values.
+
+    workers : int, optional
+        Number of processes used to parse the files (see
+        `ingest.read_dat_columns`).
+
+    name : str, optional
+        Name of the shared memory block (see `publish_panel`).
+
+    Returns
+    -------
+    tuple[dict, SharedMemory]
+        See `publish_panel`. The panel has the keys `tickers`, `dates`,
+        `present`, `<prc_col>`, `shares`, `rets` and `mkt_val`, so
+        `panel.mk_vw_port_panel(panel['rets'], panel['mkt_val'])` gives
+        the value-weighted portfolio returns.
+    """
+    cols = read_dat_columns(paths, workers=workers, scan=True)
+    panel = columns_to_panel(cols, columns=[prc_col, 'shares'])
+    panel['rets'] = mk_rets_panel(panel, prc_col=prc_col)
+    panel['mkt_val'] = mk_mkt_val_panel(panel, prc_col=prc_col)
+    return publish_panel(panel, name=name)
@@ -0,0 +1,180 @@
+"""
+Module streaming
+
+Bounded-memory computation of value-weighted portfolio returns.
+
+`main.main` keeps the data for all tickers in memory at once. The
+functions in this module instead read the `.dat` files a few at a time,
+fold each ticker's contribution into running per-date accumulators (the
+numerator and denominator of the value-weighted average), and then drop
+that ticker's data. Peak memory is therefore proportional to the number
+of dates rather than to the number of tickers times the number of dates.
+
+The accumulators are stored in a dictionary:
+
+     Key      Dtype     Description
+     ---      -----     -----------
+     start    int       day ordinal of the first position
+     numer    float64   sum of `mkt_val * ret` for each day
+     denom    float64   sum of `mkt_val` for each day
+
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.columnar import ords_to_dates
+from projects.project1.ingest import read_dat_columns
+from projects.project1.panel import (
+        columns_to_panel,
+        mk_mkt_val_panel,
+        mk_rets_panel,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  Accumulators
+# ----------------------------------------------------------------------------
+def new_accumulator() -> dict:
+    """
+    Return empty accumulators.
+    """
+    return {
+        'start': 0,
+        'numer': np.zeros(0),
+        'denom': np.zeros(0),
+    }
+
+
+def extend_accumulator(acc: dict, first: int, last: int):
+    """
+    Extend the accumulators (in place) so they cover the day ordinals from
+    `first` to `last`. When extending to later dates, the arrays at least
+    double in size, so adding dates one at a time is cheap.
+    """
+    size = len(acc['numer'])
+    if size == 0:
+        acc['start'] = first
+    if first >= acc['start'] and last < acc['start'] + size:
+        return
+    start = min(acc['start'], first)
+    end = acc['start'] + size
+    if last >= end:
+        end = max(last + 1, start + 2 * size)
+    for key in ('numer', 'denom'):
+        arr = np.zeros(end - start)
+        offset = acc['start'] - start
+        arr[offset:offset + size] = acc[key]
+        acc[key] = arr
+    acc['start'] = start
+
+
+def fold_panel(
+        acc: dict,
+        panel: dict,
+        prc_col: str = 'adj_close',
+        shares_col: str = 'shares',
+        ):
+    """
+    Add the contributions of all the tickers in `panel` to the accumulators
+    (in place).
+
+    Parameters
+    ----------
+    acc : dict
+        Accumulators, as returned by `new_accumulator`.
+
+    panel : dict
+        A panel dictionary (see `panel`) with the full history of each of
+        its tickers. A ticker must not appear in more than one panel.
+
+    prc_col : str, default 'adj_close'
+        The name of the price column.
+
+    shares_col : str, default 'shares'
+        The name of the column with the number of shares.
+
+    Notes
+    -----
+    Tickers are added one at a time, in panel order, so the sums are
+    identical to the ones `mk_vw_port` computes when it visits the tickers
+    in the same order.
+    """
+    dates = panel['dates']
+    if len(dates) == 0:
+        return
+    rets = mk_rets_panel(panel, prc_col=prc_col)
+    mkt_val = mk_mkt_val_panel(panel, prc_col=prc_col, shares_col=shares_col)
+    valid = ~(np.isnan(rets) | np.isnan(mkt_val))
+
+    extend_accumulator(acc, int(dates[0]), int(dates[-1]))
+    for ret, mv, ok in zip(rets, mkt_val, valid):
+        pos = dates[ok] - acc['start']
+        acc['numer'][pos] += mv[ok] * ret[ok]
+        acc['denom'][pos] += mv[ok]
+
+
+def accumulator_to_vw(acc: dict) -> dict:
+    """
+    Return the value-weighted portfolio returns implied by the
+    accumulators.
+
+    Returns
+    -------
+    dict[str, float]
+        A dictionary mapping each date (in `'YYYY-MM-DD'` format) with a
+        positive total market value to the value-weighted portfolio
+        return on that date.
+    """
+    denom = acc['denom']
+    pos = np.flatnonzero(denom > 0)
+    dates = ords_to_dates(acc['start'] + pos)
+    return dict(zip(dates, (acc['numer'][pos] / denom[pos]).tolist()))
+
+
+# ----------------------------------------------------------------------------
+#  Streaming pipeline
+# ----------------------------------------------------------------------------
+def stream_vw_rets(
+        paths: list[Path],
+        prc_col: str = 'adj_close',
+        chunk: int = 1,
+        cache_dir: Path | None = None,
+        scan: bool = False,
+        ) -> dict:
+    """
+    Compute value-weighted portfolio returns reading `chunk` `.dat` files
+    at a time.
+
+    Parameters
+    ----------
+    paths : list[Path]
+        Locations of the `.dat` files. Each ticker's data must be in a
+        single file.
+
+    prc_col : str, default 'adj_close'
+        The name of the price column to use when computing returns.
+
+    chunk : int, default 1
+        Number of files held in memory at a time.
+
+    cache_dir : Path, optional
+        If given, files are loaded through the binary cache in this folder
+        (see `cache.load_columns`).
+
+    scan : bool, default False
+        If True, files are parsed with `scan.scan_dat_file`.
+
+    Returns
+    -------
+    dict[str, float]
+        The same dictionary `mk_vw_port` returns for these files.
+    """
+    acc = new_accumulator()
+    for lo in range(0, len(paths), chunk):
+        cols = read_dat_columns(
+            paths[lo:lo + chunk], workers=1, cache_dir=cache_dir, scan=scan)
+        panel = columns_to_panel(cols, columns=[prc_col, 'shares'])
+        fold_panel(acc, panel, prc_col=prc_col)
+    return accumulator_to_vw(acc)
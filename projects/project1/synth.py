@@ -0,0 +1,158 @@
+"""
+Module synth
+
+Synthetic `.dat` files for Project 1.
+
+The 22 files in `data/` are too small to show how the functions in
+`task_project1` scale. `write_dat_files` writes any number of ticker files
+in exactly the same format:
+
+    date:2016-02-10,ticker:CSCO,open:23.13,close:22.51,adj_close:16.8671,shares:5076080000
+
+with configurable history length, line order and missing values, so
+benchmarks can run on universes of 10 to 10,000 tickers.
+
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.columnar import dates_to_ords, ords_to_dates
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+START_DATE = '2010-01-04'
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def synthetic_tickers(ntickers: int) -> list[str]:
+    """
+    Return `ntickers` distinct upper-case ticker symbols ('AAAA', 'AAAB',
+    ...). The files are named after the lower-case symbols.
+    """
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    codes = np.arange(ntickers)
+    chars = [letters[(codes // 26 ** k) % 26] for k in (3, 2, 1, 0)]
+    return [''.join(tic) for tic in zip(*chars)]
+
+
+def business_days(ndates: int, start: str = START_DATE) -> np.ndarray:
+    """
+    Return `ndates` consecutive weekdays from `start`, as day ordinals.
+    """
+    first = dates_to_ords([start])[0]
+    # Enough calendar days to contain `ndates` weekdays
+    days = first + np.arange(ndates * 7 // 5 + 7, dtype=np.int32)
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    return days[weekday < 5][:ndates]
+
+
+def _fmt_prices(values: np.ndarray) -> list[str]:
+    """ Format prices with 4 decimals (blank if NaN) """
+    out = np.char.mod('%.4f', values).tolist()
+    for i in np.flatnonzero(np.isnan(values)).tolist():
+        out[i] = ''
+    return out
+
+
+def mk_ticker_lines(
+        ticker: str,
+        dates: list[str],
+        rng: np.random.Generator,
+        missing: float = 0.01,
+        shuffle: bool = True,
+        ) -> list[str]:
+    """
+    Create the lines of a `.dat` file for one ticker.
+
+    Prices follow a geometric random walk, `close` is `adj_close` scaled by
+    a constant factor, and `open` is `close` plus noise. Shares change a
+    few times over the history. Each value is missing (blank) with
+    probability `missing`. If `shuffle`, the lines are in random order,
+    as in the files in `data/`.
+    """
+    ndates = len(dates)
+    adj = np.exp(np.cumsum(rng.normal(0.0003, 0.02, ndates)))
+    adj *= rng.uniform(5, 500)
+    close = adj * rng.uniform(1.0, 1.5)
+    opn = close * (1 + rng.normal(0, 0.01, ndates))
+    shares = np.full(ndates, rng.integers(10**6, 10**10), dtype=np.int64)
+    for pos in rng.integers(0, ndates, size=3):
+        shares[pos:] = (shares[pos:] * rng.uniform(0.9, 1.1)).astype(np.int64)
+
+    cols = {}
+    for key, values in (('open', opn), ('close', close), ('adj_close', adj)):
+        values = np.round(values, 4)
+        values[rng.random(ndates) < missing] = np.nan
+        cols[key] = _fmt_prices(values)
+    cols['shares'] = shares.astype(str).tolist()
+    for i in np.flatnonzero(rng.random(ndates) < missing).tolist():
+        cols['shares'][i] = ''
+
+    order = rng.permutation(ndates) if shuffle else range(ndates)
+    return [
+        f"date:{dates[i]},ticker:{ticker},open:{cols['open'][i]},"
+        f"close:{cols['close'][i]},adj_close:{cols['adj_close'][i]},"
+        f"shares:{cols['shares'][i]}"
+        for i in order
+    ]
+
+
+# ----------------------------------------------------------------------------
+#  Generator
+# ----------------------------------------------------------------------------
+def write_dat_files(
+        out_dir: Path,
+        ntickers: int,
+        ndates: int = 2520,
+        missing: float = 0.01,
+        shuffle: bool = True,
+        seed: int = 0,
+        ) -> list[Path]:
+    """
+    Write synthetic `.dat` files, one per ticker.
+
+    Parameters
+    ----------
+    out_dir : Path
+        Folder for the files (created if needed). Each file is named
+        `<ticker>.dat`, with the ticker in lower case.
+
+    ntickers : int
+        Number of tickers (files).
+
+    ndates : int, default 2520
+        Number of (week)days in each ticker's history, about 10 years by
+        default, as in the files in `data/`.
+
+    missing : float, default 0.01
+        Probability that each price or shares value is blank.
+
+    shuffle : bool, default True
+        If True, the lines of each file are in random order. Otherwise they
+        are sorted by date.
+
+    seed : int, default 0
+        Seed for the random number generator.
+
+    Returns
+    -------
+    list[Path]
+        The locations of the files, in ticker order.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = ords_to_dates(business_days(ndates))
+    paths = []
+    for tic in synthetic_tickers(ntickers):
+        lines = mk_ticker_lines(tic, dates, rng, missing=missing, shuffle=shuffle)
+        pth = out_dir / f'{tic.lower()}.dat'
+        pth.write_text('\n'.join(lines) + '\n')
+        paths.append(pth)
+    return paths
@@ -119,6 +119,61 @@ def organize_by_ticker(records: list[dict], column: str):
         data[ticker][date] = value
     return data
 
+def organize_by_ticker_multi(records: list[dict], columns: list[str]):
+    """
+    Group records by ticker and convert values in several columns at once
+
+    This function returns the same nested dictionaries as calling
+    `organize_by_ticker` once per column, but it traverses `records` only
+    once.
+
+    Parameters
+    ----------
+    records : list[dict]
+        A list of dictionaries, each containing at least the keys `'date'`,
+        `'ticker'`, and the columns specified in `columns`.
+
+    columns : list[str]
+        The names of the columns whose values should populate the inner
+        dictionaries.
+
+    Returns
+    -------
+    dict[str, dict[str, dict[str, float | None]]]
+        A dictionary mapping each column in `columns` to the nested
+        dictionary `organize_by_ticker(records, column)` would return.
+
+    Examples
+    --------
+    >> records = [
+           {'date': '2016-02-10', 'ticker': 'CSCO', 'adj_close': '16.8671', 'shares': '5076080000'},
+           {'date': '2016-02-09', 'ticker': 'CSCO', 'adj_close': '16.972', 'shares': ''},
+        ]
+
+    >> organize_by_ticker_multi(records, columns=['adj_close', 'shares'])
+    {
+        'adj_close': {'CSCO': {'2016-02-10': 16.8671, '2016-02-09': 16.972}},
+        'shares': {'CSCO': {'2016-02-10': 5076080000.0, '2016-02-09': None}},
+    }
+    """
+    data = {column: {} for column in columns}
+    prior_ticker = None
+    for dic in records:
+        ticker = dic['ticker']
+        # Records from the same file share a ticker, so only look up the
+        # inner dictionaries when the ticker changes
+        if ticker != prior_ticker:
+            inner = [
+                (column, data[column].setdefault(ticker, {}))
+                for column in columns
+            ]
+            prior_ticker = ticker
+        date = dic['date']
+        for column, by_date in inner:
+            value = dic[column]
+            by_date[date] = float(value) if value else None
+    return data
+
 def calc_rets(prices: dict):
     """
     Compute simple returns from a dictionary of prices.
@@ -183,6 +238,8 @@ def mk_rets_dict(prices: dict):
         A nested dictionary of the same structure:
             {<ticker>: {<date>: <return>,    }}
         The first date for each ticker will have a value of `None`.
+        `prices` is not modified, so it can still be used to compute
+        market values.
 
     Examples
     --------
@@ -196,10 +253,10 @@ def mk_rets_dict(prices: dict):
         'MSFT': {'2025-01-01': None, '2025-01-03': 0.05}
     }
     """
-    for tic in prices:
-        for date, ret in calc_rets(prices[tic]).items():
-            prices[tic][date] = ret
-    return prices
+    out = {}
+    for tic, prc_by_date in prices.items():
+        out[tic] = calc_rets(prc_by_date)
+    return out
 
 def mk_mkt_val_dict(prices: dict, shares: dict):
     """
@@ -0,0 +1,281 @@
+"""
+Module watch
+
+Watch mode for Project 1: keep the value-weighted portfolio returns up to
+date while `.dat` files in the data folder are added, rewritten or
+removed.
+
+`init_watch` parses every file once and builds the state of
+`incremental` (the aligned panels and the portfolio returns). Each call
+to `poll` then compares the modification time and size of every file
+with the previous poll and, for the files that changed:
+
+1. re-parses only those files (with `scan.scan_dat_file`);
+2. replaces the lines of their tickers with `incremental.replace_tickers`,
+   which recomputes the returns and market values of those tickers only,
+   and the portfolio return only on the dates where they changed;
+3. updates the result kept in memory (`watcher['vw']`) on those dates and,
+   if an output file was given, rewrites it as JSON.
+
+`watch` polls in a loop. Run it from the `toolkit` folder with:
+
+    python -m projects.project1.watch [<output.json>]
+
+Polling is used instead of OS-specific file notifications, so it works
+on any platform. A file that cannot be parsed (e.g. while it is being
+written) is reported in `watcher['errors']` and the previous version of
+its tickers is kept until the file changes again.
+
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from projects.project1.cache import atomic_write
+from projects.project1.columnar import concat_columns, ords_to_dates
+from projects.project1.incremental import (
+        init_state,
+        replace_tickers,
+        state_to_vw,
+        )
+from projects.project1.scan import scan_dat_file
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+DATA_DIR = Path(__file__).parent.joinpath('data')
+PATTERN = '*.dat'
+INTERVAL = 1.0  # Seconds between polls
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def snapshot(data_dir: Path, pattern: str = PATTERN) -> dict[str, tuple]:
+    """
+    Return a dictionary mapping the name of each file in `data_dir`
+    matching `pattern` to its modification time (in ns) and size.
+    """
+    stamps = {}
+    for pth in sorted(Path(data_dir).glob(pattern)):
+        try:
+            stat = pth.stat()
+        except FileNotFoundError:
+            # Removed since the folder was listed
+            continue
+        stamps[pth.name] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+def _parse_files(watcher: dict, names: list[str]) -> dict:
+    """
+    Parse the given files into `watcher['files']`, recording any errors
+    in `watcher['errors']`. Return the column dictionaries of the files
+    that were parsed.
+    """
+    parsed = {}
+    for name in names:
+        pth = watcher['data_dir'] / name
+        try:
+            parsed[name] = scan_dat_file(pth)
+        except (OSError, ValueError) as err:
+            watcher['errors'][name] = str(err)
+            continue
+        watcher['errors'].pop(name, None)
+        watcher['files'][name] = parsed[name]
+    return parsed
+
+
+def _write_json(vw: dict, out: Path):
+    """
+    Write the portfolio returns to `out` as JSON (with
+    `cache.atomic_write`).
+    """
+    with atomic_write(out, 'w') as fobj:
+        json.dump(dict(sorted(vw.items())), fobj, indent=1)
+
+
+# ----------------------------------------------------------------------------
+#  Watching
+# ----------------------------------------------------------------------------
+def init_watch(
+        data_dir: Path = DATA_DIR,
+        prc_col: str = 'adj_close',
+        out: Path | None = None,
+        pattern: str = PATTERN,
+        ) -> dict:
+    """
+    Parse all the files in `data_dir` and compute the portfolio returns.
+
+    Parameters
+    ----------
+    data_dir : Path, default DATA_DIR
+        Folder with the `.dat` files.
+
+    prc_col : str, default 'adj_close'
+        Price column used for returns and market values.
+
+    out : Path, optional
+        If given, the portfolio returns are written to this JSON file
+        (as `{<date>: <ret>}`) now and after every poll that changes them.
+
+    pattern : str, default PATTERN
+        Pattern of the names of the files to watch.
+
+    Returns
+    -------
+    dict
+        The watcher, a dictionary with the parameters and the keys:
+
+        - `stamps`: modification time and size of each file (see
+          `snapshot`) when it was last parsed;
+        - `files`: the column dictionary of each file;
+        - `errors`: the error message of each file that could not be
+          parsed;
+        - `state`: the state of `incremental`;
+        - `vw`: the portfolio returns, as `{<date>: <ret>}`;
+        - `polls`, `updated`: the number of polls and the time of the last
+          change.
+    """
+    watcher = {
+        'data_dir': Path(data_dir),
+        'prc_col': prc_col,
+        'out': None if out is None else Path(out),
+        'pattern': pattern,
+        'stamps': snapshot(data_dir, pattern),
+        'files': {},
+        'errors': {},
+        'polls': 0,
+        'updated': time.time(),
+    }
+    _parse_files(watcher, list(watcher['stamps']))
+    cols = concat_columns([watcher['files'][name] for name in sorted(watcher['files'])])
+    watcher['state'] = init_state(cols, prc_col=prc_col)
+    watcher['vw'] = state_to_vw(watcher['state'])
+    if watcher['out'] is not None:
+        _write_json(watcher['vw'], watcher['out'])
+    return watcher
+
+
+def poll(watcher: dict) -> dict:
+    """
+    Check the data folder once and apply the files that were added,
+    changed or removed since the last poll (see the module docstring).
+
+    Parameters
+    ----------
+    watcher : dict
+        The watcher, as returned by `init_watch`. It is updated in place.
+
+    Returns
+    -------
+    dict
+        The portfolio returns that changed, as `{<date>: <ret>}`, with
+        `None` for dates that no longer have a return. Empty if no file
+        changed.
+    """
+    watcher['polls'] += 1
+    stamps = snapshot(watcher['data_dir'], watcher['pattern'])
+    old = watcher['stamps']
+    changed = sorted(name for name in stamps if stamps[name] != old.get(name))
+    removed = sorted(name for name in old if name not in stamps)
+    if not changed and not removed:
+        return {}
+    watcher['stamps'] = stamps
+
+    # Tickers whose lines may have changed
+    files = watcher['files']
+    tickers = set()
+    for name in changed + removed:
+        if name in files:
+            tickers.update(files[name]['tickers'].tolist())
+    for name in removed:
+        files.pop(name, None)
+        watcher['errors'].pop(name, None)
+    for cols in _parse_files(watcher, changed).values():
+        tickers.update(cols['tickers'].tolist())
+    if not tickers:
+        return {}
+
+    # All the lines of those tickers, in the same file order as
+    # `init_watch`
+    parts = [
+        files[name] for name in sorted(files)
+        if np.isin(files[name]['tickers'], list(tickers)).any()
+    ]
+    affected = replace_tickers(watcher['state'], concat_columns(parts), sorted(tickers))
+    if len(affected) == 0:
+        return {}
+
+    updates = dict.fromkeys(ords_to_dates(affected))
+    updates.update(state_to_vw(watcher['state'], affected))
+    vw = watcher['vw']
+    for date, ret in updates.items():
+        if ret is None:
+            vw.pop(date, None)
+        else:
+            vw[date] = ret
+    watcher['updated'] = time.time()
+    if watcher['out'] is not None:
+        _write_json(vw, watcher['out'])
+    return updates
+
+
+def watch(
+        data_dir: Path = DATA_DIR,
+        prc_col: str = 'adj_close',
+        out: Path | None = None,
+        interval: float = INTERVAL,
+        callback=None,
+        max_polls: int | None = None,
+        ) -> dict:
+    """
+    Keep the portfolio returns up to date by polling the data folder.
+
+    Parameters
+    ----------
+    data_dir, prc_col, out
+        See `init_watch`.
+
+    interval : float, default INTERVAL
+        Seconds to wait between polls.
+
+    callback : callable, optional
+        Called as `callback(watcher, updates)` after every poll that
+        changes the portfolio returns, where `updates` is the output of
+        `poll`.
+
+    max_polls : int, optional
+        Stop after this many polls. If None, run until interrupted.
+
+    Returns
+    -------
+    dict
+        The watcher (see `init_watch`), when polling stops.
+    """
+    watcher = init_watch(data_dir, prc_col=prc_col, out=out)
+    try:
+        while max_polls is None or watcher['polls'] < max_polls:
+            time.sleep(interval)
+            updates = poll(watcher)
+            if updates and callback is not None:
+                callback(watcher, updates)
+    except KeyboardInterrupt:
+        pass
+    return watcher
+
+
+def _print_updates(watcher: dict, updates: dict):
+    """ Report the dates recomputed by a poll """
+    dates = sorted(updates)
+    print(f"{time.strftime('%H:%M:%S')}  {len(dates)} date(s) updated, "
+          f"{dates[0]} to {dates[-1]}")
+
+
+if __name__ == "__main__":
+    watch(out=sys.argv[1] if len(sys.argv) > 1 else None, callback=_print_updates)
@@ -0,0 +1,307 @@
+"""
+Module bench
+
+Benchmarks for the functions in `task_project2`.
+
+The files in `data/` cover one year and about a hundred deals, which is
+too small to show how the functions scale. The benchmarks below use
+random deal panels of any size instead, with the same layout as the
+outputs of `helpers.read_stk_rets` and `task_project2.mk_ma_info`, and
+compare the functions with the original loops (see `reference`).
+
+Run them from the `toolkit` folder with:
+
+    python -m projects.project2.bench
+
+Where the original loops are too slow to run on the largest panels, they
+are timed on the first `sample` deals and the time is scaled up to all
+the deals. They process one deal at a time, so their cost is linear in
+the number of deals.
+
+`bench_read_csv` uses the CSV files in `data/` and a temporary cache
+folder (see `cache`).
+
+"""
+
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from projects.project2 import cache, helpers
+from projects.project2.helpers import wide_to_long_rets
+from projects.project2.reference import (
+        expand_event_dates_loop,
+        mean_by_dates_loop,
+        mk_buy_tgt_sell_acq_rets_loop,
+        mk_random_ma_info,
+        mk_random_stk_rets,
+        mk_tgt_rets_by_event_time_loop,
+        )
+from projects.project2.task_project2 import (
+        expand_event_dates,
+        mean_by_dates,
+        mk_buy_tgt_sell_acq_rets,
+        mk_buy_tgt_sell_mkt_rets,
+        mk_prop_positive_tgt_rets,
+        mk_stk_arets,
+        mk_tgt_rets_by_event_time,
+        )
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def timeit(func, *args, repeat: int = 1, **kargs) -> tuple:
+    """
+    Call `func(*args, **kargs)` `repeat` times and return the best wall
+    time (in seconds) and the result of the last call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func(*args, **kargs)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def peak_memory(func, *args, **kargs) -> tuple:
+    """
+    Call `func(*args, **kargs)` under tracemalloc and return the peak
+    memory allocated during the call (in MB) and its result.
+    """
+    tracemalloc.start()
+    try:
+        res = func(*args, **kargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20, res
+
+
+def print_results(name: str, res: dict):
+    """ Print the results of a benchmark, one per line """
+    dashes = '-' * 40
+    print(dashes, name, dashes, sep='\n')
+    for key, value in res.items():
+        if isinstance(value, float):
+            value = f'{value:,.4f}'
+        print(f'  {key:<14} {value}')
+
+
+# ----------------------------------------------------------------------------
+#  Benchmarks
+# ----------------------------------------------------------------------------
+def bench_mean_by_dates(ntickers: int = 500, ndates: int = 2520, ndeals: int = 2000) -> dict:
+    """
+    Compare `mean_by_dates` with the original loop on the target abnormal
+    returns of a random deal panel (the input `mk_buy_tgt_sell_mkt_rets`
+    passes to it).
+
+    Returns
+    -------
+    dict
+        The number of rows and dates, the timing of each implementation
+        (in seconds), the speedup, and the largest difference between the
+        two results.
+    """
+    stk_rets = mk_random_stk_rets(ntickers, ndates)
+    ma_info = mk_random_ma_info(stk_rets, ndeals)
+    expanded = expand_event_dates(ma_info, stk_rets.index)
+    arets = wide_to_long_rets(stk_rets, ret_col='aret')
+    events = expanded.loc[:, ['date', 'tgt']].rename(columns={'tgt': 'ticker'})
+    events = events.merge(arets, on=['date', 'ticker'], how='inner')
+
+    loop_secs, expected = timeit(mean_by_dates_loop, events, 'date', 'aret')
+    grouped_secs, res = timeit(mean_by_dates, events, 'date', 'aret', repeat=3)
+    return {
+        'nrows': len(events),
+        'ndates': len(res),
+        'loop_secs': loop_secs,
+        'grouped_secs': grouped_secs,
+        'speedup': loop_secs / grouped_secs,
+        'same_index': res.index.equals(expected.index),
+        'max_diff': float((res - expected).abs().max()),
+    }
+
+
+def bench_expand_event_dates(
+        ndeals: int = 100000,
+        ndates: int = 2520,
+        sample: int = 1000,
+        ) -> dict:
+    """
+    Compare `expand_event_dates` with the original loop on random deals.
+    The loop is timed on the first `sample` deals and scaled up.
+
+    Returns
+    -------
+    dict
+        The number of deals and output rows, the timing of each
+        implementation (in seconds, the loop's estimated for all deals),
+        the speedup, and whether both give the same frame for the sample.
+    """
+    stk_rets = mk_random_stk_rets(20, ndates)
+    ma_info = mk_random_ma_info(stk_rets, ndeals)
+    sample = min(sample, ndeals)
+
+    loop_secs, expected = timeit(
+        expand_event_dates_loop, ma_info.iloc[:sample], stk_rets.index)
+    join_secs, res = timeit(expand_event_dates, ma_info, stk_rets.index, repeat=3)
+    loop_secs *= ndeals / sample
+    return {
+        'ndeals': ndeals,
+        'nrows': len(res),
+        'loop_secs': loop_secs,
+        'join_secs': join_secs,
+        'speedup': loop_secs / join_secs,
+        'match': expand_event_dates(ma_info.iloc[:sample], stk_rets.index).equals(expected),
+    }
+
+
+def bench_buy_tgt_sell_acq_rets(
+        scales: tuple = ((252, 100), (504, 200), (1260, 500)),
+        ntickers: int = 200,
+        ) -> list[dict]:
+    """
+    Compare `mk_buy_tgt_sell_acq_rets` with the original loop on random
+    deal panels of increasing size.
+
+    Parameters
+    ----------
+    scales : tuple[tuple[int, int]]
+        Pairs of (number of dates, number of deals).
+
+    ntickers : int, default 200
+        Number of tickers in the return panel.
+
+    Returns
+    -------
+    list[dict]
+        For each scale, the number of dates, deals and expanded rows, the
+        timing of each implementation (in seconds), the speedup, and the
+        largest difference between the two results.
+    """
+    out = []
+    for ndates, ndeals in scales:
+        stk_rets = mk_random_stk_rets(ntickers, ndates)
+        expanded = expand_event_dates(mk_random_ma_info(stk_rets, ndeals), stk_rets.index)
+        loop_secs, expected = timeit(mk_buy_tgt_sell_acq_rets_loop, expanded, stk_rets)
+        set_secs, res = timeit(mk_buy_tgt_sell_acq_rets, expanded, stk_rets, repeat=3)
+        out.append({
+            'ndates': ndates,
+            'ndeals': ndeals,
+            'nrows': len(expanded),
+            'loop_secs': loop_secs,
+            'set_secs': set_secs,
+            'speedup': loop_secs / set_secs,
+            'same_index': res.index.equals(expected.index),
+            'max_diff': float((res - expected.astype(float)).abs().max()),
+        })
+    return out
+
+
+def bench_tgt_rets_by_event_time(ntickers: int = 200, ndates: int = 2520, ndeals: int = 500) -> dict:
+    """
+    Compare `mk_tgt_rets_by_event_time` (and `mk_prop_positive_tgt_rets`
+    on its output) with the original loop on a random deal panel.
+
+    Returns
+    -------
+    dict
+        The number of expanded rows, the timing of each implementation and
+        of `mk_prop_positive_tgt_rets` on each output (in seconds), the
+        memory used by each output (in MB), and whether the results match.
+    """
+    stk_rets = mk_random_stk_rets(ntickers, ndates)
+    expanded = expand_event_dates(mk_random_ma_info(stk_rets, ndeals), stk_rets.index)
+    loop_secs, expected = timeit(mk_tgt_rets_by_event_time_loop, stk_rets, expanded)
+    matrix_secs, res = timeit(mk_tgt_rets_by_event_time, stk_rets, expanded, repeat=3)
+    prop_obj_secs, prop_obj = timeit(mk_prop_positive_tgt_rets, expected, repeat=3)
+    prop_secs, prop = timeit(mk_prop_positive_tgt_rets, res, repeat=3)
+    return {
+        'nrows': len(expanded),
+        'loop_secs': loop_secs,
+        'matrix_secs': matrix_secs,
+        'speedup': loop_secs / matrix_secs,
+        'prop_obj_secs': prop_obj_secs,
+        'prop_secs': prop_secs,
+        'object_mb': expected.memory_usage(deep=True).sum() / 2**20,
+        'float_mb': res.memory_usage(deep=True).sum() / 2**20,
+        'match': res.equals(expected.astype(float)) and prop.equals(prop_obj),
+    }
+
+
+def bench_stk_arets(ntickers: int = 2000, ndates: int = 2520, ndeals: int = 1000) -> dict:
+    """
+    Compare `mk_stk_arets` on the full panel with `mk_stk_arets` restricted
+    to the (date, target) pairs of `expand_event_dates`, as used by
+    `mk_buy_tgt_sell_mkt_rets`.
+
+    Returns
+    -------
+    dict
+        The number of rows of each output, their timing (in seconds) and
+        peak memory (in MB), and whether `mk_buy_tgt_sell_mkt_rets` gives
+        the same result with both.
+    """
+    stk_rets = mk_random_stk_rets(ntickers, ndates)
+    org_ff = pd.DataFrame(
+        {'Mkt-RF': np.random.default_rng(1).normal(0, 0.01, ndates), 'RF': 0.0001},
+        index=stk_rets.index)
+    expanded = expand_event_dates(mk_random_ma_info(stk_rets, ndeals), stk_rets.index)
+
+    full_secs, full = timeit(mk_stk_arets, stk_rets, org_ff)
+    sparse_secs, sparse = timeit(
+        mk_stk_arets, stk_rets, org_ff, expanded_ma_info=expanded, repeat=3)
+    full_mb, _ = peak_memory(mk_stk_arets, stk_rets, org_ff)
+    sparse_mb, _ = peak_memory(mk_stk_arets, stk_rets, org_ff, expanded_ma_info=expanded)
+    match = mk_buy_tgt_sell_mkt_rets(expanded, full).equals(
+        mk_buy_tgt_sell_mkt_rets(expanded, sparse))
+    return {
+        'panel_cells': ntickers * ndates,
+        'full_rows': len(full),
+        'sparse_rows': len(sparse),
+        'full_secs': full_secs,
+        'sparse_secs': sparse_secs,
+        'full_mb': full_mb,
+        'sparse_mb': sparse_mb,
+        'match': match,
+    }
+
+
+def bench_read_csv(repeat: int = 5) -> dict:
+    """
+    Compare `helpers.read_org_ff` and `helpers.read_stk_rets` with the
+    cached readers in `cache`, on the first call (parsing the CSV file and
+    writing the cache) and on later calls (loading the cache).
+
+    Returns
+    -------
+    dict
+        The timing (in seconds) of each reader, and whether the cached
+        readers return the same data frames.
+    """
+    res = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name in ('read_org_ff', 'read_stk_rets'):
+            csv_secs, expected = timeit(getattr(helpers, name), repeat=repeat)
+            cold_secs, _ = timeit(getattr(cache, name), cache_dir=cache_dir)
+            warm_secs, df = timeit(getattr(cache, name), cache_dir=cache_dir, repeat=repeat)
+            res[f'{name}_csv_secs'] = csv_secs
+            res[f'{name}_cold_secs'] = cold_secs
+            res[f'{name}_warm_secs'] = warm_secs
+            res[f'{name}_match'] = expected.equals(df)
+    return res
+
+
+if __name__ == "__main__":
+    print_results('mean_by_dates: loop vs grouped', bench_mean_by_dates())
+    print_results('expand_event_dates: loop vs interval join', bench_expand_event_dates())
+    for res in bench_buy_tgt_sell_acq_rets():
+        print_results('mk_buy_tgt_sell_acq_rets: loop vs set-based', res)
+    print_results('mk_tgt_rets_by_event_time: loop vs matrix', bench_tgt_rets_by_event_time())
+    print_results('mk_stk_arets: full panel vs event pairs', bench_stk_arets())
+    print_results('read_org_ff/read_stk_rets: CSV vs cache', bench_read_csv())
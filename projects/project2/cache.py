@@ -0,0 +1,308 @@
+"""
+Module cache
+
+Binary cache for the CSV files read by Project 2.
+
+`helpers.read_org_ff` and `helpers.read_stk_rets` parse their CSV files
+on every call, including the conversion of every date with generic date
+parsing. `read_org_ff` and `read_stk_rets` in this module return the same
+data frames, but parse each CSV file only once, with an explicit date
+conversion (integer `YYYYMMDD` values for the Fama-French file, ISO
+`YYYY-MM-DD` strings for the stock returns), and store the result in a
+binary file under `CACHE_DIR`:
+
+    toolkit/
+    |__ projects/
+    |   |__ project2/
+    |   |   |__ .cache/
+    |   |   |   |__ FF_Research_Data_Factors_daily-<hash>.frame
+    |   |   |   |__ ma_rets-<hash>.frame
+
+where `<hash>` identifies the full path of the CSV file (see
+`cache_path`), so CSV files with the same name in different folders do
+not share a cache file.
+
+A cache file is a small JSON header followed by two raw arrays, the
+dates of the index and the float64 values stored column by column, in
+the layout of `projects.aligned` (see `aligned.write_aligned`).
+Loading maps the file into memory and wraps the values in a data frame
+without copying them (the mapping is copy-on-write, so the frame can
+still be modified).
+
+The header records the modification time, size and SHA-256 hash of the
+CSV file it was built from. If the time and size match, the cache is
+used directly. Otherwise the CSV file is hashed, and it is only parsed
+again if its contents changed. If they did not (e.g. the file was only
+touched), only the header of the cache file is rewritten with the new
+time and size.
+
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from projects.aligned import (
+        ALIGN,
+        array_layout,
+        array_views,
+        read_aligned_header,
+        rewrite_aligned_header,
+        write_aligned,
+        )
+from projects.project2.helpers import fmt_tic, locs
+
+
+# ----------------------------------------------------------------------------
+#  CONSTANTS
+# ----------------------------------------------------------------------------
+CACHE_DIR = Path(__file__).parent.joinpath('.cache')
+
+MAGIC = b'P2FRAME\x00'
+VERSION = 1
+
+# Resolution of the dates returned by `pd.read_csv(..., parse_dates=...)`
+# in the installed pandas version ('ns' before pandas 3.0, 'us' after)
+DATE_UNIT = pd.to_datetime(['2000-01-01']).unit
+
+
+# ----------------------------------------------------------------------------
+#  Date conversion
+# ----------------------------------------------------------------------------
+def yyyymmdd_to_dates(values) -> pd.DatetimeIndex:
+    """
+    Convert integer dates in `YYYYMMDD` format to a DatetimeIndex with
+    integer arithmetic only.
+
+    Examples
+    --------
+    >> yyyymmdd_to_dates([19260701, 20250930])
+    DatetimeIndex(['1926-07-01', '2025-09-30'], dtype='datetime64[us]', freq=None)
+    """
+    values = np.asarray(values, dtype=np.int64)
+    year, rest = np.divmod(values, 10000)
+    month, day = np.divmod(rest, 100)
+    if len(values) and (month.min() < 1 or month.max() > 12
+                        or day.min() < 1 or day.max() > 31):
+        bad = values[(month < 1) | (month > 12) | (day < 1) | (day > 31)][0]
+        raise ValueError(f"Invalid date '{bad}'")
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    return pd.DatetimeIndex(days.astype(f'datetime64[{DATE_UNIT}]'))
+
+
+def iso_to_dates(values) -> pd.DatetimeIndex:
+    """
+    Convert `YYYY-MM-DD` strings to a DatetimeIndex with NumPy's ISO date
+    parser.
+
+    Examples
+    --------
+    >> iso_to_dates(['2021-01-04', '2021-01-05'])
+    DatetimeIndex(['2021-01-04', '2021-01-05'], dtype='datetime64[us]', freq=None)
+    """
+    days = np.asarray(values, dtype='datetime64[D]')
+    return pd.DatetimeIndex(days.astype(f'datetime64[{DATE_UNIT}]'))
+
+
+# ----------------------------------------------------------------------------
+#  CSV parsers
+# ----------------------------------------------------------------------------
+def parse_org_ff(pth: Path) -> pd.DataFrame:
+    """
+    Parse the Fama-French CSV file. The output is the same as
+    `helpers.read_org_ff`.
+    """
+    df = pd.read_csv(pth, index_col=0)
+    df.index = yyyymmdd_to_dates(df.index.to_numpy())
+    return df.astype(np.float64)
+
+
+def parse_stk_rets(pth: Path) -> pd.DataFrame:
+    """
+    Parse the CSV file with the stock returns. The output is the same as
+    `helpers.read_stk_rets`.
+    """
+    df = pd.read_csv(pth, index_col='date')
+    df.index = iso_to_dates(df.index.to_numpy()).rename('date')
+    df.columns = [fmt_tic(x) for x in df.columns]
+    return df.astype(np.float64)
+
+
+# ----------------------------------------------------------------------------
+#  Helper functions
+# ----------------------------------------------------------------------------
+def cache_path(pth: Path, cache_dir: Path = CACHE_DIR) -> Path:
+    """
+    Return the location of the cache file for the CSV file `pth`. The
+    name is the stem of `pth` followed by the first 12 hex digits of the
+    SHA-256 hash of its resolved path.
+    """
+    pth = Path(pth)
+    key = hashlib.sha256(str(pth.resolve()).encode()).hexdigest()[:12]
+    return Path(cache_dir) / f'{pth.stem}-{key}.frame'
+
+
+def file_hash(pth: Path) -> str:
+    """
+    Return the SHA-256 hash of the contents of `pth`, as a hex string.
+    """
+    digest = hashlib.sha256()
+    with open(pth, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------------
+#  Reading and writing
+# ----------------------------------------------------------------------------
+def write_frame(df: pd.DataFrame, pth: Path, source: dict | None = None) -> Path:
+    """
+    Store a data frame with a DatetimeIndex and float64 columns in a cache
+    file.
+
+    Parameters
+    ----------
+    df : frame
+        The data frame.
+
+    pth : Path
+        Location of the cache file. It is written with
+        `aligned.write_aligned`, with room in the header for new source
+        stamps (see `load_frame`).
+
+    source : dict, optional
+        Information about the source file (`mtime_ns`, `size`, `sha256`)
+        stored in the header.
+
+    Returns
+    -------
+    Path
+        The location of the cache file.
+    """
+    pth = Path(pth)
+    arrays = {
+        'index': np.ascontiguousarray(df.index.to_numpy()),
+        # One row per column, so that each column is contiguous
+        'values': np.ascontiguousarray(df.to_numpy(dtype=np.float64).T),
+    }
+    header = {
+        'version': VERSION,
+        'source': source or {},
+        'index_name': df.index.name,
+        'columns': [str(col) for col in df.columns],
+        'arrays': array_layout(arrays)[0],
+    }
+    write_aligned(pth, MAGIC, header, arrays.values(), reserve=ALIGN)
+    return pth
+
+
+def read_frame(pth: Path) -> tuple:
+    """
+    Read a cache file written by `write_frame`.
+
+    Returns
+    -------
+    tuple[frame, dict]
+        The data frame, whose values are a copy-on-write memory map of the
+        file, and the `source` information stored in the header.
+    """
+    pth = Path(pth)
+    with open(pth, 'rb') as fobj:
+        header, start = read_aligned_header(fobj, MAGIC, VERSION)
+    if pth.stat().st_size > start:
+        buf = np.memmap(pth, dtype=np.uint8, mode='c', offset=start)
+    else:
+        buf = bytearray()
+    arrays = array_views(header['arrays'], buf)
+    index = pd.DatetimeIndex(np.asarray(arrays['index']), name=header['index_name'])
+    df = pd.DataFrame(
+        np.asarray(arrays['values']).T, index=index,
+        columns=pd.Index(header['columns'], dtype='str'), copy=False)
+    return df, header['source']
+
+
+def load_frame(pth: Path, parser, cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """
+    Return the data frame for the CSV file `pth`, using the cache in
+    `cache_dir` when it is up to date.
+
+    Parameters
+    ----------
+    pth : Path
+        Location of the CSV file.
+
+    parser : callable
+        Called as `parser(pth)` to parse the CSV file when the cache is
+        missing or stale, e.g. `parse_org_ff`.
+
+    cache_dir : Path, default CACHE_DIR
+        Folder with the cache files. It is created if needed.
+
+    Returns
+    -------
+    frame
+        The output of `parser(pth)`.
+    """
+    pth = Path(pth)
+    stat = pth.stat()
+    cache_pth = cache_path(pth, cache_dir)
+    source = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    try:
+        # Only the header, so that the file is not mapped if it is replaced
+        with open(cache_pth, 'rb') as fobj:
+            header = read_aligned_header(fobj, MAGIC, VERSION)[0]
+        cached = header['source']
+    except (OSError, KeyError, ValueError):
+        header, cached = None, {}
+
+    if header is not None and all(cached.get(key) == value for key, value in source.items()):
+        try:
+            return read_frame(cache_pth)[0]
+        except (OSError, KeyError, ValueError):
+            header, cached = None, {}
+    source['sha256'] = file_hash(pth)
+    if header is not None and cached.get('sha256') == source['sha256']:
+        # Same contents: only store the new stamps
+        header['source'] = source
+        if rewrite_aligned_header(cache_pth, MAGIC, header):
+            return read_frame(cache_pth)[0]
+        # No room in the header: copy the frame, so that the mapping is
+        # closed before the file is replaced
+        df = read_frame(cache_pth)[0].copy()
+    else:
+        df = parser(pth)
+    write_frame(df, cache_pth, source)
+    return read_frame(cache_pth)[0]
+
+
+# ----------------------------------------------------------------------------
+#  Cached readers
+# ----------------------------------------------------------------------------
+def read_org_ff(cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """
+    Cached version of `helpers.read_org_ff`, which returns the same data
+    frame (see the module docstring).
+
+    Parameters
+    ----------
+    cache_dir : Path, default CACHE_DIR
+        Folder with the cache files.
+    """
+    return load_frame(locs['ff_csv'], parse_org_ff, cache_dir=cache_dir)
+
+
+def read_stk_rets(cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """
+    Cached version of `helpers.read_stk_rets`, which returns the same data
+    frame (see the module docstring).
+
+    Parameters
+    ----------
+    cache_dir : Path, default CACHE_DIR
+        Folder with the cache files.
+    """
+    return load_frame(locs['ma_rets_csv'], parse_stk_rets, cache_dir=cache_dir)
@@ -13,13 +13,18 @@ from projects.project2.helpers import (
         fmt_dt,
         fmt_tic,
         read_ma_deals,
-        read_org_ff,
-        read_stk_rets,
         summarise_series,
         wide_to_long_rets,
         print_msg,
         )
 
+# Same data frames as `helpers.read_org_ff` and `helpers.read_stk_rets`,
+# loaded from a binary cache after the first run
+from projects.project2.cache import (
+        read_org_ff,
+        read_stk_rets,
+        )
+
 from projects.project2.task_project2 import (
         mk_ma_info,
         mk_stk_arets,
@@ -49,16 +54,17 @@ def main():
        cleaner format with one row per deal and columns identifying the
        acquirer, target, announcement date, and deal number.
 
-    3. **Compute abnormal returns**
-       Using `mk_stk_arets`, the function computes abnormal returns for
-       each stock and date, defined as the stock return minus the market
-       return.
-
-    4. **Expand events across event windows**
+    3. **Expand events across event windows**
        Using `expand_event_dates`, the function creates a table where each
        deal is repeated once for every valid return date from 1 to 30
        days after the announcement.
 
+    4. **Compute abnormal returns**
+       Using `mk_stk_arets`, the function computes abnormal returns,
+       defined as the stock return minus the market return, for the
+       target and date pairs of the expanded events (the only ones the
+       strategies use).
+
     5. **Construct trading strategy returns**
        - `mk_buy_tgt_sell_acq_rets` computes daily portfolio returns for a
          strategy that buys the target and sells the acquirer.
@@ -93,18 +99,19 @@ def main():
     # 2: Construct deal-level information
     ma_info = mk_ma_info(ma_deals)
 
-    # 3: Compute abnormal returns 
-    stk_arets = mk_stk_arets(
-            stk_rets=stk_rets,
-            org_ff=org_ff,
-     )
-
-    # 4: Expand events across event windows
+    # 3: Expand events across event windows
     expanded_ma_info = expand_event_dates(
             events=ma_info,
             valid_dates=stk_rets.index,
     )
 
+    # 4: Compute abnormal returns, only for the target-days of the events
+    stk_arets = mk_stk_arets(
+            stk_rets=stk_rets,
+            org_ff=org_ff,
+            expanded_ma_info=expanded_ma_info,
+    )
+
     # 5: Construct trading strategy returns
 
     # from buying the target and selling the acquirer
@@ -154,18 +161,19 @@ def _test_main():
     # 2: Construct deal-level information
     ma_info = mk_ma_info(ma_deals)
 
-    # 3: Compute abnormal returns 
-    stk_arets = mk_stk_arets(
-            stk_rets=stk_rets,
-            org_ff=org_ff,
-    )
-
-    # 4: Expand events across event windows
+    # 3: Expand events across event windows
     expanded_ma_info = expand_event_dates(
             events=ma_info,
             valid_dates=stk_rets.index,
     )
 
+    # 4: Compute abnormal returns, only for the target-days of the events
+    stk_arets = mk_stk_arets(
+            stk_rets=stk_rets,
+            org_ff=org_ff,
+            expanded_ma_info=expanded_ma_info,
+    )
+
     # 5: Construct trading strategy returns
 
     # from buying the target and selling the acquirer
@@ -197,6 +205,134 @@ def _test_main():
               summarise_series(prop_positive_tgt_rets - 0.5), '')
 
 
+def _test_mean_by_dates():
+    """
+    `mean_by_dates` must give the same means as the original loop
+    (`reference.mean_by_dates_loop`), including for dates whose values
+    are all missing.
+    """
+    from projects.project2.reference import (
+            mean_by_dates_loop,
+            mk_random_ma_info,
+            mk_random_stk_rets,
+            )
+
+    print_msg("Running _test_mean_by_dates...", as_header=True)
+    stk_rets = mk_random_stk_rets(50, 252)
+    expanded = expand_event_dates(mk_random_ma_info(stk_rets, 100), stk_rets.index)
+    arets = wide_to_long_rets(stk_rets, ret_col='aret')
+    events = expanded.loc[:, ['date', 'tgt']].rename(columns={'tgt': 'ticker'})
+    events = events.merge(arets, on=['date', 'ticker'], how='inner')
+    # One date with only missing values
+    events.loc[events['date'] == events['date'].iloc[0], 'aret'] = float('nan')
+
+    res = mean_by_dates(events, 'date', 'aret')
+    expected = mean_by_dates_loop(events, 'date', 'aret')
+    assert res.index.equals(expected.index)
+    assert res.isna().equals(expected.isna()) and res.isna().sum() == 1
+    assert (res - expected).abs().max() < 1e-15
+
+
+def _test_expand_event_dates():
+    """
+    `expand_event_dates` must give the same frame as the original loop
+    (`reference.expand_event_dates_loop`), on random deals and on the
+    deals in `data/`.
+    """
+    from projects.project2.reference import (
+            expand_event_dates_loop,
+            mk_random_ma_info,
+            mk_random_stk_rets,
+            )
+
+    print_msg("Running _test_expand_event_dates...", as_header=True)
+    stk_rets = mk_random_stk_rets(20, 252)
+    ma_info = mk_random_ma_info(stk_rets, 200)
+    res = expand_event_dates(ma_info, stk_rets.index)
+    assert res.equals(expand_event_dates_loop(ma_info, stk_rets.index))
+
+    stk_rets = read_stk_rets()
+    ma_info = mk_ma_info(read_ma_deals())
+    res = expand_event_dates(ma_info, stk_rets.index)
+    assert res.equals(expand_event_dates_loop(ma_info, stk_rets.index))
+
+    # None if no deal has any date in its window
+    late = ma_info.assign(announcement=stk_rets.index[-1])
+    assert expand_event_dates_loop(late, stk_rets.index) is None
+    assert expand_event_dates(late, stk_rets.index) is None
+
+
+def _test_buy_tgt_sell_acq_rets():
+    """
+    `mk_buy_tgt_sell_acq_rets` must give the same returns as the original
+    loop (`reference.mk_buy_tgt_sell_acq_rets_loop`), on random deals and
+    on the deals in `data/`.
+    """
+    from projects.project2.reference import (
+            mk_buy_tgt_sell_acq_rets_loop,
+            mk_random_ma_info,
+            mk_random_stk_rets,
+            )
+
+    print_msg("Running _test_buy_tgt_sell_acq_rets...", as_header=True)
+    stk_rets = mk_random_stk_rets(50, 252)
+    cases = [(expand_event_dates(mk_random_ma_info(stk_rets, 100), stk_rets.index), stk_rets)]
+    stk_rets = read_stk_rets()
+    cases.append((expand_event_dates(mk_ma_info(read_ma_deals()), stk_rets.index), stk_rets))
+    for expanded, stk_rets in cases:
+        res = mk_buy_tgt_sell_acq_rets(expanded, stk_rets)
+        expected = mk_buy_tgt_sell_acq_rets_loop(expanded, stk_rets).astype(float)
+        assert res.index.equals(expected.index)
+        assert (res - expected).abs().max() < 1e-15
+
+
+def _test_tgt_rets_by_event_time():
+    """
+    `mk_tgt_rets_by_event_time` must give the same panel as the original
+    loop (`reference.mk_tgt_rets_by_event_time_loop`), as float64, and
+    `mk_prop_positive_tgt_rets` the same proportions on both.
+    """
+    from projects.project2.reference import (
+            mk_random_ma_info,
+            mk_random_stk_rets,
+            mk_tgt_rets_by_event_time_loop,
+            )
+
+    print_msg("Running _test_tgt_rets_by_event_time...", as_header=True)
+    stk_rets = mk_random_stk_rets(50, 252)
+    cases = [(expand_event_dates(mk_random_ma_info(stk_rets, 100), stk_rets.index), stk_rets)]
+    stk_rets = read_stk_rets()
+    cases.append((expand_event_dates(mk_ma_info(read_ma_deals()), stk_rets.index), stk_rets))
+    for expanded, stk_rets in cases:
+        res = mk_tgt_rets_by_event_time(stk_rets, expanded)
+        expected = mk_tgt_rets_by_event_time_loop(stk_rets, expanded)
+        assert res.equals(expected.astype(float))
+        assert mk_prop_positive_tgt_rets(res).equals(mk_prop_positive_tgt_rets(expected))
+
+
+def _test_sparse_arets():
+    """
+    `mk_stk_arets` with `expanded_ma_info` must give the abnormal returns
+    of the full panel for the target-days of the events, so that
+    `mk_buy_tgt_sell_mkt_rets` returns the same series with both.
+    """
+    print_msg("Running _test_sparse_arets...", as_header=True)
+    stk_rets = read_stk_rets()
+    org_ff = read_org_ff()
+    expanded = expand_event_dates(mk_ma_info(read_ma_deals()), stk_rets.index)
+    full = mk_stk_arets(stk_rets=stk_rets, org_ff=org_ff)
+    sparse = mk_stk_arets(stk_rets=stk_rets, org_ff=org_ff, expanded_ma_info=expanded)
+
+    pairs = expanded.loc[:, ['date', 'tgt']].drop_duplicates()
+    pairs = pairs.rename(columns={'tgt': 'ticker'})
+    expected = full.merge(pairs, on=['date', 'ticker'], how='inner')
+    expected = expected.sort_values(['date', 'ticker'], ignore_index=True)
+    res = sparse.sort_values(['date', 'ticker'], ignore_index=True)
+    assert len(res) > 0 and res.equals(expected)
+    assert mk_buy_tgt_sell_mkt_rets(expanded, sparse).equals(
+        mk_buy_tgt_sell_mkt_rets(expanded, full))
+
+
 # ----------------------------------------------------------------------------
 #  Function to run all other tests
 # ----------------------------------------------------------------------------
@@ -212,6 +348,11 @@ def run_tests():
     _test_main()
 
     # Add other function calls here
+    _test_mean_by_dates()
+    _test_expand_event_dates()
+    _test_buy_tgt_sell_acq_rets()
+    _test_tgt_rets_by_event_time()
+    _test_sparse_arets()
 
 
 if __name__ == "__main__":
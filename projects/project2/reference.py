@@ -0,0 +1,150 @@
+"""
+Module reference
+
+Reference implementations and random inputs for the functions in
+`task_project2`, used by the tests in `main` and by `bench`.
+
+The `*_loop` functions are the original versions of the functions that
+were vectorised (one loop iteration per date, event or cell). They are
+slow but simple, so the tests check that the current functions give the
+same results. `mk_random_stk_rets` and `mk_random_ma_info` create random
+deal panels of any size, with the same layout as the outputs of
+`helpers.read_stk_rets` and `task_project2.mk_ma_info`.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from projects.project2.helpers import fmt_dt, wide_to_long_rets
+
+
+# ----------------------------------------------------------------------------
+#  Random deal panels
+# ----------------------------------------------------------------------------
+def mk_random_stk_rets(ntickers: int, ndates: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Create a data frame of random daily returns with the layout of
+    `helpers.read_stk_rets`: a DatetimeIndex of business days named 'date'
+    and one column per ticker ('T0000', 'T0001', ...). About 2% of the
+    returns are missing.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2010-01-04', periods=ndates, name='date')
+    rets = rng.normal(0.0005, 0.02, size=(ndates, ntickers))
+    rets[rng.random(rets.shape) < 0.02] = np.nan
+    tickers = [f'T{i:04d}' for i in range(ntickers)]
+    return pd.DataFrame(rets, index=dates, columns=tickers)
+
+
+def mk_random_ma_info(stk_rets: pd.DataFrame, ndeals: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Create a data frame of random deals with the layout of
+    `task_project2.mk_ma_info`, with announcements on random dates of
+    `stk_rets` and acquirers and targets drawn from its columns.
+    """
+    rng = np.random.default_rng(seed)
+    tickers = np.asarray(stk_rets.columns)
+    pairs = np.array([rng.choice(len(tickers), 2, replace=False) for _ in range(ndeals)])
+    return pd.DataFrame({
+        'announcement': stk_rets.index[rng.integers(0, len(stk_rets), ndeals)],
+        'dealno': np.arange(ndeals, dtype=np.int64) + 1000000,
+        'acq': tickers[pairs[:, 0]],
+        'tgt': tickers[pairs[:, 1]],
+    })
+
+
+# ----------------------------------------------------------------------------
+#  Reference implementations (the original loops)
+# ----------------------------------------------------------------------------
+def mean_by_dates_loop(df: pd.DataFrame, date_col: str, value_col: str) -> pd.Series:
+    """ Original `mean_by_dates`: one index lookup per date """
+    dates = df.loc[:, date_col].unique()
+    out = pd.Series(None, index=dates, dtype=float)
+    values = df.set_index(date_col).loc[:, value_col]
+    for date in dates:
+        out.loc[date] = values.loc[[date]].mean()
+    out.sort_index(inplace=True)
+    return out
+
+
+def expand_event_dates_loop(
+        events: pd.DataFrame,
+        valid_dates: pd.DatetimeIndex,
+        announce_col: str = 'announcement',
+        date_col: str = 'date',
+        ) -> pd.DataFrame | None:
+    """ Original `expand_event_dates`: one data frame per event """
+    td_start = pd.Timedelta(days=1)
+    td_end = pd.Timedelta(days=30)
+
+    dates = valid_dates.drop_duplicates().sort_values()
+    dates = pd.Series(dates, index=dates)
+    dates.index.name = date_col
+
+    out = []
+    for _, row in events.iterrows():
+        announce = row[announce_col]
+        data = row.to_dict()
+        start = fmt_dt(announce + td_start)
+        end = fmt_dt(announce + td_end)
+        window_idx = dates.loc[start:end].index
+        if len(window_idx) == 0:
+            continue
+        df = pd.DataFrame(data, index=window_idx).reset_index()
+        out.append(df)
+
+    if out:
+        return pd.concat(out, ignore_index=True).reset_index(drop=True)
+
+
+def mk_buy_tgt_sell_acq_rets_loop(
+        expanded_ma_info: pd.DataFrame,
+        stk_rets: pd.DataFrame,
+        ) -> pd.Series:
+    """
+    Original `mk_buy_tgt_sell_acq_rets`: two joins per event date. The
+    original selects with `.loc[date]`, which returns a Series (and fails)
+    on dates with a single event, so `.loc[[date]]` is used instead.
+    """
+    idx_cols = ['date', 'ticker']
+
+    rets = wide_to_long_rets(stk_rets)
+    rets = rets.set_index(idx_cols[0], drop=False)
+    events = expanded_ma_info.set_index(idx_cols[0], drop=False)
+    dates = events.index.unique().intersection(rets.index)
+    rets = rets.loc[dates]
+    events = events.loc[dates]
+    out = pd.Series(None, index=dates)
+    for date in dates:
+        rets_date = rets.loc[[date]].set_index(idx_cols)
+        events_date = events.loc[[date]]
+
+        buys = events_date.rename(columns={'tgt': idx_cols[1]}).set_index(idx_cols)
+        buys = buys.join(rets_date, how='inner')
+
+        sales = events_date.rename(columns={'acq': idx_cols[1]}).set_index(idx_cols)
+        sales = sales.join(rets_date, how='inner')
+
+        out.loc[date] = buys.loc[:, 'ret'].mean() - sales.loc[:, 'ret'].mean()
+
+    return out.dropna().sort_index()
+
+
+def mk_tgt_rets_by_event_time_loop(
+        stk_rets: pd.DataFrame,
+        expanded_ma_info: pd.DataFrame,
+        ) -> pd.DataFrame:
+    """ Original `mk_tgt_rets_by_event_time`: one `.loc` per cell """
+    df = expanded_ma_info.copy()
+    df.loc[:, 'event_time'] = (df.date - df.announcement).dt.days
+    values = df.event_time.unique()
+    deals = expanded_ma_info.dealno.unique()
+    out = pd.DataFrame(None, index=values, columns=deals)
+    for _, row in df.iterrows():
+        date = row['date']
+        tic = row['tgt']
+        if date not in stk_rets.index or tic not in stk_rets.columns:
+            continue
+        out.loc[row['event_time'], row['dealno']] = stk_rets.loc[date, tic]
+    return out.sort_index()
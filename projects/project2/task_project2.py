@@ -8,10 +8,10 @@ IMPORTANT:
 
 """
 
+import numpy as np
 import pandas as pd
 
 from projects.project2.helpers import (
-        fmt_dt,
         wide_to_long_rets,
         )
 
@@ -77,6 +77,8 @@ def mk_ma_info(ma_deals: pd.DataFrame):
 def mk_stk_arets(
         stk_rets: pd.DataFrame = None,
         org_ff: pd.DataFrame = None,
+        expanded_ma_info: pd.DataFrame = None,
+        tic_col: str = 'tgt',
         ):
     """
     Compute abnormal stock returns using the market return as a benchmark.
@@ -91,6 +93,16 @@ def mk_stk_arets(
         A data frame containing the Fama–French daily factors downloaded
         from Ken French’s website. This is the output of `helpers.read_org_ff`.
 
+    expanded_ma_info : frame, optional
+        The output of `expand_event_dates`. If given, abnormal returns are
+        only computed for the (`date`, `tic_col`) pairs in this data frame,
+        instead of for every cell of `stk_rets`, so memory scales with the
+        number of deal-days rather than with the size of the panel. Pairs
+        whose date or ticker is not in `stk_rets` are skipped.
+
+    tic_col : str, default 'tgt'
+        Column of `expanded_ma_info` with the tickers to look up.
+
     Returns
     -------
     frame
@@ -110,12 +122,34 @@ def mk_stk_arets(
            computed as the individual stock return minus the 
            market return.
 
+        Rows are in date order, then in the column order of `stk_rets`.
+        With `expanded_ma_info`, there is one row per distinct pair.
+
     """
     cond = org_ff.index.isin(stk_rets.index)
     ff_df = org_ff.loc[cond]
     mkt = ff_df.loc[:, 'Mkt-RF'] + ff_df.loc[:, 'RF']
-    arets = stk_rets.sub(mkt, axis=0)
-    return wide_to_long_rets(arets, ret_col='aret')
+    if expanded_ma_info is None:
+        arets = stk_rets.sub(mkt, axis=0)
+        return wide_to_long_rets(arets, ret_col='aret')
+
+    # Positions of the requested pairs in `stk_rets`, de-duplicated and
+    # sorted in the order of the full frame
+    ncols = len(stk_rets.columns)
+    rows = stk_rets.index.get_indexer(expanded_ma_info.loc[:, 'date'])
+    cols = stk_rets.columns.get_indexer(expanded_ma_info.loc[:, tic_col])
+    found = (rows >= 0) & (cols >= 0)
+    cells = np.unique(rows[found].astype(np.int64) * ncols + cols[found])
+    rows, cols = np.divmod(cells, ncols)
+
+    # For a float64 panel, `to_numpy` is a view of its values (no copy)
+    rets = stk_rets.to_numpy(dtype=float)[rows, cols]
+    mkt = mkt.reindex(stk_rets.index).to_numpy(dtype=float)[rows]
+    return pd.DataFrame({
+        'date': stk_rets.index[rows],
+        'ticker': stk_rets.columns[cols],
+        'aret': rets - mkt,
+    })
 
 def mean_by_dates(
         df: pd.DataFrame,
@@ -145,13 +179,16 @@ def mean_by_dates(
         A Series indexed by the unique dates in `date_col` (as a
         DatetimeIndex), where each element is the average of `value_col`
         for that particular date, ignoring missing values.
+
+    Notes
+    -----
+    All the means are computed in one grouped reduction (one pass to
+    hash the dates, one to sum and count the values), instead of one
+    index lookup per date. Dates whose values are all missing get NaN.
     """
-    dates = df.loc[:, date_col].unique()
-    out = pd.Series(None, index=dates, dtype=float)
-    values = df.set_index(date_col).loc[:, value_col]
-    for date in dates:
-        out.loc[date] = values.loc[[date]].mean()
-    out.sort_index(inplace=True)
+    out = df.groupby(date_col, sort=True)[value_col].mean()
+    out.index.name = None
+    out.name = None
     return out
 
 def expand_event_dates(
@@ -190,28 +227,35 @@ def expand_event_dates(
         If no event has any matching dates in `valid_dates`, returns `None`.
 
         The order of the columns in this data frame does not matter
+
+    Notes
+    -----
+    This is an interval join: the window of each event is located in the
+    sorted valid dates with two binary searches (`searchsorted`), and the
+    output is built with a single `take` of the event rows and of the
+    dates, instead of one data frame per event.
     """
     td_start = pd.Timedelta(days=1)
-    td_end = pd.Timedelta(days=30)
+    # Windows end on the last instant of the 30th day
+    td_end = pd.Timedelta(days=31)
 
     dates = valid_dates.drop_duplicates().sort_values()
-    dates = pd.Series(dates, index=dates)
-    dates.index.name = date_col
-
-    out = []
-    for _, row in events.iterrows():
-        announce = row[announce_col]
-        data = row.to_dict()
-        start = fmt_dt(announce + td_start)
-        end = fmt_dt(announce + td_end)
-        window_idx = dates.loc[start:end].index
-        if len(window_idx) == 0:
-            continue
-        df = pd.DataFrame(data, index=window_idx).reset_index()
-        out.append(df)
-
-    if out:
-        return pd.concat(out, ignore_index=True).reset_index(drop=True)
+    announce = pd.DatetimeIndex(events.loc[:, announce_col]).normalize()
+    starts = dates.searchsorted(announce + td_start, side='left')
+    ends = dates.searchsorted(announce + td_end, side='left')
+    counts = np.where(announce.isna(), 0, np.maximum(ends - starts, 0))
+    total = int(counts.sum())
+    if total == 0:
+        return None
+
+    # Position of each output row in `events` and in `dates`
+    rows = np.repeat(np.arange(len(events)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    pos = np.repeat(starts, counts) + offsets
+
+    out = events.take(rows).reset_index(drop=True)
+    out.insert(0, date_col, dates.take(pos).to_numpy())
+    return out
 
 def mk_buy_tgt_sell_acq_rets(
         expanded_ma_info: pd.DataFrame,
@@ -256,30 +300,31 @@ def mk_buy_tgt_sell_acq_rets(
 
         See project for more information
 
-
+    Notes
+    -----
+    The returns of all the (date, target) and (date, acquirer) pairs are
+    looked up at once, using integer positions into the `stk_rets` array,
+    and the long and short means of every date come from one grouped
+    reduction. Pairs without a return are ignored, as in an inner join.
     """
-    idx_cols = ['date', 'ticker']
-
-    rets = wide_to_long_rets(stk_rets)
-    rets = rets.set_index(idx_cols[0], drop=False)
-    events = expanded_ma_info.set_index(idx_cols[0], drop=False)
-    dates = events.index.unique().intersection(rets.index)
-    rets = rets.loc[dates]
-    events = events.loc[dates]
-    out = pd.Series(None, index=dates)
-    for date in dates:
-        rets_date = rets.loc[date].set_index(idx_cols)
-        events_date = events.loc[date]
-
-        buys = events_date.rename(columns={'tgt': idx_cols[1]}).set_index(idx_cols)
-        buys = buys.join(rets_date, how='inner')
-
-        sales = events_date.rename(columns={'acq': idx_cols[1]}).set_index(idx_cols)
-        sales = sales.join(rets_date, how='inner')
-
-        out.loc[date] = buys.loc[:, 'ret'].mean() - sales.loc[:, 'ret'].mean()
-
-    return out.dropna().sort_index()
+    date_col = 'date'
+    values = stk_rets.to_numpy(dtype=float)
+    rows = stk_rets.index.get_indexer(expanded_ma_info.loc[:, date_col])
+
+    legs = {}
+    for leg, tic_col in [('buy', 'tgt'), ('sell', 'acq')]:
+        cols = stk_rets.columns.get_indexer(expanded_ma_info.loc[:, tic_col])
+        found = (rows >= 0) & (cols >= 0)
+        rets = np.full(len(rows), np.nan)
+        rets[found] = values[rows[found], cols[found]]
+        legs[leg] = rets
+
+    df = pd.DataFrame(legs)
+    df.insert(0, date_col, expanded_ma_info.loc[:, date_col].to_numpy())
+    means = df.groupby(date_col, sort=True).mean()
+    out = means.loc[:, 'buy'] - means.loc[:, 'sell']
+    out.name = None
+    return out.dropna()
 
 def mk_buy_tgt_sell_mkt_rets(
         expanded_ma_info: pd.DataFrame,
@@ -404,19 +449,30 @@ def mk_tgt_rets_by_event_time(
         A data frame whose index is event time (integers) and whose columns
         are deal numbers. Entry `(t, d)` contains the target return for
         deal `d` at event time `t`. Missing returns are represented as NaN.
+        All the values are float64.
+
+    Notes
+    -----
+    The target returns of all the rows of `expanded_ma_info` are gathered
+    at once, using integer positions into the `stk_rets` array, and
+    scattered into a preallocated float64 matrix, instead of being set one
+    cell at a time in an object data frame.
     """
-    df = expanded_ma_info.copy()
-    df.loc[:, 'event_time'] = (df.date - df.announcement).dt.days
-    values = df.event_time.unique()
-    deals = expanded_ma_info.dealno.unique()
-    out = pd.DataFrame(None, index=values, columns=deals)
-    for _, row in df.iterrows():
-        date = row['date']
-        tic = row['tgt']
-        if date not in stk_rets.index or tic not in stk_rets.columns:
-            continue
-        out.loc[row['event_time'], row['dealno']] = stk_rets.loc[date, tic]
-    return out.sort_index()
+    df = expanded_ma_info
+    event_time = (df.loc[:, 'date'] - df.loc[:, 'announcement']).dt.days
+    values = pd.Index(event_time.unique())
+    deals = pd.Index(df.loc[:, 'dealno'].unique())
+
+    rows = stk_rets.index.get_indexer(df.loc[:, 'date'])
+    cols = stk_rets.columns.get_indexer(df.loc[:, 'tgt'])
+    found = (rows >= 0) & (cols >= 0)
+
+    time_idx = values.get_indexer(event_time)[found]
+    deal_idx = deals.get_indexer(df.loc[:, 'dealno'])[found]
+
+    out = np.full((len(values), len(deals)), np.nan)
+    out[time_idx, deal_idx] = stk_rets.to_numpy(dtype=float)[rows[found], cols[found]]
+    return pd.DataFrame(out, index=values, columns=deals).sort_index()
 
 def mk_prop_positive_tgt_rets(
         tgt_rets_by_event_time: pd.DataFrame